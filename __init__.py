@@ -1,3 +0,0 @@
-"""
-Utility modules for Panda AppStore Bot
-"""
@@ -4,21 +4,38 @@ Complete button-only interface with intelligent conversation management
 """
 
 import asyncio
+import atexit
+import copy
+import functools
+import hashlib
 import json
 import logging
 import os
 import platform
+import queue
 import random
 import re
+import sqlite3
+import string
+import sys
+import tempfile
 import time
+from collections import OrderedDict, deque
 from datetime import datetime, timedelta
-from typing import Any, Dict, Optional, Set
+from itertools import islice
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, BinaryIO, Dict, Optional, Set
 
 import aiohttp
+import httpx
+import orjson
 import psutil
-from openai import OpenAI
+from openai import AsyncOpenAI
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.constants import ChatAction
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
 from telegram.ext import (
+    AIORateLimiter,
     Application,
     CallbackQueryHandler,
     CommandHandler,
@@ -27,198 +44,799 @@ from telegram.ext import (
     filters,
 )
 
-# Configure logging
+# Configure logging: handlers only enqueue records, a listener thread writes bot.log
+# and the console (Railway collects stdout)
+class DeferredQueueHandler(QueueHandler):
+    """Enqueue records with their message merged, leaving traceback formatting to the listener thread"""
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Args can be live cached objects, so render them now rather than after they change
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+log_queue = queue.SimpleQueue()
+log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+log_file_handler = RotatingFileHandler('bot.log', maxBytes=10 * 1024 * 1024, backupCount=3, encoding='utf-8')
+log_file_handler.setFormatter(log_formatter)
+log_console_handler = logging.StreamHandler(sys.stdout)
+log_console_handler.setFormatter(log_formatter)
+log_listener = QueueListener(log_queue, log_file_handler, log_console_handler)
+log_queue_handler = DeferredQueueHandler(log_queue)
 logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     level=logging.INFO,
-    filename='bot.log'
+    handlers=[log_queue_handler]
 )
+# Runs for the whole process so startup and exit messages are written too; stopping it
+# at exit drains the queue before logging's own shutdown closes the handlers
+log_listener.start()
+atexit.register(log_listener.stop)
 logger = logging.getLogger(__name__)
 
 # Global variables
 BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN')
 OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
-ADMIN_IDS = set(map(int, os.environ.get('ADMIN_IDS', '').split(','))) if os.environ.get('ADMIN_IDS') else set()
+ADMIN_IDS = frozenset(int(admin_id) for admin_id in os.environ.get('ADMIN_IDS', '').split(',') if admin_id.strip())
 GROUP_ID = int(os.environ.get('GROUP_ID', '0'))
 OXAPAY_API_KEY = os.environ.get('OXAPAY_API_KEY')
-
-# Initialize OpenAI
-try:
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    logger.info("OpenAI client initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize OpenAI client: {e}")
-    client = None
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL')  # public HTTPS base URL; polling is used when unset
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET')
+PORT = int(os.environ.get('PORT', '8443'))
 
 # Constants
 TEMP_BAN_DURATION = 24 * 60 * 60  # 24 hours in seconds
 SPAM_THRESHOLD = 5  # messages
 SPAM_WINDOW = 60  # seconds
 SIMILARITY_THRESHOLD = 0.8
+ADMIN_HANDOFF_WINDOW = 20  # seconds an admin reply keeps the AI from answering that user
+DEFAULT_PRICING = {'usd_amount': 35.0, 'stars_amount': 2500}
+CONVERSATION_HISTORIES_FILE = 'data/conversation_histories.json'
+CONVERSATION_LOG_FILE = 'data/conversation_histories.jsonl'
+STATE_DB_FILE = 'data/bot_state.db'
+HISTORY_LIMIT = 11  # stored entries per user: 10 context turns plus the latest reply
+HISTORY_COMPACT_EVERY = 500  # logged appends before the log is folded into the snapshot
+HISTORY_IDLE_TTL = 30 * 24 * 60 * 60  # seconds of inactivity before a history is trimmed
+HISTORY_FLUSH_DELAY = 1.0  # seconds appended history entries may wait in the write buffer
+AI_CONTEXT_MESSAGES = 5  # messages sent to OpenAI per reply, including the new one
+CONNECTION_POOL_SIZE = 64  # concurrent outgoing Bot API requests
+GET_UPDATES_POOL_SIZE = 4  # kept separate so long polling never starves sends
+POOL_TIMEOUT = 30.0  # seconds to wait for a free pooled connection
+WEBHOOK_PATH = 'telegram'
+CONCURRENT_UPDATES = 256  # updates processed at once, so one slow AI reply doesn't stall others
+RATE_LIMIT_MAX_RATE = 30  # Telegram's global cap of messages per second per bot
+RATE_LIMIT_MAX_RETRIES = 3  # retries after a 429 RetryAfter response
+RATE_LIMIT_GROUP_MAX_RATE = 20  # Telegram's cap of messages per minute to one group
+RATE_LIMIT_GROUP_PERIOD = 60  # seconds
+BROADCAST_CONCURRENCY = 30  # in-flight broadcast sends; AIORateLimiter paces the rest
+BROADCAST_SEND_ATTEMPTS = 3  # tries per user for flood-control and network errors
+BROADCAST_FAILURES_FILE = 'data/broadcast_failures.json'
+BROADCAST_FAILURES_LIMIT = 10000  # dead-letter entries kept, newest first
+OPENAI_MAX_CONNECTIONS = 32  # pooled keep-alive connections to api.openai.com
+OPENAI_TIMEOUT = 20.0  # seconds before an AI reply is abandoned
+OPENAI_KEEPALIVE_EXPIRY = 120.0  # idle seconds before a pooled connection is closed
+OPENAI_MAX_RETRIES = 3  # SDK retries on 429/5xx, backing off exponentially or per Retry-After
+OPENAI_MAX_CONCURRENT_REQUESTS = 24  # AI replies generated at once; later ones wait for a slot
+STREAM_EDIT_INTERVAL = 1.0  # seconds between edits of a streamed AI reply
+TYPING_REFRESH_INTERVAL = 4.5  # seconds between typing indicators while a reply is prepared
+AI_MODEL = "gpt-4o-mini"  # default model for FAQ-style customer questions
+AI_TROUBLESHOOTING_MODEL = "gpt-4o"  # larger model for installation and crash problems
+AI_MAX_TOKENS = 300  # reply length cap; truncated replies are logged
+HTTP_SESSION_POOL_SIZE = 16  # pooled connections for OxaPay requests
+HTTP_KEEPALIVE_TIMEOUT = 75  # idle seconds an OxaPay connection stays open for reuse
+HTTP_DNS_CACHE_TTL = 300  # seconds resolved OxaPay addresses are reused
+HTTP_TIMEOUT = 15.0  # seconds before an OxaPay request is abandoned
+REPLY_CACHE_TTL = 24 * 60 * 60  # seconds a cached AI reply stays valid
+REPLY_CACHE_SIZE = 5000  # cached AI replies kept in memory, least recently used evicted first
+
+# Initialize the async OpenAI client on a pooled HTTP client so replies reuse warm
+# TLS connections and never block the event loop
+try:
+    client = AsyncOpenAI(
+        api_key=OPENAI_API_KEY,
+        timeout=OPENAI_TIMEOUT,
+        max_retries=OPENAI_MAX_RETRIES,
+        http_client=httpx.AsyncClient(limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+            keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY
+        ))
+    )
+    logger.info("OpenAI client initialized successfully")
+except Exception as e:
+    logger.error("Failed to initialize OpenAI client: %s", e)
+    client = None
+
+# Caps in-flight AI replies below the connection pool size, so bursts queue here
+# instead of failing on a pool timeout or piling onto the account's rate limit
+_openai_slots = asyncio.Semaphore(OPENAI_MAX_CONCURRENT_REQUESTS)
+
+# Shared aiohttp session for OxaPay calls, closed in post_shutdown
+_http_session: Optional[aiohttp.ClientSession] = None
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Return the shared aiohttp session, opening it on first use"""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=HTTP_SESSION_POOL_SIZE,
+                keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=HTTP_DNS_CACHE_TTL
+            ),
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT)
+        )
+    return _http_session
+
+# User-facing menu texts; only the prices vary, so they are rendered once per pricing change
+USER_WELCOME_TEMPLATE = """🎯 Transform Your iPhone Experience - No Jailbreak Required!
+
+Unlock premium features, unlimited resources, and exclusive content that's normally restricted or paid.
+
+💎 Premium Plan - ONE YEAR Access
+• CarX Street: Unlimited money & all cars unlocked
+• Car Parking Multiplayer: All vehicles & unlimited coins  
+• Spotify++: Premium features without subscription
+• YouTube++: Background play, downloads & ad-free
+• Instagram++: Download photos, videos & stories
+• 200+ Premium Apps & Games included
+
+✨ What You Get:
+• Device-specific optimization for your iPhone
+• Ad-free experience across all apps
+• Hassle-free installation process  
+• Supercharged social media features
+• 3-month revoke guarantee
+• Dedicated expert support
+
+💰 Price: ${usd_amount} USD or {stars_amount} Stars
+🔗 Full app collection: https://cpanda.app/page/ios-subscriptions
+
+Ready to upgrade your iPhone experience?"""
+USER_PLANS_TEMPLATE = """💎 Premium Plan - Complete Access
+
+🎮 Featured Apps & Games:
+• CarX Street: Unlimited money & all cars unlocked
+• Car Parking Multiplayer: All cars unlocked & unlimited coins
+• Spotify++: Premium features without subscription  
+• YouTube++: Background play, downloads & ad-free experience
+• Instagram++: Download photos, videos & stories
+
+📱 Premium Features:
+• Device-specific optimization for your iPhone model
+• Premium app access with all features unlocked
+• Hassle-free installation - no technical knowledge required
+• Supercharged social media apps with exclusive features
+• Automatic updates protection - apps stay working
+• Expert support team available 24/7
+
+🔒 Guarantee:
+• 3-month revoke guarantee included
+• Full refund if service doesn't work as promised
+• Dedicated customer support for all issues
+
+💰 Investment: ${usd_amount} USD or {stars_amount} Stars
+⏰ Duration: ONE YEAR full access
+🔗 Complete catalog: https://cpanda.app/page/ios-subscriptions
+
+Choose your preferred payment method:"""
+
+STARS_PAYMENT_TEMPLATE = """⭐ Telegram Stars Payment - {stars_amount} Stars
+
+Payment Process:
+1. Click the paid post link below
+2. Pay {stars_amount} Telegram Stars to unlock the post
+3. Take a screenshot of the unlocked post
+4. Send screenshot here for admin verification
+5. Admin will verify and send your redeem code
+
+Paid Post Link:
+{stars_post_url}
+
+Important:
+• Must take clear screenshot showing payment completed
+• Admin verifies within 24 hours
+• Valid redeem code sent after verification
+• ONE YEAR Premium Access"""
+
+# Static user menu keyboards, built once and shared by every render
+USER_MAIN_MENU_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("💎 Buy Premium Plan", callback_data="show_plans")],
+    [InlineKeyboardButton("🎁 Panda AppStore Free", url="https://t.me/PandaStoreFreebot")]
+])
+USER_PLANS_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("💳 Pay with Crypto", callback_data="crypto_payment")],
+    [InlineKeyboardButton("⭐ Pay with Telegram Stars", callback_data="stars_payment")],
+    [InlineKeyboardButton("🔙 Back", callback_data="start")]
+])
+BACK_TO_PLANS_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back to Plans", callback_data="show_plans")]])
+BACK_TO_STARS_PAYMENT_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back to Payment", callback_data="stars_payment")]])
+BACK_TO_CRYPTO_PAYMENT_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back to Payment", callback_data="crypto_payment")]])
+EARNING_BOT_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("🎁 Try Earning Bot", url="https://t.me/PandaStoreFreebot")]])
+
+# Static admin back buttons, shared by the panels and input actions that return to each menu
+ADMIN_REDEEM_CODES_BACK_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_redeem_codes")]])
+ADMIN_USERS_BACK_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_users")]])
+ADMIN_PRICING_BACK_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_pricing_config")]])
+ADMIN_STARS_SETUP_BACK_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_setup_stars")]])
+ADMIN_PAYMENT_SETTINGS_BACK_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_payment_settings")]])
+BACK_TO_BROADCASTING_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back to Broadcasting", callback_data="admin_broadcasts")]])
+BACK_TO_USERS_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back to Users", callback_data="admin_users")]])
+
+# Static customer replies
+BANNED_USER_TEXT = "🚫 You are banned from using this bot. Contact support if you believe this is an error."
+SUBMIT_STARS_PROOF_TEXT = "📸 Submit Stars Payment Screenshot\n\nPlease send a clear screenshot showing your Stars payment completion. This will be forwarded to admin for verification.\n\nAdmin will review and send your redeem code within 24 hours."
+SUBMIT_CRYPTO_PROOF_TEXT = "📸 Submit Crypto Payment Screenshot\n\nPlease send a clear screenshot showing your cryptocurrency transaction. Include transaction hash if visible.\n\nAdmin will review and send your redeem code within 24 hours."
+AI_REPLY_INTERRUPTED_TEXT = "⚠️ My reply was cut off. Please try again in a moment or contact our support team."
+CONTACT_SUPPORT_TEXT = "📞 Contact Support\n\nIf you need help with payments or have questions, please describe your issue and an admin will assist you."
+
+# Static admin input errors, shared by every action that parses a number
+INVALID_USER_ID_TEXT = "❌ Invalid User ID. Please send a valid number."
+INVALID_AMOUNT_TEXT = "❌ Invalid amount. Please enter a valid number."
+
+# Kept byte-for-byte identical across calls so OpenAI's prompt cache can match it;
+# never interpolate per-user or time-dependent values into it
+AI_SYSTEM_PROMPT = """You are a professional customer service agent for Panda AppStore, a premium iOS app service that provides modded/premium apps for iPhones without jailbreak.
+
+IMPORTANT: Only respond to questions about Panda AppStore services, pricing, apps, technical support, or related topics. For ANY other topics (general questions, homework, coding help, news, weather, personal advice, etc.), politely decline and redirect to our services.
+
+Service Details:
+- Premium Plan: ONE YEAR access for $35 USD or 2500 Telegram Stars
+- Key apps: CarX Street (unlimited money), Car Parking Multiplayer (all cars), Spotify++, YouTube++, Instagram++
+- 200+ premium apps included
+- Device-specific optimization for iPhones
+- No jailbreak required
+- 3-month revoke guarantee
+- Complete catalog: https://cpanda.app/page/ios-subscriptions
+
+For specific app inquiries, direct users to the complete app collection at: https://cpanda.app/page/ios-subscriptions
+
+When users ask about free content, promote the earning bot: https://t.me/PandaStoreFreebot
+
+For CarX Street specifically, explain it's included in the $35 yearly plan and mention the earning bot as an alternative.
+
+Respond naturally and conversationally, like a helpful human agent. Keep responses focused, helpful, and professional."""
+AI_SYSTEM_MESSAGE = {"role": "system", "content": AI_SYSTEM_PROMPT}
 
 def initialize_data():
     """Initialize all data storage"""
-    files = [
-        'data/conversation_histories.json',
-        'data/active_threads.json',
-        'data/admin_active.json',
-        'data/banned_users.json',
-        'data/user_spam_tracking.json',
-        'data/redeem_codes.json',
-        'data/payment_tracking.json',
-        'data/pending_star_payments.json',
-        'data/pricing_config.json'
-    ]
+    files = {
+        'conversation_histories.json': {},
+        'active_threads.json': {},
+        'banned_users.json': {},
+        'redeem_codes.json': {},
+        'payment_tracking.json': {},
+        'pending_star_payments.json': {},
+        'pricing_config.json': DEFAULT_PRICING
+    }
     
-    for file_path in files:
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        if not os.path.exists(file_path):
-            if file_path.endswith('pricing_config.json'):
-                save_json_file(file_path, {'usd_amount': 35.0, 'stars_amount': 2500})
-            else:
-                save_json_file(file_path, {})
+    # One directory listing instead of an exists() check per file
+    os.makedirs('data', exist_ok=True)
+    with os.scandir('data') as entries:
+        existing = {entry.name for entry in entries}
+    
+    for filename, default in files.items():
+        if filename not in existing:
+            save_json_file(os.path.join('data', filename), default)
 
 def load_json_file(filename: str, default: Any = None) -> Any:
     """Load JSON data from file with error handling"""
     try:
         if os.path.exists(filename):
-            with open(filename, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            with open(filename, 'rb') as f:
+                return orjson.loads(f.read())
         return default if default is not None else {}
-    except (json.JSONDecodeError, FileNotFoundError) as e:
-        logger.error(f"Error loading {filename}: {e}")
+    except (orjson.JSONDecodeError, FileNotFoundError) as e:
+        logger.error("Error loading %s: %s", filename, e)
         return default if default is not None else {}
 
+def _json_default(obj: Any) -> Any:
+    """Serialize the container types orjson doesn't handle natively"""
+    if isinstance(obj, deque):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
 def save_json_file(filename: str, data: Any) -> bool:
     """Save data to JSON file with error handling"""
     try:
-        os.makedirs(os.path.dirname(filename), exist_ok=True)
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        directory = os.path.dirname(filename) or '.'
+        os.makedirs(directory, exist_ok=True)
+        payload = orjson.dumps(data, default=_json_default, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+        
+        # Write to a temp file and rename over the target so a crash never leaves it truncated
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, filename)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
         return True
     except Exception as e:
-        logger.error(f"Error saving {filename}: {e}")
+        logger.error("Error saving %s: %s", filename, e)
+        return False
+
+# In-memory copy of data/redeem_codes.json, populated lazily on first access
+_redeem_codes_cache: Optional[Dict[str, Any]] = None
+
+def load_redeem_codes() -> Dict[str, Any]:
+    """Return the redeem code store, reading it from disk only once"""
+    global _redeem_codes_cache
+    if _redeem_codes_cache is None:
+        _redeem_codes_cache = load_json_file('data/redeem_codes.json', {})
+    return _redeem_codes_cache
+
+def save_redeem_codes(redeem_codes: Dict[str, Any]) -> bool:
+    """Replace the in-memory redeem code store and persist it"""
+    global _redeem_codes_cache, _active_code_pool
+    if redeem_codes is not _redeem_codes_cache:
+        _active_code_pool = None
+    _redeem_codes_cache = redeem_codes
+    return save_json_file('data/redeem_codes.json', redeem_codes)
+
+# FIFO pool of active codes in the order they were added; codes deleted or used
+# through other paths are skipped lazily when taken
+_active_code_pool: Optional[deque] = None
+
+def _get_active_code_pool() -> deque:
+    """Return the active code pool, building it from the store on first use"""
+    global _active_code_pool
+    if _active_code_pool is None:
+        _active_code_pool = deque(
+            code for code, info in load_redeem_codes().items()
+            if isinstance(info, dict) and info.get('status') == 'active'
+        )
+    return _active_code_pool
+
+def take_active_code() -> Optional[str]:
+    """Pop the oldest code that is still active, or None if none are left"""
+    redeem_codes = load_redeem_codes()
+    pool = _get_active_code_pool()
+    while pool:
+        code = pool.popleft()
+        info = redeem_codes.get(code)
+        if isinstance(info, dict) and info.get('status') == 'active':
+            return code
+    return None
+
+def add_redeem_codes(codes: Set[str], created_by: int) -> list:
+    """Add codes missing from the store and return the ones that were new"""
+    redeem_codes = load_redeem_codes()
+    new_codes = sorted(codes - redeem_codes.keys())
+    if not new_codes:
+        return []
+    
+    pool = _get_active_code_pool()
+    created_at = time.time()
+    for code in new_codes:
+        redeem_codes[code] = {
+            'status': 'active',
+            'created_at': created_at,
+            'created_by': created_by
+        }
+    pool.extend(new_codes)
+    save_redeem_codes(redeem_codes)
+    return new_codes
+
+# In-memory copy of data/pricing_config.json, refreshed whenever it is saved
+_pricing_config_cache: Optional[Dict[str, Any]] = None
+
+def load_pricing_config() -> Dict[str, Any]:
+    """Return the pricing config, reading it from disk only once"""
+    global _pricing_config_cache
+    if _pricing_config_cache is None:
+        _pricing_config_cache = {**DEFAULT_PRICING, **load_json_file('data/pricing_config.json', {})}
+    return _pricing_config_cache
+
+def save_pricing_config(pricing_config: Dict[str, Any]) -> bool:
+    """Replace the in-memory pricing config and persist it"""
+    global _pricing_config_cache, _user_menu_texts, _stars_payment_page
+    _pricing_config_cache = pricing_config
+    _user_menu_texts = None
+    _stars_payment_page = None
+    return save_json_file('data/pricing_config.json', pricing_config)
+
+# In-memory copy of data/stars_config.json, populated lazily on first access
+_stars_config_cache: Optional[Dict[str, Any]] = None
+
+def load_stars_config() -> Dict[str, Any]:
+    """Return the Stars payment config, reading it from disk only once"""
+    global _stars_config_cache
+    if _stars_config_cache is None:
+        _stars_config_cache = load_json_file('data/stars_config.json', {})
+    return _stars_config_cache
+
+def save_stars_config(stars_config: Dict[str, Any]) -> bool:
+    """Replace the in-memory Stars payment config and persist it"""
+    global _stars_config_cache, _stars_payment_page
+    _stars_config_cache = stars_config
+    _stars_payment_page = None
+    return save_json_file('data/stars_config.json', stars_config)
+
+# User menu texts rendered for the current pricing, rebuilt after a price change
+_user_menu_texts: Optional[Dict[str, str]] = None
+
+def get_user_menu_text(name: str) -> str:
+    """Return the 'welcome' or 'plans' user text rendered with current prices"""
+    global _user_menu_texts
+    if _user_menu_texts is None:
+        pricing_config = load_pricing_config()
+        prices = {
+            'usd_amount': pricing_config.get('usd_amount', 35),
+            'stars_amount': pricing_config.get('stars_amount', 2500)
+        }
+        _user_menu_texts = {
+            'welcome': USER_WELCOME_TEMPLATE.format(**prices),
+            'plans': USER_PLANS_TEMPLATE.format(**prices)
+        }
+    return _user_menu_texts[name]
+
+# Stars payment screen (text, keyboard) for the current price and paid post URL
+_stars_payment_page: Optional[tuple] = None
+
+def get_stars_payment_page() -> Optional[tuple]:
+    """Return the rendered Stars payment text and keyboard, or None if no paid post is set"""
+    global _stars_payment_page
+    if _stars_payment_page is None:
+        stars_post_url = load_stars_config().get('paid_post_url')
+        if not stars_post_url:
+            return None
+        stars_amount = load_pricing_config().get('stars_amount', 2500)
+        _stars_payment_page = (
+            STARS_PAYMENT_TEMPLATE.format(stars_amount=stars_amount, stars_post_url=stars_post_url),
+            InlineKeyboardMarkup([
+                [InlineKeyboardButton(f"⭐ Pay {stars_amount} Stars", url=stars_post_url)],
+                [InlineKeyboardButton("📸 Submit Screenshot", callback_data="submit_stars_proof")],
+                [InlineKeyboardButton("🔙 Back to Plans", callback_data="show_plans")]
+            ])
+        )
+    return _stars_payment_page
+
+def _int_keys(store: Dict[str, Any]) -> Dict[int, Any]:
+    """Re-key a JSON object by int user IDs; JSON can only store string keys"""
+    return {int(key) if key.lstrip('-').isdigit() else key: value for key, value in store.items()}
+
+# In-memory copy of data/banned_users.json keyed by int user ID; the ban check runs on every update
+_banned_users_cache: Optional[Dict[int, Any]] = None
+
+def load_banned_users() -> Dict[int, Any]:
+    """Return the banned users store, reading it from disk only once"""
+    global _banned_users_cache
+    if _banned_users_cache is None:
+        _banned_users_cache = _int_keys(load_json_file('data/banned_users.json', {}))
+    return _banned_users_cache
+
+def save_banned_users(banned_users: Dict[int, Any]) -> bool:
+    """Replace the in-memory banned users store and persist it"""
+    global _banned_users_cache
+    _banned_users_cache = banned_users
+    return save_json_file('data/banned_users.json', banned_users)
+
+# Conversation histories live in a JSON snapshot plus an append-only JSONL log of
+# new turns, so a reply costs one appended line instead of a full rewrite. Each history
+# is a bounded deque, so appending drops the oldest entries without copying the rest
+_conversation_histories: Optional[Dict[int, deque]] = None
+_history_log_entries = 0
+_history_log: Optional[BinaryIO] = None
+_history_compaction: Optional[asyncio.Task] = None  # background compaction in flight
+_history_flush: Optional[asyncio.TimerHandle] = None  # pending flush of buffered appends
+
+def get_history_log() -> BinaryIO:
+    """Return the append handle for the history log, opening it on first use"""
+    global _history_log
+    if _history_log is None:
+        _history_log = open(CONVERSATION_LOG_FILE, 'ab')
+    return _history_log
+
+def _append_history_entries(histories: Dict[int, deque], user_id: int, entries: list):
+    """Append entries to a user history, keeping only the most recent ones"""
+    user_history = histories.get(user_id)
+    if user_history is None:
+        user_history = histories[user_id] = deque(maxlen=HISTORY_LIMIT)
+    user_history.extend(entries)
+
+def load_conversation_histories() -> Dict[int, deque]:
+    """Return all conversation histories, replaying the log onto the snapshot once"""
+    global _conversation_histories, _history_log_entries
+    if _conversation_histories is None:
+        histories = {
+            user_id: deque(history if isinstance(history, list) else (), maxlen=HISTORY_LIMIT)
+            for user_id, history in _int_keys(load_json_file(CONVERSATION_HISTORIES_FILE, {})).items()
+        }
+        if os.path.exists(CONVERSATION_LOG_FILE):
+            with open(CONVERSATION_LOG_FILE, 'rb') as f:
+                for line in f:
+                    try:
+                        record = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        continue  # Torn last line after a crash
+                    _append_history_entries(histories, int(record['user_id']), record['entries'])
+                    _history_log_entries += 1
+        _conversation_histories = histories
+    return _conversation_histories
+
+def flush_history_log():
+    """Write buffered history appends through to the log file"""
+    global _history_flush
+    _history_flush = None
+    try:
+        get_history_log().flush()
+    except OSError as e:
+        logger.error("Error flushing %s: %s", CONVERSATION_LOG_FILE, e)
+
+def append_conversation_history(user_id: int, *entries: dict):
+    """Record new conversation entries for a user"""
+    global _history_log_entries, _history_compaction, _history_flush
+    _append_history_entries(load_conversation_histories(), user_id, entries)
+    
+    try:
+        get_history_log().write(orjson.dumps({'user_id': user_id, 'entries': entries}) + b'\n')
+    except OSError as e:
+        logger.error("Error appending to %s: %s", CONVERSATION_LOG_FILE, e)
+    # Appends that arrive together share one write to the file
+    if _history_flush is None:
+        _history_flush = asyncio.get_running_loop().call_later(HISTORY_FLUSH_DELAY, flush_history_log)
+    
+    _history_log_entries += 1
+    if _history_log_entries >= HISTORY_COMPACT_EVERY and (_history_compaction is None or _history_compaction.done()):
+        _history_compaction = asyncio.get_running_loop().create_task(compact_conversation_histories())
+
+def trim_idle_histories(histories: Dict[int, deque]) -> int:
+    """Shrink histories of long-idle users to their last entry and return how many were trimmed"""
+    cutoff = time.time() - HISTORY_IDLE_TTL
+    trimmed = 0
+    for user_history in histories.values():
+        if len(user_history) > 1:
+            timestamp = user_history[-1].get('timestamp') if isinstance(user_history[-1], dict) else None
+            if isinstance(timestamp, (int, float)) and timestamp < cutoff:
+                last_entry = user_history[-1]
+                user_history.clear()
+                user_history.append(last_entry)
+                trimmed += 1
+    return trimmed
+
+async def compact_conversation_histories() -> bool:
+    """Fold the append-only log into the JSON snapshot and restart the log"""
+    global _history_log_entries
+    histories = load_conversation_histories()
+    # Users stay listed for broadcasts and stats, but dormant ones keep only their last entry
+    trim_idle_histories(histories)
+    # Serializing and fsyncing every history blocks for a while, so it runs in a worker thread
+    # on a copy; appends keep landing meanwhile, so remember how far the snapshot covers the log
+    snapshot = {user_id: list(user_history) for user_id, user_history in histories.items()}
+    log = get_history_log()
+    folded_at = log.tell()
+    folded_entries = _history_log_entries
+    if not await asyncio.to_thread(save_json_file, CONVERSATION_HISTORIES_FILE, snapshot):
+        return False
+    try:
+        # Carry over whatever was appended during the write, then restart the log with it
+        log.flush()
+        with open(CONVERSATION_LOG_FILE, 'rb') as f:
+            f.seek(folded_at)
+            tail = f.read()
+        log.truncate(0)
+        log.write(tail)
+        log.flush()
+    except OSError as e:
+        logger.error("Error truncating %s: %s", CONVERSATION_LOG_FILE, e)
         return False
+    _history_log_entries -= folded_entries
+    return True
+
+# AI replies keyed by a hash of everything the model sees: prompt, models, recent turns
+# and the normalized question. Entries are stamped with time.monotonic() and carried
+# across restarts by the state DB
+_reply_cache: OrderedDict = OrderedDict()
+reply_cache_hits = 0
+reply_cache_misses = 0
+_pending_replies: Dict[bytes, asyncio.Future] = {}  # replies being generated right now
+# ASCII punctuation ignored when matching questions; emoji and other symbols still count
+_REPLY_CACHE_STRIP = re.compile(f'[{re.escape(string.punctuation)}]')
+# Seeded with the prompt and models so a deploy that changes them never serves stale replies
+_REPLY_CACHE_SEED = hashlib.blake2b(
+    '\0'.join((AI_SYSTEM_PROMPT, AI_MODEL, AI_TROUBLESHOOTING_MODEL)).encode(), digest_size=16
+)
+
+def reply_cache_key(message_text: str, context_turns=()) -> Optional[bytes]:
+    """Hash the recent turns and the message with case, punctuation and whitespace normalized"""
+    normalized = ' '.join(_REPLY_CACHE_STRIP.sub('', message_text.lower()).split())
+    if not normalized:
+        return None  # Punctuation-only messages say nothing that could be matched
+    key = _REPLY_CACHE_SEED.copy()
+    for turn in context_turns:
+        key.update(f"{turn['role']}\0{turn['content']}\0".encode())
+    key.update(normalized.encode())
+    return key.digest()
+
+def get_cached_reply(key: Optional[bytes]) -> Optional[str]:
+    """Return a cached AI reply that has not expired yet"""
+    global reply_cache_hits, reply_cache_misses
+    if not key:
+        return None
+    entry = _reply_cache.get(key)
+    if entry is None:
+        reply_cache_misses += 1
+        return None
+    if time.monotonic() - entry[0] > REPLY_CACHE_TTL:
+        del _reply_cache[key]
+        reply_cache_misses += 1
+        return None
+    _reply_cache.move_to_end(key)
+    reply_cache_hits += 1
+    return entry[1]
+
+def cache_reply(key: bytes, reply: str):
+    """Store an AI reply, dropping the least recently used entry when the cache is full"""
+    if len(_reply_cache) >= REPLY_CACHE_SIZE:
+        _reply_cache.popitem(last=False)
+    _reply_cache[key] = (time.monotonic(), reply)
+
+# Per-message user state (spam and word tracking, admin handoff) is read and written on
+# every customer message, so it lives in SQLite where each update touches one row
+_state_db: Optional[sqlite3.Connection] = None
+
+def get_state_db() -> sqlite3.Connection:
+    """Return the SQLite connection for per-message user state, creating tables on first use"""
+    global _state_db
+    if _state_db is None:
+        os.makedirs(os.path.dirname(STATE_DB_FILE), exist_ok=True)
+        _state_db = sqlite3.connect(STATE_DB_FILE, isolation_level=None)
+        _state_db.execute('PRAGMA journal_mode=WAL')
+        _state_db.execute('PRAGMA synchronous=NORMAL')
+        _state_db.executescript("""
+            CREATE TABLE IF NOT EXISTS admin_active (
+                user_id INTEGER PRIMARY KEY,
+                admin_id INTEGER,
+                last_activity REAL NOT NULL,
+                user_last_message REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS spam_tracking (
+                user_id INTEGER PRIMARY KEY,
+                messages BLOB NOT NULL,
+                last_message TEXT NOT NULL,
+                last_seen REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS word_tracking (
+                user_id INTEGER PRIMARY KEY,
+                word_counts BLOB NOT NULL,
+                last_reset REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS reply_cache (
+                key BLOB PRIMARY KEY,
+                stored_at REAL NOT NULL,
+                reply TEXT NOT NULL
+            );
+        """)
+    return _state_db
+
+def load_reply_cache():
+    """Restore the unexpired AI replies saved at the last shutdown"""
+    try:
+        # Stored times are wall-clock; map them back onto this process's monotonic clock
+        offset = time.monotonic() - time.time()
+        rows = get_state_db().execute(
+            'SELECT key, stored_at, reply FROM reply_cache WHERE stored_at > ? ORDER BY rowid',
+            (time.time() - REPLY_CACHE_TTL,)
+        ).fetchall()
+        for key, stored_at, reply in rows[-REPLY_CACHE_SIZE:]:
+            _reply_cache[key] = (stored_at + offset, reply)
+        logger.info("Restored %s cached AI replies", len(_reply_cache))
+    except sqlite3.Error as e:
+        logger.error("Error loading reply cache: %s", e)
+
+def save_reply_cache():
+    """Persist the AI reply cache, least recently used first, so restarts keep it warm"""
+    db = get_state_db()
+    try:
+        offset = time.time() - time.monotonic()
+        db.execute('BEGIN')
+        db.execute('DELETE FROM reply_cache')
+        db.executemany(
+            'INSERT INTO reply_cache (key, stored_at, reply) VALUES (?, ?, ?)',
+            ((key, stamp + offset, reply) for key, (stamp, reply) in _reply_cache.items())
+        )
+        db.execute('COMMIT')
+    except sqlite3.Error as e:
+        if db.in_transaction:
+            db.execute('ROLLBACK')
+        logger.error("Error saving reply cache: %s", e)
 
 def is_admin(user_id: int) -> bool:
     """Check if user is admin"""
     return user_id in ADMIN_IDS
 
-def is_admin_actively_responding(user_id: int) -> bool:
-    """Check if admin is actively responding to this user"""
-    admin_active = load_json_file('data/admin_active.json', {})
-    user_str = str(user_id)
+def parse_user_id(text: str) -> Optional[int]:
+    """Parse a user ID typed by an admin, returning None if it isn't a whole number"""
+    text = text.strip()
+    digits = text[1:] if text.startswith('-') else text
+    return int(text) if digits.isdecimal() else None
+
+def admin_only(handler):
+    """Run a message handler only for admin messages; also guards direct calls"""
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if not update.message or not update.effective_user or not is_admin(update.effective_user.id):
+            return
+        return await handler(update, context)
+    return wrapper
+
+def is_admin_handling_user(user_id: int) -> bool:
+    """Record a customer message and report whether an admin replied to them recently"""
+    state_db = get_state_db()
+    current_time = time.time()
+    row = state_db.execute('SELECT last_activity FROM admin_active WHERE user_id = ?', (user_id,)).fetchone()
     
-    if user_str in admin_active:
-        last_activity = admin_active[user_str].get('last_activity', 0)
-        current_time = time.time()
-        
-        # Admin is considered active if they responded within the last 20 seconds
-        if current_time - last_activity < 20:
-            return True
-        else:
-            # Remove expired admin activity
-            del admin_active[user_str]
-            save_json_file('data/admin_active.json', admin_active)
-            return False
+    if row is None:
+        return False
     
+    if current_time - row[0] < ADMIN_HANDOFF_WINDOW:
+        state_db.execute('UPDATE admin_active SET user_last_message = ? WHERE user_id = ?', (current_time, user_id))
+        return True
+    
+    # The admin went quiet; drop the handoff so the AI answers again
+    state_db.execute('DELETE FROM admin_active WHERE user_id = ?', (user_id,))
     return False
 
 def mark_admin_active(user_id: int, admin_id: int):
     """Mark admin as actively responding to user"""
-    admin_active = load_json_file('data/admin_active.json', {})
-    admin_active[str(user_id)] = {
-        'admin_id': admin_id,
-        'last_activity': time.time(),
-        'user_last_message': admin_active.get(str(user_id), {}).get('user_last_message', time.time())
-    }
-    save_json_file('data/admin_active.json', admin_active)
-
-def update_user_last_message(user_id: int):
-    """Update timestamp when user sends a message"""
-    admin_active = load_json_file('data/admin_active.json', {})
-    user_str = str(user_id)
-    
-    if user_str in admin_active:
-        admin_active[user_str]['user_last_message'] = time.time()
-    else:
-        admin_active[user_str] = {
-            'admin_id': None,
-            'last_activity': 0,
-            'user_last_message': time.time()
-        }
-    save_json_file('data/admin_active.json', admin_active)
-
-def should_ai_respond_after_timeout(user_id: int) -> bool:
-    """Check if AI should respond after 20 seconds of admin inactivity"""
-    admin_active = load_json_file('data/admin_active.json', {})
-    user_str = str(user_id)
-    
-    if user_str in admin_active:
-        user_last_message = admin_active[user_str].get('user_last_message', 0)
-        admin_last_activity = admin_active[user_str].get('last_activity', 0)
-        current_time = time.time()
-        
-        # If admin was active but hasn't responded to user's last message within 20 seconds
-        if (admin_last_activity > 0 and 
-            user_last_message > admin_last_activity and 
-            current_time - user_last_message >= 20):
-            # Remove admin activity and let AI take over
-            del admin_active[user_str]
-            save_json_file('data/admin_active.json', admin_active)
-            return True
-    
-    return False
+    current_time = time.time()
+    get_state_db().execute(
+        """INSERT INTO admin_active (user_id, admin_id, last_activity, user_last_message) VALUES (?, ?, ?, ?)
+           ON CONFLICT(user_id) DO UPDATE SET admin_id = excluded.admin_id, last_activity = excluded.last_activity""",
+        (user_id, admin_id, current_time, current_time)
+    )
 
 async def forward_user_message_to_admin_thread(context, user_id: int, username: str, message_text: str):
     """Forward user message to admin thread when admin is actively handling"""
     try:
-        thread_id = await get_or_create_thread_id(context, user_id, username)
+        thread_id = await send_to_customer_thread(context, user_id, username, f"💬 {username}: {message_text}")
         if thread_id:
-            await context.bot.send_message(
-                chat_id=GROUP_ID,
-                message_thread_id=thread_id,
-                text=f"💬 {username}: {message_text}"
-            )
-            logger.info(f"Forwarded user message to admin thread {thread_id}")
+            logger.info("Forwarded user message to admin thread %s", thread_id)
     except Exception as e:
-        logger.error(f"Error forwarding user message to admin thread: {e}")
+        logger.error("Error forwarding user message to admin thread: %s", e)
+
+def _keyword_pattern(keywords) -> re.Pattern:
+    """Compile keywords into one regex that matches any of them as a substring"""
+    return re.compile('|'.join(map(re.escape, keywords)))
+
+# Keyword scans run on every customer message, so each list is a single precompiled regex
+FREE_CONTENT_PATTERN = _keyword_pattern((
+    'free', 'gratis', 'gratuit', 'kostenlos', 'gratuito',
+    'trial', 'demo', 'test',
+    'without pay', 'no cost', 'no money',
+    'cracked', 'hack', 'mod',
+    'pirate', 'illegal', 'stolen'
+))
+GAME_PATTERN = _keyword_pattern((
+    'carx', 'car x', 'car parking', 'parking multiplayer',
+    'pubg', 'fortnite', 'minecraft', 'roblox',
+    'clash', 'candy crush', 'subway surfers'
+))
+FREE_GAME_PATTERN = _keyword_pattern(('free', 'crack', 'mod', 'hack'))
+
+# Words that mark a technical problem worth the larger model
+TROUBLESHOOTING_PATTERN = _keyword_pattern((
+    'error', 'crash', 'stuck', 'not working', "doesn't work", "won't open",
+    'revoked', 'untrusted', 'install fail', 'failed', 'bug'
+))
 
 def detect_free_content_request(message: str) -> bool:
     """Detect if user is asking for free apps, games, or subscriptions"""
-    free_keywords = [
-        'free', 'gratis', 'gratuit', 'kostenlos', 'gratuito',
-        'trial', 'demo', 'test',
-        'without pay', 'no cost', 'no money',
-        'cracked', 'hack', 'mod',
-        'pirate', 'illegal', 'stolen'
-    ]
-    
-    game_keywords = [
-        'carx', 'car x', 'car parking', 'parking multiplayer',
-        'pubg', 'fortnite', 'minecraft', 'roblox',
-        'clash', 'candy crush', 'subway surfers'
-    ]
-    
     message_lower = message.lower()
     
     # Check for explicit free requests
-    for keyword in free_keywords:
-        if keyword in message_lower:
-            return True
+    if FREE_CONTENT_PATTERN.search(message_lower):
+        return True
     
     # Check for game requests that might imply free access
-    for game in game_keywords:
-        if game in message_lower and any(free_word in message_lower for free_word in ['free', 'crack', 'mod', 'hack']):
-            return True
-    
-    return False
+    return bool(GAME_PATTERN.search(message_lower) and FREE_GAME_PATTERN.search(message_lower))
 
-def detect_carx_street_request(message: str) -> bool:
-    """Specifically detect CarX Street requests"""
-    carx_keywords = ['carx', 'car x', 'carx street', 'car x street']
-    message_lower = message.lower()
-    return any(keyword in message_lower for keyword in carx_keywords)
+def detect_troubleshooting_request(message: str) -> bool:
+    """Detect if user needs help with a technical problem"""
+    return TROUBLESHOOTING_PATTERN.search(message.lower()) is not None
 
 def calculate_message_similarity(msg1: str, msg2: str) -> float:
     """Calculate similarity between two messages"""
@@ -239,36 +857,37 @@ def calculate_message_similarity(msg1: str, msg2: str) -> float:
 
 def check_word_repetition(user_id: int, message: str) -> dict:
     """Check if user is repeating the same word multiple times"""
-    word_tracking = load_json_file('data/user_word_tracking.json', {})
-    user_str = str(user_id)
+    state_db = get_state_db()
     current_time = time.time()
     
-    if user_str not in word_tracking:
-        word_tracking[user_str] = {'word_counts': {}, 'last_reset': current_time}
-    
-    user_data = word_tracking[user_str]
+    row = state_db.execute('SELECT word_counts, last_reset FROM word_tracking WHERE user_id = ?', (user_id,)).fetchone()
+    word_counts, last_reset = (orjson.loads(row[0]), row[1]) if row else ({}, current_time)
     
     # Reset counts every hour
-    if current_time - user_data.get('last_reset', 0) > 3600:
-        user_data['word_counts'] = {}
-        user_data['last_reset'] = current_time
+    if current_time - last_reset > 3600:
+        word_counts = {}
+        last_reset = current_time
     
     # Count word occurrences in message
     words = message.lower().split()
     for word in words:
         if len(word) > 2:  # Only track words longer than 2 characters
-            user_data['word_counts'][word] = user_data['word_counts'].get(word, 0) + 1
+            word_counts[word] = word_counts.get(word, 0) + 1
     
     # Check for excessive repetition
     max_count = 0
     repeated_word = None
-    for word, count in user_data['word_counts'].items():
+    for word, count in word_counts.items():
         if count > max_count:
             max_count = count
             repeated_word = word
     
-    word_tracking[user_str] = user_data
-    save_json_file('data/user_word_tracking.json', word_tracking)
+    # Counts older than the hourly reset are dead weight; keep only recently active users
+    state_db.execute('DELETE FROM word_tracking WHERE last_reset < ?', (current_time - 3600,))
+    state_db.execute(
+        'INSERT OR REPLACE INTO word_tracking (user_id, word_counts, last_reset) VALUES (?, ?, ?)',
+        (user_id, orjson.dumps(word_counts), last_reset)
+    )
     
     return {
         'max_count': max_count,
@@ -279,40 +898,41 @@ def check_word_repetition(user_id: int, message: str) -> dict:
 
 def is_spam_message(user_id: int, message: str) -> bool:
     """Check if message should be considered spam"""
-    spam_tracking = load_json_file('data/user_spam_tracking.json', {})
-    user_str = str(user_id)
+    state_db = get_state_db()
     current_time = time.time()
     
-    if user_str not in spam_tracking:
-        spam_tracking[user_str] = {'messages': [], 'last_message': ''}
-    
-    user_data = spam_tracking[user_str]
+    row = state_db.execute('SELECT messages, last_message FROM spam_tracking WHERE user_id = ?', (user_id,)).fetchone()
+    messages, last_message = (orjson.loads(row[0]), row[1]) if row else ([], '')
     
     # Remove old messages outside the spam window
-    user_data['messages'] = [
-        msg_time for msg_time in user_data['messages']
+    messages = [
+        msg_time for msg_time in messages
         if current_time - msg_time < SPAM_WINDOW
     ]
     
     # Check message frequency
-    if len(user_data['messages']) >= SPAM_THRESHOLD:
+    if len(messages) >= SPAM_THRESHOLD:
         return True
     
     # Check message similarity
-    if user_data.get('last_message'):
-        similarity = calculate_message_similarity(message, user_data['last_message'])
-        if similarity > SIMILARITY_THRESHOLD and len(user_data['messages']) >= 2:
+    if last_message:
+        similarity = calculate_message_similarity(message, last_message)
+        if similarity > SIMILARITY_THRESHOLD and len(messages) >= 2:
             return True
     
     # Check minimum interval between messages
-    if user_data['messages'] and current_time - user_data['messages'][-1] < 2:
+    if messages and current_time - messages[-1] < 2:
         return True
     
     # Update tracking
-    user_data['messages'].append(current_time)
-    user_data['last_message'] = message
-    spam_tracking[user_str] = user_data
-    save_json_file('data/user_spam_tracking.json', spam_tracking)
+    messages.append(current_time)
+    
+    # Users with nothing left in the window can't trip a check; drop them so the table stays small
+    state_db.execute('DELETE FROM spam_tracking WHERE last_seen <= ?', (current_time - SPAM_WINDOW,))
+    state_db.execute(
+        'INSERT OR REPLACE INTO spam_tracking (user_id, messages, last_message, last_seen) VALUES (?, ?, ?, ?)',
+        (user_id, orjson.dumps(messages), message, current_time)
+    )
     
     return False
 
@@ -367,7 +987,7 @@ def calculate_ban_duration(user_id: int) -> dict:
 
 def ban_user_progressive(user_id: int, username: str = None, reason: str = 'Spam/Abuse') -> dict:
     """Ban user with progressive penalties"""
-    banned_users = load_json_file('data/banned_users.json', {})
+    banned_users = load_banned_users()
     ban_history = load_json_file('data/user_ban_history.json', {})
     
     user_str = str(user_id)
@@ -389,7 +1009,7 @@ def ban_user_progressive(user_id: int, username: str = None, reason: str = 'Spam
     save_json_file('data/user_ban_history.json', ban_history)
     
     # Apply ban
-    banned_users[user_str] = {
+    banned_users[user_id] = {
         'banned_at': current_time,
         'ban_type': ban_info['ban_type'],
         'duration': ban_info['duration'],
@@ -398,7 +1018,7 @@ def ban_user_progressive(user_id: int, username: str = None, reason: str = 'Spam
         'ban_count': ban_history[user_str]['ban_count']
     }
     
-    save_json_file('data/banned_users.json', banned_users)
+    save_banned_users(banned_users)
     
     return {
         'success': True,
@@ -411,12 +1031,6 @@ def send_warning_message(user_id: int, repeated_word: str, count: int) -> str:
     """Generate warning message for word repetition"""
     return f"⚠️ Warning: You've repeated the word '{repeated_word}' {count} times. Please avoid excessive repetition or you may be temporarily banned."
 
-def ban_user_for_spam(user_id: int, username: str = None) -> bool:
-    """Ban user using progressive system"""
-    result = ban_user_progressive(user_id, username, 'Automatic spam detection')
-    logger.info(f"Progressive ban applied to user {user_id} ({username}): {result['duration_text']}")
-    return result['success']
-
 async def calculate_typing_delay(message_length: int) -> float:
     """Calculate realistic typing delay based on message length"""
     base_delay = 3.0  # Base thinking time
@@ -429,79 +1043,174 @@ async def calculate_typing_delay(message_length: int) -> float:
     total_delay = base_delay + typing_time + randomness
     return min(max(total_delay, 3.0), 15.0)  # Between 3-15 seconds
 
-async def send_realistic_typing(context, chat_id: int, message: str):
-    """Send realistic typing indicator based on message length"""
+async def send_notice(context, chat_id: int, text: str, reply_markup=None) -> bool:
+    """Send a side notification, logging instead of raising if it can't be delivered"""
+    try:
+        await context.bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup)
+        return True
+    except Exception as e:
+        logger.warning("Could not send notice to %s: %s", chat_id, e)
+        return False
+
+async def send_typing_action(context, chat_id: int):
+    """Show the typing indicator, logging instead of raising on failure"""
+    try:
+        await context.bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
+    except Exception as e:
+        logger.error("Error sending typing indicator: %s", e)
+
+async def keep_typing(context, chat_id: int):
+    """Show the typing indicator until cancelled; Telegram clears it after about five seconds"""
+    while True:
+        await send_typing_action(context, chat_id)
+        await asyncio.sleep(TYPING_REFRESH_INTERVAL)
+
+class PartialReplyError(Exception):
+    """An AI reply failed after part of it was already shown to the customer"""
+    def __init__(self, partial: str):
+        super().__init__("AI reply interrupted")
+        self.partial = partial
+
+async def stream_ai_reply(message, messages: list, model: str = AI_MODEL, reply_markup=None) -> str:
+    """Stream an AI reply into one Telegram message, editing it as tokens arrive"""
+    parts = []
+    sent = None
+    shown = ""
+    
+    async def show(text: str):
+        """Put the partial reply on screen, sending it first if nothing is shown yet"""
+        nonlocal sent, shown
+        try:
+            if sent is None:
+                sent = await message.reply_text(text)
+            else:
+                await sent.edit_text(text)
+            shown = text
+        except TelegramError as e:
+            # A missed partial update is harmless: the next one or the final edit catches up
+            logger.error("Error editing streamed reply: %s", e)
+    
     try:
-        delay = await calculate_typing_delay(len(message))
-        await context.bot.send_chat_action(chat_id=chat_id, action="typing")
-        await asyncio.sleep(delay)
+        async with _openai_slots:
+            stream = await client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=AI_MAX_TOKENS,
+                temperature=0.7,
+                stream=True
+            )
+            
+            last_edit = 0.0
+            edit_task = None
+            try:
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    if chunk.choices[0].finish_reason == "length":
+                        logger.info("AI reply from %s hit the %s token limit", model, AI_MAX_TOKENS)
+                    delta = chunk.choices[0].delta.content
+                    if not delta:
+                        continue
+                    parts.append(delta)
+                    
+                    # Throttle edits to stay well inside Telegram's flood limits; an edit runs
+                    # alongside the stream, so tokens keep arriving during its round-trip
+                    if time.monotonic() - last_edit < STREAM_EDIT_INTERVAL:
+                        continue
+                    if edit_task is not None and not edit_task.done():
+                        continue
+                    text = "".join(parts)
+                    if not text.strip():
+                        continue
+                    edit_task = asyncio.create_task(show(text))
+                    last_edit = time.monotonic()
+            finally:
+                # The final edit must land after the last partial one
+                if edit_task is not None:
+                    await asyncio.gather(edit_task, return_exceptions=True)
+        
+        ai_response = "".join(parts).strip()
+        if not ai_response:
+            raise Exception("Empty AI response")
+        
+        # Final edit delivers the full text and attaches the keyboard, if any
+        if sent is None:
+            await message.reply_text(ai_response, reply_markup=reply_markup)
+        elif ai_response != shown.strip() or reply_markup:
+            await sent.edit_text(ai_response, reply_markup=reply_markup)
+        return ai_response
     except Exception as e:
-        logger.error(f"Error sending typing indicator: {e}")
+        if sent is None:
+            raise
+        # Part of the reply is already on screen: close it with a notice rather than
+        # leaving it cut off under a separate error message
+        logger.error("AI reply interrupted after partial output: %s", e)
+        partial = shown.strip()
+        try:
+            await sent.edit_text(f"{partial}\n\n{AI_REPLY_INTERRUPTED_TEXT}")
+        except TelegramError as edit_error:
+            logger.error("Error marking interrupted reply: %s", edit_error)
+        raise PartialReplyError(partial) from e
+
+async def generate_ai_reply(message, messages: list, model: str, reply_markup, reply_key: Optional[bytes]) -> str:
+    """Stream a new AI reply, sharing it with identical questions asked meanwhile"""
+    if reply_key is None:
+        return await stream_ai_reply(message, messages, model, reply_markup)
+    
+    # Another customer is already getting this answer: wait for it instead of a second API call
+    pending = _pending_replies.get(reply_key)
+    if pending is not None:
+        ai_response = await asyncio.shield(pending)
+        if ai_response is None:
+            raise Exception("Shared AI reply failed")
+        await message.reply_text(ai_response, reply_markup=reply_markup)
+        return ai_response
+    
+    future = asyncio.get_running_loop().create_future()
+    _pending_replies[reply_key] = future
+    ai_response = None
+    try:
+        ai_response = await stream_ai_reply(message, messages, model, reply_markup)
+        cache_reply(reply_key, ai_response)
+        return ai_response
+    finally:
+        del _pending_replies[reply_key]
+        future.set_result(ai_response)
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /start command with intelligent menu routing"""
     user_id = update.effective_user.id
     username = update.effective_user.first_name or update.effective_user.username or f"User{user_id}"
     
+    user_is_admin = is_admin(user_id)
+    
     # Check if user is banned (skip admins)
-    if not is_admin(user_id):
-        banned_users = load_json_file('data/banned_users.json', {})
-        if str(user_id) in banned_users:
-            await update.message.reply_text("🚫 You are banned from using this bot. Contact support if you believe this is an error.")
+    if not user_is_admin:
+        banned_users = load_banned_users()
+        if user_id in banned_users:
+            await update.message.reply_text(BANNED_USER_TEXT)
             return
     
     # Route to appropriate menu
-    if is_admin(user_id):
+    if user_is_admin:
         await show_admin_main_menu(update, context)
     else:
         await show_user_main_menu(update, context, username)
 
 async def show_user_main_menu(update, context, username=None):
     """Show main menu for regular users"""
-    pricing_config = load_json_file('data/pricing_config.json', {'usd_amount': 35.0, 'stars_amount': 2500})
-    usd_amount = pricing_config.get('usd_amount', 35)
-    stars_amount = pricing_config.get('stars_amount', 2500)
-    
-    welcome_text = f"""🎯 Transform Your iPhone Experience - No Jailbreak Required!
-
-Unlock premium features, unlimited resources, and exclusive content that's normally restricted or paid.
-
-💎 Premium Plan - ONE YEAR Access
-• CarX Street: Unlimited money & all cars unlocked
-• Car Parking Multiplayer: All vehicles & unlimited coins  
-• Spotify++: Premium features without subscription
-• YouTube++: Background play, downloads & ad-free
-• Instagram++: Download photos, videos & stories
-• 200+ Premium Apps & Games included
-
-✨ What You Get:
-• Device-specific optimization for your iPhone
-• Ad-free experience across all apps
-• Hassle-free installation process  
-• Supercharged social media features
-• 3-month revoke guarantee
-• Dedicated expert support
-
-💰 Price: ${usd_amount} USD or {stars_amount} Stars
-🔗 Full app collection: https://cpanda.app/page/ios-subscriptions
-
-Ready to upgrade your iPhone experience?"""
-    
-    keyboard = [
-        [InlineKeyboardButton("💎 Buy Premium Plan", callback_data="show_plans")],
-        [InlineKeyboardButton("🎁 Panda AppStore Free", url="https://t.me/PandaStoreFreebot")]
-    ]
+    welcome_text = get_user_menu_text('welcome')
     
     if hasattr(update, 'message') and update.message:
         await update.message.reply_text(
             welcome_text,
-            reply_markup=InlineKeyboardMarkup(keyboard),
+            reply_markup=USER_MAIN_MENU_MARKUP,
             disable_web_page_preview=True
         )
     elif hasattr(update, 'edit_message_text'):
         await update.edit_message_text(
             welcome_text,
-            reply_markup=InlineKeyboardMarkup(keyboard),
+            reply_markup=USER_MAIN_MENU_MARKUP,
             disable_web_page_preview=True
         )
 
@@ -509,10 +1218,10 @@ async def show_admin_main_menu(update, context):
     """Show main menu for admin users with real-time dashboard"""
     try:
         # Get real-time statistics
-        conversation_histories = load_json_file('data/conversation_histories.json', {})
-        banned_users = load_json_file('data/banned_users.json', {})
-        redeem_codes = load_json_file('data/redeem_codes.json', {})
-        pricing_config = load_json_file('data/pricing_config.json', {'usd_amount': 35.0, 'stars_amount': 2500})
+        conversation_histories = load_conversation_histories()
+        banned_users = load_banned_users()
+        redeem_codes = load_redeem_codes()
+        pricing_config = load_pricing_config()
         
         total_users = len(conversation_histories) if isinstance(conversation_histories, dict) else 0
         banned_count = len(banned_users) if isinstance(banned_users, dict) else 0
@@ -566,51 +1275,61 @@ async def show_admin_main_menu(update, context):
         await update.message.reply_text(admin_text, reply_markup=InlineKeyboardMarkup(keyboard))
         
     except Exception as e:
-        logger.error(f"Error showing admin menu: {e}")
+        logger.error("Error showing admin menu: %s", e)
         await update.message.reply_text("Error loading admin panel. Please try again.")
 
+async def admin_callback_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle admin_* callback queries; registered with a pattern so PTB routes them here"""
+    query = update.callback_query
+    await query.answer()
+    
+    # Customers can see admin buttons (e.g. ban requests in the group) but can't use them
+    if not is_admin(query.from_user.id):
+        return
+    
+    await handle_admin_callbacks(query, query.data, context)
+
 async def callback_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle all callback queries with comprehensive routing"""
+    """Handle customer menu callback queries"""
     query = update.callback_query
     await query.answer()
     
     data = query.data
     user_id = query.from_user.id
     
-    # Check if user is banned (skip admins)
-    if not is_admin(user_id):
-        banned_users = load_json_file('data/banned_users.json', {})
-        if str(user_id) in banned_users:
-            await query.edit_message_text("🚫 You are banned from using this bot. Contact support if you believe this is an error.")
-            return
+    # Admin menus only use admin_* callbacks
+    if is_admin(user_id):
+        return
+    
+    # Check if user is banned
+    banned_users = load_banned_users()
+    if user_id in banned_users:
+        await query.edit_message_text(BANNED_USER_TEXT)
+        return
     
     try:
-        # Route based on user type and callback data
-        if is_admin(user_id):
-            await handle_admin_callbacks(query, data, context)
-        else:
-            await handle_user_callbacks(query, data, context)
+        await handle_user_callbacks(query, data, context)
             
     except Exception as e:
-        logger.error(f"Callback error: {e}")
+        logger.error("Callback error: %s", e)
         await query.edit_message_text(
             "An error occurred. Please try again or contact support.",
             reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🏠 Main Menu", callback_data="start")]])
         )
 
-async def handle_crypto_payment(query, context):
+async def handle_crypto_payment(query, data, context):
     """Handle cryptocurrency payment through OxaPay"""
     user_id = query.from_user.id
     
     if not OXAPAY_API_KEY:
         await query.edit_message_text(
             "❌ Cryptocurrency Payment Not Available\n\nPayment system is not configured. Please try Stars payment or contact support.",
-            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back to Plans", callback_data="show_plans")]])
+            reply_markup=BACK_TO_PLANS_MARKUP
         )
         return
     
     # Get current pricing
-    pricing_config = load_json_file('data/pricing_config.json', {'usd_amount': 35.0})
+    pricing_config = load_pricing_config()
     amount = float(pricing_config.get('usd_amount', 35.0))
     
     # Create OxaPay payment
@@ -640,12 +1359,11 @@ async def handle_crypto_payment(query, context):
             'orderId': order_id
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    if result.get('result') == 100 and result.get('payLink'):
-                        crypto_text = f"""💳 Cryptocurrency Payment - ${amount:.0f} USD
+        async with get_http_session().post(url, json=payload) as response:
+            if response.status == 200:
+                result = await response.json()
+                if result.get('result') == 100 and result.get('payLink'):
+                    crypto_text = f"""💳 Cryptocurrency Payment - ${amount:.0f} USD
 
 🎯 Premium Plan Access
 
@@ -670,19 +1388,19 @@ Important:
 • Payment expires in 30 minutes
 • Use exact amount shown
 • Admin will manually send code after verification"""
-                        
-                        keyboard = [
-                            [InlineKeyboardButton(f"💳 Pay ${amount:.0f} with Crypto", url=result['payLink'])],
-                            [InlineKeyboardButton("📞 Contact Support", callback_data="contact_support")],
-                            [InlineKeyboardButton("🔙 Back to Plans", callback_data="show_plans")]
-                        ]
-                        
-                        await query.edit_message_text(
-                            crypto_text,
-                            reply_markup=InlineKeyboardMarkup(keyboard)
-                        )
-                        return
-                
+                    
+                    keyboard = [
+                        [InlineKeyboardButton(f"💳 Pay ${amount:.0f} with Crypto", url=result['payLink'])],
+                        [InlineKeyboardButton("📞 Contact Support", callback_data="contact_support")],
+                        [InlineKeyboardButton("🔙 Back to Plans", callback_data="show_plans")]
+                    ]
+                    
+                    await query.edit_message_text(
+                        crypto_text,
+                        reply_markup=InlineKeyboardMarkup(keyboard)
+                    )
+                    return
+            
         # Fallback to manual payment
         crypto_text = f"""💳 Manual Cryptocurrency Payment - ${amount:.0f} USD
 
@@ -711,343 +1429,246 @@ After payment:
         )
         
     except Exception as e:
-        logger.error(f"Crypto payment error: {e}")
+        logger.error("Crypto payment error: %s", e)
         await query.edit_message_text(
             "❌ Payment system temporarily unavailable. Please try again later or contact support.",
-            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back to Plans", callback_data="show_plans")]])
+            reply_markup=BACK_TO_PLANS_MARKUP
         )
 
-async def handle_stars_payment(query, context):
+async def handle_stars_payment(query, data, context):
     """Handle Telegram Stars payment"""
     user_id = query.from_user.id
     
-    # Get configured Stars post URL
-    stars_config = load_json_file('data/stars_config.json', {})
-    stars_post_url = stars_config.get('paid_post_url')
+    stars_page = get_stars_payment_page()
     
-    if not stars_post_url:
+    if stars_page is None:
         await query.edit_message_text(
             "❌ Stars Payment Not Available\n\nAdmin has not configured the Stars payment post yet. Please try cryptocurrency payment or contact support.",
-            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back to Plans", callback_data="show_plans")]])
+            reply_markup=BACK_TO_PLANS_MARKUP
         )
         return
     
-    # Get current pricing
-    pricing_config = load_json_file('data/pricing_config.json', {'stars_amount': 2500})
-    stars_amount = pricing_config.get('stars_amount', 2500)
-    
-    stars_text = f"""⭐ Telegram Stars Payment - {stars_amount} Stars
+    stars_text, stars_markup = stars_page
+    await query.edit_message_text(stars_text, reply_markup=stars_markup)
 
-Payment Process:
-1. Click the paid post link below
-2. Pay {stars_amount} Telegram Stars to unlock the post
-3. Take a screenshot of the unlocked post
-4. Send screenshot here for admin verification
-5. Admin will verify and send your redeem code
-
-Paid Post Link:
-{stars_post_url}
+async def start_callback(query, data, context):
+    """Go back to the main menu"""
+    await query.edit_message_text(
+        get_user_menu_text('welcome'),
+        reply_markup=USER_MAIN_MENU_MARKUP,
+        disable_web_page_preview=True
+    )
 
-Important:
-• Must take clear screenshot showing payment completed
-• Admin verifies within 24 hours
-• Valid redeem code sent after verification
-• ONE YEAR Premium Access"""
-    
-    keyboard = [
-        [InlineKeyboardButton(f"⭐ Pay {stars_amount} Stars", url=stars_post_url)],
-        [InlineKeyboardButton("📸 Submit Screenshot", callback_data="submit_stars_proof")],
-        [InlineKeyboardButton("🔙 Back to Plans", callback_data="show_plans")]
-    ]
-    
+async def show_plans_callback(query, data, context):
+    """Show the premium plans"""
     await query.edit_message_text(
-        stars_text,
-        reply_markup=InlineKeyboardMarkup(keyboard)
+        get_user_menu_text('plans'),
+        reply_markup=USER_PLANS_MARKUP,
+        disable_web_page_preview=True
     )
 
+async def submit_stars_proof_callback(query, data, context):
+    """Ask for the Stars payment screenshot"""
+    context.user_data['awaiting_stars_screenshot'] = True
+    await query.edit_message_text(SUBMIT_STARS_PROOF_TEXT, reply_markup=BACK_TO_STARS_PAYMENT_MARKUP)
+
+async def submit_crypto_proof_callback(query, data, context):
+    """Ask for the crypto payment screenshot"""
+    context.user_data['awaiting_crypto_screenshot'] = True
+    await query.edit_message_text(SUBMIT_CRYPTO_PROOF_TEXT, reply_markup=BACK_TO_CRYPTO_PAYMENT_MARKUP)
+
+async def contact_support_callback(query, data, context):
+    """Show how to reach support"""
+    await query.edit_message_text(CONTACT_SUPPORT_TEXT, reply_markup=BACK_TO_PLANS_MARKUP)
+
+# Customer callback_data -> handler
+USER_CALLBACK_ROUTES = {
+    "start": start_callback,
+    "show_plans": show_plans_callback,
+    "crypto_payment": handle_crypto_payment,
+    "stars_payment": handle_stars_payment,
+    "submit_stars_proof": submit_stars_proof_callback,
+    "submit_crypto_proof": submit_crypto_proof_callback,
+    "contact_support": contact_support_callback
+}
+
 async def handle_user_callbacks(query, data, context):
     """Handle user menu callbacks"""
-    if data == "crypto_payment":
-        await handle_crypto_payment(query, context)
-        
-    elif data == "stars_payment":
-        await handle_stars_payment(query, context)
-        
-    elif data == "submit_stars_proof":
-        context.user_data['awaiting_stars_screenshot'] = True
-        await query.edit_message_text(
-            "📸 Submit Stars Payment Screenshot\n\nPlease send a clear screenshot showing your Stars payment completion. This will be forwarded to admin for verification.\n\nAdmin will review and send your redeem code within 24 hours.",
-            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back to Payment", callback_data="stars_payment")]])
-        )
-        
-    elif data == "submit_crypto_proof":
-        context.user_data['awaiting_crypto_screenshot'] = True
-        await query.edit_message_text(
-            "📸 Submit Crypto Payment Screenshot\n\nPlease send a clear screenshot showing your cryptocurrency transaction. Include transaction hash if visible.\n\nAdmin will review and send your redeem code within 24 hours.",
-            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back to Payment", callback_data="crypto_payment")]])
-        )
-        
-    elif data == "contact_support":
-        await query.edit_message_text(
-            "📞 Contact Support\n\nIf you need help with payments or have questions, please describe your issue and an admin will assist you.",
-            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back to Plans", callback_data="show_plans")]])
-        )
-        
-    elif data == "start":
-        # Handle back to main menu
-        pricing_config = load_json_file('data/pricing_config.json', {'usd_amount': 35.0, 'stars_amount': 2500})
-        usd_amount = pricing_config.get('usd_amount', 35)
-        stars_amount = pricing_config.get('stars_amount', 2500)
-        username = query.from_user.first_name or "User"
-        
-        welcome_text = f"""🎯 Transform Your iPhone Experience - No Jailbreak Required!
+    handler = USER_CALLBACK_ROUTES.get(data)
+    if handler is not None:
+        await handler(query, data, context)
 
-Unlock premium features, unlimited resources, and exclusive content that's normally restricted or paid.
+async def admin_redeem_codes_callback(query, data, context):
+    """Show redeem code dashboard"""
+    redeem_codes = load_redeem_codes()
+    pricing_config = load_pricing_config()
+    
+    active_codes = 0
+    used_codes = 0
+    
+    if isinstance(redeem_codes, dict):
+        for code_info in redeem_codes.values():
+            if isinstance(code_info, dict):
+                if code_info.get('status') == 'active':
+                    active_codes += 1
+                elif code_info.get('status') == 'used':
+                    used_codes += 1
+    
+    revenue = used_codes * pricing_config.get('usd_amount', 35.0)
+    
+    codes_text = f"""🎫 Redeem Code Management
 
-💎 Premium Plan - ONE YEAR Access
-• CarX Street: Unlimited money & all cars unlocked
-• Car Parking Multiplayer: All vehicles & unlimited coins  
-• Spotify++: Premium features without subscription
-• YouTube++: Background play, downloads & ad-free
-• Instagram++: Download photos, videos & stories
-• 200+ Premium Apps & Games included
+📊 Dashboard
+┌─ Active: {active_codes} codes
+├─ Used: {used_codes} codes  
+├─ Revenue: ${revenue:,.0f}
+└─ Success: {(used_codes/(active_codes+used_codes)*100 if active_codes+used_codes > 0 else 0):.1f}%
 
-✨ What You Get:
-• Device-specific optimization for your iPhone
-• Ad-free experience across all apps
-• Hassle-free installation process  
-• Supercharged social media features
-• 3-month revoke guarantee
-• Dedicated expert support
+🛠️ Tools"""
+    
+    keyboard = [
+        [
+            InlineKeyboardButton("➕ Add Code", callback_data="admin_add_code"),
+            InlineKeyboardButton("📋 View All", callback_data="admin_view_codes")
+        ],
+        [
+            InlineKeyboardButton("📤 Send Code", callback_data="admin_send_code_smart")
+        ],
+        [InlineKeyboardButton("🏠 Main Menu", callback_data="admin_panel")]
+    ]
+    
+    await query.edit_message_text(codes_text, reply_markup=InlineKeyboardMarkup(keyboard))
 
-💰 Price: ${usd_amount} USD or {stars_amount} Stars
-🔗 Full app collection: https://cpanda.app/page/ios-subscriptions
+async def admin_add_code_callback(query, data, context):
+    """Prompt admin for redeem codes to add"""
+    await query.edit_message_text(
+        "➕ Add Redeem Code\n\nSend me the redeem code to add:\n\nFormat: Just type the code (one per line for several, or upload a .txt file)\nExample: PANDA-XXXX-XXXX-XXXX",
+        reply_markup=ADMIN_REDEEM_CODES_BACK_MARKUP
+    )
+    context.user_data['admin_action'] = 'adding_code'
 
-Ready to upgrade your iPhone experience?"""
+async def admin_view_codes_callback(query, data, context):
+    """List redeem codes"""
+    try:
+        redeem_codes_data = load_redeem_codes()
+        refresh_time = datetime.now().strftime('%H:%M:%S')
         
-        keyboard = [
-            [InlineKeyboardButton("💎 Buy Premium Plan", callback_data="show_plans")],
-            [InlineKeyboardButton("🎁 Panda AppStore Free", url="https://t.me/PandaStoreFreebot")]
-        ]
+        # Parse both formats - codes array and direct entries
+        all_codes = {}
         
-        await query.edit_message_text(
-            welcome_text,
-            reply_markup=InlineKeyboardMarkup(keyboard),
-            disable_web_page_preview=True
-        )
+        # Handle array format
+        if 'codes' in redeem_codes_data and isinstance(redeem_codes_data['codes'], list):
+            for code_obj in redeem_codes_data['codes']:
+                if isinstance(code_obj, dict) and 'code' in code_obj:
+                    all_codes[code_obj['code']] = code_obj
         
-    elif data == "show_plans":
-        pricing_config = load_json_file('data/pricing_config.json', {'usd_amount': 35.0, 'stars_amount': 2500})
-        usd_amount = pricing_config.get('usd_amount', 35)
-        stars_amount = pricing_config.get('stars_amount', 2500)
+        # Handle direct entries format
+        for key, value in redeem_codes_data.items():
+            if key != 'codes' and isinstance(value, dict):
+                all_codes[key] = value
         
-        plans_text = f"""💎 Premium Plan - Complete Access
-
-🎮 Featured Apps & Games:
-• CarX Street: Unlimited money & all cars unlocked
-• Car Parking Multiplayer: All cars unlocked & unlimited coins
-• Spotify++: Premium features without subscription  
-• YouTube++: Background play, downloads & ad-free experience
-• Instagram++: Download photos, videos & stories
-
-📱 Premium Features:
-• Device-specific optimization for your iPhone model
-• Premium app access with all features unlocked
-• Hassle-free installation - no technical knowledge required
-• Supercharged social media apps with exclusive features
-• Automatic updates protection - apps stay working
-• Expert support team available 24/7
-
-🔒 Guarantee:
-• 3-month revoke guarantee included
-• Full refund if service doesn't work as promised
-• Dedicated customer support for all issues
-
-💰 Investment: ${usd_amount} USD or {stars_amount} Stars
-⏰ Duration: ONE YEAR full access
-🔗 Complete catalog: https://cpanda.app/page/ios-subscriptions
-
-Choose your preferred payment method:"""
+        if not all_codes:
+            codes_list = f"📋 All Redeem Codes (Updated: {refresh_time})\n\nNo codes available."
+        else:
+            codes_list = f"📋 All Redeem Codes (Updated: {refresh_time})\n\n"
+            count = 0
+            for code, info in all_codes.items():
+                if count >= 10:
+                    codes_list += f"\n... and {len(all_codes) - 10} more"
+                    break
+                
+                status = "✅" if info.get('status') == 'active' else "❌" if info.get('status') == 'used' else "⚪"
+                codes_list += f"{status} {code}\n"
+                count += 1
+            
+            codes_list += f"\n📊 Total: {len(all_codes)}"
         
         keyboard = [
-            [InlineKeyboardButton("💳 Pay with Crypto", callback_data="crypto_payment")],
-            [InlineKeyboardButton("⭐ Pay with Telegram Stars", callback_data="stars_payment")],
-            [InlineKeyboardButton("🔙 Back", callback_data="start")]
+            [
+                InlineKeyboardButton("🔄 Refresh", callback_data="admin_view_codes"),
+                InlineKeyboardButton("🗑️ Delete Code", callback_data="admin_delete_code")
+            ],
+            [
+                InlineKeyboardButton("🗑️ Delete All", callback_data="admin_delete_all_codes")
+            ],
+            [InlineKeyboardButton("🔙 Back", callback_data="admin_redeem_codes")]
         ]
         
+        await query.edit_message_text(codes_list, reply_markup=InlineKeyboardMarkup(keyboard))
+    except Exception as e:
+        logger.error("Error in admin_view_codes: %s", e)
         await query.edit_message_text(
-            plans_text,
-            reply_markup=InlineKeyboardMarkup(keyboard),
-            disable_web_page_preview=True
+            "📋 All Redeem Codes\n\nError loading codes. Please try again.",
+            reply_markup=ADMIN_REDEEM_CODES_BACK_MARKUP
         )
 
-async def handle_admin_callbacks(query, data, context):
-    """Handle admin menu callbacks"""
-    try:
-        if data == "admin_redeem_codes":
-            redeem_codes = load_json_file('data/redeem_codes.json', {})
-            pricing_config = load_json_file('data/pricing_config.json', {'usd_amount': 35.0})
-            
-            active_codes = 0
-            used_codes = 0
-            
-            if isinstance(redeem_codes, dict):
-                for code_info in redeem_codes.values():
-                    if isinstance(code_info, dict):
-                        if code_info.get('status') == 'active':
-                            active_codes += 1
-                        elif code_info.get('status') == 'used':
-                            used_codes += 1
-            
-            revenue = used_codes * pricing_config.get('usd_amount', 35.0)
-            
-            codes_text = f"""🎫 Redeem Code Management
+async def admin_send_code_smart_callback(query, data, context):
+    """Prompt admin for the user to send a code to"""
+    await query.edit_message_text(
+        "📤 Send Code to User\n\nSend me the User ID:\n\nFormat: Just type the number\nExample: 123456789",
+        reply_markup=ADMIN_REDEEM_CODES_BACK_MARKUP
+    )
+    context.user_data['admin_action'] = 'send_code'
 
-📊 Dashboard
-┌─ Active: {active_codes} codes
-├─ Used: {used_codes} codes  
-├─ Revenue: ${revenue:,.0f}
-└─ Success: {(used_codes/(active_codes+used_codes)*100 if active_codes+used_codes > 0 else 0):.1f}%
+async def admin_delete_code_callback(query, data, context):
+    """Prompt admin for a code to delete"""
+    await query.edit_message_text(
+        "🗑️ Delete Redeem Code\n\nSend the code you want to delete:\n\nExample: TEST001\n\n⚠️ This action cannot be undone!",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_view_codes")]])
+    )
+    context.user_data['admin_action'] = 'delete_code'
 
-🛠️ Tools"""
-            
-            keyboard = [
-                [
-                    InlineKeyboardButton("➕ Add Code", callback_data="admin_add_code"),
-                    InlineKeyboardButton("📋 View All", callback_data="admin_view_codes")
-                ],
-                [
-                    InlineKeyboardButton("📤 Send Code", callback_data="admin_send_code_smart")
-                ],
-                [InlineKeyboardButton("🏠 Main Menu", callback_data="admin_panel")]
+async def admin_delete_all_codes_callback(query, data, context):
+    """Ask admin to confirm deleting all codes"""
+    redeem_codes_data = load_redeem_codes()
+    
+    # Count total codes
+    all_codes = {}
+    if 'codes' in redeem_codes_data and isinstance(redeem_codes_data['codes'], list):
+        for code_obj in redeem_codes_data['codes']:
+            if isinstance(code_obj, dict) and 'code' in code_obj:
+                all_codes[code_obj['code']] = code_obj
+    
+    for key, value in redeem_codes_data.items():
+        if key != 'codes' and isinstance(value, dict):
+            all_codes[key] = value
+    
+    total_codes = len(all_codes)
+    
+    await query.edit_message_text(
+        f"🗑️ Delete All Codes\n\n⚠️ WARNING: This will delete ALL {total_codes} redeem codes!\n\nThis action cannot be undone.\n\nAre you sure?",
+        reply_markup=InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton("✅ Yes, Delete All", callback_data="admin_confirm_delete_all"),
+                InlineKeyboardButton("❌ Cancel", callback_data="admin_view_codes")
             ]
-            
-            await query.edit_message_text(codes_text, reply_markup=InlineKeyboardMarkup(keyboard))
-            
-        elif data == "admin_add_code":
-            await query.edit_message_text(
-                "➕ Add Redeem Code\n\nSend me the redeem code to add:\n\nFormat: Just type the code\nExample: PANDA-XXXX-XXXX-XXXX",
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_redeem_codes")]])
-            )
-            context.user_data['admin_action'] = 'adding_code'
-            
-        elif data == "admin_view_codes":
-            try:
-                from datetime import datetime as dt
-                redeem_codes_data = load_json_file('data/redeem_codes.json', {})
-                refresh_time = dt.now().strftime('%H:%M:%S')
-                
-                # Parse both formats - codes array and direct entries
-                all_codes = {}
-                
-                # Handle array format
-                if 'codes' in redeem_codes_data and isinstance(redeem_codes_data['codes'], list):
-                    for code_obj in redeem_codes_data['codes']:
-                        if isinstance(code_obj, dict) and 'code' in code_obj:
-                            all_codes[code_obj['code']] = code_obj
-                
-                # Handle direct entries format
-                for key, value in redeem_codes_data.items():
-                    if key != 'codes' and isinstance(value, dict):
-                        all_codes[key] = value
-                
-                if not all_codes:
-                    codes_list = f"📋 All Redeem Codes (Updated: {refresh_time})\n\nNo codes available."
-                else:
-                    codes_list = f"📋 All Redeem Codes (Updated: {refresh_time})\n\n"
-                    count = 0
-                    for code, info in all_codes.items():
-                        if count >= 10:
-                            codes_list += f"\n... and {len(all_codes) - 10} more"
-                            break
-                        
-                        status = "✅" if info.get('status') == 'active' else "❌" if info.get('status') == 'used' else "⚪"
-                        codes_list += f"{status} {code}\n"
-                        count += 1
-                    
-                    codes_list += f"\n📊 Total: {len(all_codes)}"
-                
-                keyboard = [
-                    [
-                        InlineKeyboardButton("🔄 Refresh", callback_data="admin_view_codes"),
-                        InlineKeyboardButton("🗑️ Delete Code", callback_data="admin_delete_code")
-                    ],
-                    [
-                        InlineKeyboardButton("🗑️ Delete All", callback_data="admin_delete_all_codes")
-                    ],
-                    [InlineKeyboardButton("🔙 Back", callback_data="admin_redeem_codes")]
-                ]
-                
-                await query.edit_message_text(codes_list, reply_markup=InlineKeyboardMarkup(keyboard))
-            except Exception as e:
-                logger.error(f"Error in admin_view_codes: {e}")
-                await query.edit_message_text(
-                    "📋 All Redeem Codes\n\nError loading codes. Please try again.",
-                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_redeem_codes")]])
-                )
-            
-        elif data == "admin_send_code_smart":
-            await query.edit_message_text(
-                "📤 Send Code to User\n\nSend me the User ID:\n\nFormat: Just type the number\nExample: 123456789",
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_redeem_codes")]])
-            )
-            context.user_data['admin_action'] = 'send_code'
-            
-        elif data == "admin_delete_code":
-            await query.edit_message_text(
-                "🗑️ Delete Redeem Code\n\nSend the code you want to delete:\n\nExample: TEST001\n\n⚠️ This action cannot be undone!",
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_view_codes")]])
-            )
-            context.user_data['admin_action'] = 'delete_code'
-            
-        elif data == "admin_delete_all_codes":
-            redeem_codes_data = load_json_file('data/redeem_codes.json', {})
-            
-            # Count total codes
-            all_codes = {}
-            if 'codes' in redeem_codes_data and isinstance(redeem_codes_data['codes'], list):
-                for code_obj in redeem_codes_data['codes']:
-                    if isinstance(code_obj, dict) and 'code' in code_obj:
-                        all_codes[code_obj['code']] = code_obj
-            
-            for key, value in redeem_codes_data.items():
-                if key != 'codes' and isinstance(value, dict):
-                    all_codes[key] = value
-            
-            total_codes = len(all_codes)
-            
-            await query.edit_message_text(
-                f"🗑️ Delete All Codes\n\n⚠️ WARNING: This will delete ALL {total_codes} redeem codes!\n\nThis action cannot be undone.\n\nAre you sure?",
-                reply_markup=InlineKeyboardMarkup([
-                    [
-                        InlineKeyboardButton("✅ Yes, Delete All", callback_data="admin_confirm_delete_all"),
-                        InlineKeyboardButton("❌ Cancel", callback_data="admin_view_codes")
-                    ]
-                ])
-            )
-            
-        elif data == "admin_confirm_delete_all":
-            # Delete all codes
-            empty_data = {}
-            save_json_file('data/redeem_codes.json', empty_data)
-            
-            await query.edit_message_text(
-                "✅ All Codes Deleted\n\nAll redeem codes have been successfully deleted.",
-                reply_markup=InlineKeyboardMarkup([
-                    [InlineKeyboardButton("📋 View Codes", callback_data="admin_view_codes")],
-                    [InlineKeyboardButton("🔙 Back to Codes", callback_data="admin_redeem_codes")]
-                ])
-            )
-            
-        elif data == "admin_users":
-            conversation_histories = load_json_file('data/conversation_histories.json', {})
-            banned_users = load_json_file('data/banned_users.json', {})
-            
-            total_users = len(conversation_histories) if isinstance(conversation_histories, dict) else 0
-            banned_count = len(banned_users) if isinstance(banned_users, dict) else 0
-            active_users = total_users - banned_count
-            
-            users_text = f"""👥 User Management
+        ])
+    )
+
+async def admin_confirm_delete_all_callback(query, data, context):
+    """Delete all redeem codes"""
+    # Delete all codes
+    empty_data = {}
+    save_redeem_codes(empty_data)
+    
+    await query.edit_message_text(
+        "✅ All Codes Deleted\n\nAll redeem codes have been successfully deleted.",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("📋 View Codes", callback_data="admin_view_codes")],
+            [InlineKeyboardButton("🔙 Back to Codes", callback_data="admin_redeem_codes")]
+        ])
+    )
+
+async def admin_users_callback(query, data, context):
+    """Show user management menu"""
+    conversation_histories = load_conversation_histories()
+    banned_users = load_banned_users()
+    
+    total_users = len(conversation_histories) if isinstance(conversation_histories, dict) else 0
+    banned_count = len(banned_users) if isinstance(banned_users, dict) else 0
+    active_users = total_users - banned_count
+    
+    users_text = f"""👥 User Management
 
 📊 Stats
 ┌─ Total Users: {total_users:,}
@@ -1055,29 +1676,30 @@ async def handle_admin_callbacks(query, data, context):
 └─ Banned: {banned_count}
 
 🛠️ Tools"""
-            
-            keyboard = [
-                [
-                    InlineKeyboardButton("📋 View Users", callback_data="admin_view_users"),
-                    InlineKeyboardButton("🔍 Search User", callback_data="admin_search_user")
-                ],
-                [
-                    InlineKeyboardButton("⛔ Ban User", callback_data="admin_ban_user_input"),
-                    InlineKeyboardButton("✅ Unban User", callback_data="admin_unban_user_input")
-                ],
-                [InlineKeyboardButton("🏠 Main Menu", callback_data="admin_panel")]
-            ]
-            
-            await query.edit_message_text(users_text, reply_markup=InlineKeyboardMarkup(keyboard))
-            
-        elif data == "admin_broadcasts":
-            conversation_histories = load_json_file('data/conversation_histories.json', {})
-            redeem_codes = load_json_file('data/redeem_codes.json', {})
-            
-            total_users = len(conversation_histories) if isinstance(conversation_histories, dict) else 0
-            premium_users = len([c for c in redeem_codes.values() if isinstance(c, dict) and c.get('status') == 'used'])
-            
-            broadcast_text = f"""📢 Panda AppStore Broadcasting
+    
+    keyboard = [
+        [
+            InlineKeyboardButton("📋 View Users", callback_data="admin_view_users"),
+            InlineKeyboardButton("🔍 Search User", callback_data="admin_search_user")
+        ],
+        [
+            InlineKeyboardButton("⛔ Ban User", callback_data="admin_ban_user_input"),
+            InlineKeyboardButton("✅ Unban User", callback_data="admin_unban_user_input")
+        ],
+        [InlineKeyboardButton("🏠 Main Menu", callback_data="admin_panel")]
+    ]
+    
+    await query.edit_message_text(users_text, reply_markup=InlineKeyboardMarkup(keyboard))
+
+async def admin_broadcasts_callback(query, data, context):
+    """Show broadcasting menu"""
+    conversation_histories = load_conversation_histories()
+    redeem_codes = load_redeem_codes()
+    
+    total_users = len(conversation_histories) if isinstance(conversation_histories, dict) else 0
+    premium_users = len([c for c in redeem_codes.values() if isinstance(c, dict) and c.get('status') == 'used'])
+    
+    broadcast_text = f"""📢 Panda AppStore Broadcasting
 
 🎯 Marketing Hub
 ┌─ Total Reach: {total_users:,} users
@@ -1085,23 +1707,24 @@ async def handle_admin_callbacks(query, data, context):
 └─ Engagement: Professional messaging
 
 🚀 Campaign Options"""
-            
-            keyboard = [
-                [
-                    InlineKeyboardButton("📢 Marketing Blast", callback_data="admin_broadcast_all"),
-                    InlineKeyboardButton("💎 VIP Exclusive", callback_data="admin_broadcast_premium")
-                ],
-                [
-                    InlineKeyboardButton("📝 Templates", callback_data="admin_broadcast_templates"),
-                    InlineKeyboardButton("📊 Campaign Stats", callback_data="admin_broadcast_stats")
-                ],
-                [InlineKeyboardButton("🏠 Main Menu", callback_data="admin_panel")]
-            ]
-            
-            await query.edit_message_text(broadcast_text, reply_markup=InlineKeyboardMarkup(keyboard))
-            
-        elif data == "admin_broadcast_all":
-            broadcast_text = """📱 Panda AppStore Marketing Campaign
+    
+    keyboard = [
+        [
+            InlineKeyboardButton("📢 Marketing Blast", callback_data="admin_broadcast_all"),
+            InlineKeyboardButton("💎 VIP Exclusive", callback_data="admin_broadcast_premium")
+        ],
+        [
+            InlineKeyboardButton("📝 Templates", callback_data="admin_broadcast_templates"),
+            InlineKeyboardButton("📊 Campaign Stats", callback_data="admin_broadcast_stats")
+        ],
+        [InlineKeyboardButton("🏠 Main Menu", callback_data="admin_panel")]
+    ]
+    
+    await query.edit_message_text(broadcast_text, reply_markup=InlineKeyboardMarkup(keyboard))
+
+async def admin_broadcast_all_callback(query, data, context):
+    """Prompt admin for a broadcast to all users"""
+    broadcast_text = """📱 Panda AppStore Marketing Campaign
 
 🎯 Target Audience: All Users
 📊 Reach: Maximum exposure to entire user base
@@ -1117,14 +1740,15 @@ async def handle_admin_callbacks(query, data, context):
 
 Send your message now to launch the campaign."""
 
-            await query.edit_message_text(
-                broadcast_text,
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back to Broadcasting", callback_data="admin_broadcasts")]])
-            )
-            context.user_data['admin_action'] = 'broadcast_all'
-            
-        elif data == "admin_broadcast_premium":
-            broadcast_text = """💎 Panda AppStore VIP Campaign
+    await query.edit_message_text(
+        broadcast_text,
+        reply_markup=BACK_TO_BROADCASTING_MARKUP
+    )
+    context.user_data['admin_action'] = 'broadcast_all'
+
+async def admin_broadcast_premium_callback(query, data, context):
+    """Prompt admin for a broadcast to premium users"""
+    broadcast_text = """💎 Panda AppStore VIP Campaign
 
 🎯 Target Audience: Premium Subscribers Only
 👑 Reach: Exclusive communication to paying customers
@@ -1140,14 +1764,15 @@ Send your message now to launch the campaign."""
 
 Send your VIP message to launch the exclusive campaign."""
 
-            await query.edit_message_text(
-                broadcast_text,
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back to Broadcasting", callback_data="admin_broadcasts")]])
-            )
-            context.user_data['admin_action'] = 'broadcast_premium'
-            
-        elif data == "admin_broadcast_templates":
-            templates_text = """📝 Panda AppStore Message Templates
+    await query.edit_message_text(
+        broadcast_text,
+        reply_markup=BACK_TO_BROADCASTING_MARKUP
+    )
+    context.user_data['admin_action'] = 'broadcast_premium'
+
+async def admin_broadcast_templates_callback(query, data, context):
+    """Show broadcast message templates"""
+    templates_text = """📝 Panda AppStore Message Templates
 
 🎯 Professional Broadcast Templates
 
@@ -1182,49 +1807,49 @@ Valid for 48 hours only!"
 
 Choose template type or compose custom message."""
 
-            keyboard = [
-                [
-                    InlineKeyboardButton("🎉 Promotional", callback_data="admin_broadcast_promo"),
-                    InlineKeyboardButton("👑 VIP Exclusive", callback_data="admin_broadcast_vip")
-                ],
-                [
-                    InlineKeyboardButton("🎯 Engagement", callback_data="admin_broadcast_engage"),
-                    InlineKeyboardButton("📢 Custom Message", callback_data="admin_broadcast_all")
-                ],
-                [InlineKeyboardButton("🔙 Back to Broadcasting", callback_data="admin_broadcasts")]
-            ]
-            
-            await query.edit_message_text(templates_text, reply_markup=InlineKeyboardMarkup(keyboard))
-        
-        elif data == "admin_broadcast_stats":
-            conversation_histories = load_json_file('data/conversation_histories.json', {})
-            redeem_codes = load_json_file('data/redeem_codes.json', {})
-            
-            total_users = len(conversation_histories) if isinstance(conversation_histories, dict) else 0
-            premium_users = len([c for c in redeem_codes.values() if isinstance(c, dict) and c.get('status') == 'used'])
-            free_users = total_users - premium_users
-            
-            # Calculate engagement metrics
-            active_users = 0
-            recent_messages = 0
-            
-            for user_id, history in conversation_histories.items():
-                if isinstance(history, list) and history:
-                    active_users += 1
-                    recent_messages += len(history)
-            
-            engagement_rate = (active_users / total_users * 100) if total_users > 0 else 0
-            
-            # Safe percentage calculations to prevent division by zero
-            premium_percent = (premium_users/total_users*100) if total_users > 0 else 0
-            free_percent = (free_users/total_users*100) if total_users > 0 else 0
-            conversion_rate = (premium_users/total_users*100) if total_users > 0 else 0
-            
-            # Add timestamp for refresh tracking
-            import datetime
-            refresh_time = datetime.datetime.now().strftime('%H:%M:%S')
-            
-            stats_text = f"""📊 Panda AppStore Campaign Analytics
+    keyboard = [
+        [
+            InlineKeyboardButton("🎉 Promotional", callback_data="admin_broadcast_promo"),
+            InlineKeyboardButton("👑 VIP Exclusive", callback_data="admin_broadcast_vip")
+        ],
+        [
+            InlineKeyboardButton("🎯 Engagement", callback_data="admin_broadcast_engage"),
+            InlineKeyboardButton("📢 Custom Message", callback_data="admin_broadcast_all")
+        ],
+        [InlineKeyboardButton("🔙 Back to Broadcasting", callback_data="admin_broadcasts")]
+    ]
+    
+    await query.edit_message_text(templates_text, reply_markup=InlineKeyboardMarkup(keyboard))
+
+async def admin_broadcast_stats_callback(query, data, context):
+    """Show broadcast campaign analytics"""
+    conversation_histories = load_conversation_histories()
+    redeem_codes = load_redeem_codes()
+    
+    total_users = len(conversation_histories) if isinstance(conversation_histories, dict) else 0
+    premium_users = len([c for c in redeem_codes.values() if isinstance(c, dict) and c.get('status') == 'used'])
+    free_users = total_users - premium_users
+    
+    # Calculate engagement metrics
+    active_users = 0
+    recent_messages = 0
+    
+    for user_id, history in conversation_histories.items():
+        if history:
+            active_users += 1
+            recent_messages += len(history)
+    
+    engagement_rate = (active_users / total_users * 100) if total_users > 0 else 0
+    
+    # Safe percentage calculations to prevent division by zero
+    premium_percent = (premium_users/total_users*100) if total_users > 0 else 0
+    free_percent = (free_users/total_users*100) if total_users > 0 else 0
+    conversion_rate = (premium_users/total_users*100) if total_users > 0 else 0
+    
+    # Add timestamp for refresh tracking
+    refresh_time = datetime.now().strftime('%H:%M:%S')
+    
+    stats_text = f"""📊 Panda AppStore Campaign Analytics
 
 👥 Audience Demographics
 ┌─ Total Users: {total_users:,}
@@ -1252,18 +1877,19 @@ Choose template type or compose custom message."""
 
 🕐 Last Updated: {refresh_time}"""
 
-            keyboard = [
-                [
-                    InlineKeyboardButton(f"🔄 Refresh Stats", callback_data="admin_broadcast_stats"),
-                    InlineKeyboardButton("📊 Export Data", callback_data="admin_export_stats")
-                ],
-                [InlineKeyboardButton("🔙 Back to Broadcasting", callback_data="admin_broadcasts")]
-            ]
-            
-            await query.edit_message_text(stats_text, reply_markup=InlineKeyboardMarkup(keyboard))
-            
-        elif data == "admin_broadcast_promo":
-            promo_text = """🎉 Promotional Campaign Template
+    keyboard = [
+        [
+            InlineKeyboardButton(f"🔄 Refresh Stats", callback_data="admin_broadcast_stats"),
+            InlineKeyboardButton("📊 Export Data", callback_data="admin_export_stats")
+        ],
+        [InlineKeyboardButton("🔙 Back to Broadcasting", callback_data="admin_broadcasts")]
+    ]
+    
+    await query.edit_message_text(stats_text, reply_markup=InlineKeyboardMarkup(keyboard))
+
+async def admin_broadcast_promo_callback(query, data, context):
+    """Show promotional broadcast template"""
+    promo_text = """🎉 Promotional Campaign Template
 
 📱 Panda AppStore Feature Launch
 
@@ -1281,19 +1907,20 @@ Transform your iPhone gaming today - no jailbreak required!
 Ready to launch this promotional campaign?
 Send this message or modify it before broadcasting."""
 
-            keyboard = [
-                [
-                    InlineKeyboardButton("📢 Send This Message", callback_data="admin_broadcast_all"),
-                    InlineKeyboardButton("✏️ Modify & Send", callback_data="admin_broadcast_all")
-                ],
-                [InlineKeyboardButton("🔙 Back to Templates", callback_data="admin_broadcast_templates")]
-            ]
-            
-            await query.edit_message_text(promo_text, reply_markup=InlineKeyboardMarkup(keyboard))
-            context.user_data['admin_action'] = 'broadcast_all'
-            
-        elif data == "admin_broadcast_vip":
-            vip_text = """👑 VIP Exclusive Campaign Template
+    keyboard = [
+        [
+            InlineKeyboardButton("📢 Send This Message", callback_data="admin_broadcast_all"),
+            InlineKeyboardButton("✏️ Modify & Send", callback_data="admin_broadcast_all")
+        ],
+        [InlineKeyboardButton("🔙 Back to Templates", callback_data="admin_broadcast_templates")]
+    ]
+    
+    await query.edit_message_text(promo_text, reply_markup=InlineKeyboardMarkup(keyboard))
+    context.user_data['admin_action'] = 'broadcast_all'
+
+async def admin_broadcast_vip_callback(query, data, context):
+    """Show VIP broadcast template"""
+    vip_text = """👑 VIP Exclusive Campaign Template
 
 💎 Panda AppStore Premium Appreciation
 
@@ -1318,19 +1945,20 @@ Panda AppStore Team
 
 Ready to send this VIP appreciation message?"""
 
-            keyboard = [
-                [
-                    InlineKeyboardButton("💎 Send to VIP Users", callback_data="admin_broadcast_premium"),
-                    InlineKeyboardButton("✏️ Modify Message", callback_data="admin_broadcast_premium")
-                ],
-                [InlineKeyboardButton("🔙 Back to Templates", callback_data="admin_broadcast_templates")]
-            ]
-            
-            await query.edit_message_text(vip_text, reply_markup=InlineKeyboardMarkup(keyboard))
-            context.user_data['admin_action'] = 'broadcast_premium'
-            
-        elif data == "admin_broadcast_engage":
-            engage_text = """🎯 Engagement Campaign Template
+    keyboard = [
+        [
+            InlineKeyboardButton("💎 Send to VIP Users", callback_data="admin_broadcast_premium"),
+            InlineKeyboardButton("✏️ Modify Message", callback_data="admin_broadcast_premium")
+        ],
+        [InlineKeyboardButton("🔙 Back to Templates", callback_data="admin_broadcast_templates")]
+    ]
+    
+    await query.edit_message_text(vip_text, reply_markup=InlineKeyboardMarkup(keyboard))
+    context.user_data['admin_action'] = 'broadcast_premium'
+
+async def admin_broadcast_engage_callback(query, data, context):
+    """Show engagement broadcast template"""
+    engage_text = """🎯 Engagement Campaign Template
 
 📱 Panda AppStore Community Engagement
 
@@ -1360,29 +1988,29 @@ Thank you for being part of our community.
 
 Ready to boost engagement with this message?"""
 
-            keyboard = [
-                [
-                    InlineKeyboardButton("🎯 Send Engagement Survey", callback_data="admin_broadcast_all"),
-                    InlineKeyboardButton("✏️ Customize Survey", callback_data="admin_broadcast_all")
-                ],
-                [InlineKeyboardButton("🔙 Back to Templates", callback_data="admin_broadcast_templates")]
-            ]
-            
-            await query.edit_message_text(engage_text, reply_markup=InlineKeyboardMarkup(keyboard))
-            context.user_data['admin_action'] = 'broadcast_all'
-            
-        elif data == "admin_export_stats":
-            import datetime
-            
-            # Generate export data
-            conversation_histories = load_json_file('data/conversation_histories.json', {})
-            redeem_codes = load_json_file('data/redeem_codes.json', {})
-            
-            export_time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            total_users = len(conversation_histories) if isinstance(conversation_histories, dict) else 0
-            premium_users = len([c for c in redeem_codes.values() if isinstance(c, dict) and c.get('status') == 'used'])
-            
-            export_text = f"""📊 Campaign Data Export
+    keyboard = [
+        [
+            InlineKeyboardButton("🎯 Send Engagement Survey", callback_data="admin_broadcast_all"),
+            InlineKeyboardButton("✏️ Customize Survey", callback_data="admin_broadcast_all")
+        ],
+        [InlineKeyboardButton("🔙 Back to Templates", callback_data="admin_broadcast_templates")]
+    ]
+    
+    await query.edit_message_text(engage_text, reply_markup=InlineKeyboardMarkup(keyboard))
+    context.user_data['admin_action'] = 'broadcast_all'
+
+async def admin_export_stats_callback(query, data, context):
+    """Show exported campaign statistics"""
+    
+    # Generate export data
+    conversation_histories = load_conversation_histories()
+    redeem_codes = load_redeem_codes()
+    
+    export_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    total_users = len(conversation_histories) if isinstance(conversation_histories, dict) else 0
+    premium_users = len([c for c in redeem_codes.values() if isinstance(c, dict) and c.get('status') == 'used'])
+    
+    export_text = f"""📊 Campaign Data Export
             
 🕒 Generated: {export_time}
 
@@ -1399,26 +2027,27 @@ Ready to boost engagement with this message?"""
 
 Use this data for marketing strategy and campaign optimization."""
 
-            keyboard = [
-                [
-                    InlineKeyboardButton("🔄 Refresh Export", callback_data="admin_export_stats"),
-                    InlineKeyboardButton("📊 New Campaign", callback_data="admin_broadcasts")
-                ],
-                [InlineKeyboardButton("🔙 Back to Stats", callback_data="admin_broadcast_stats")]
-            ]
-            
-            await query.edit_message_text(export_text, reply_markup=InlineKeyboardMarkup(keyboard))
-            
-        elif data == "admin_payments":
-            pending_payments = load_json_file('data/pending_star_payments.json', {})
-            redeem_codes = load_json_file('data/redeem_codes.json', {})
-            pricing_config = load_json_file('data/pricing_config.json', {'usd_amount': 35.0, 'stars_amount': 2500})
-            
-            used_codes = len([c for c in redeem_codes.values() if isinstance(c, dict) and c.get('status') == 'used'])
-            pending_stars = len([p for p in pending_payments.values() if isinstance(p, dict) and p.get('screenshot_sent')])
-            revenue = used_codes * pricing_config.get('usd_amount', 35.0)
-            
-            payments_text = f"""💰 Payment Monitoring
+    keyboard = [
+        [
+            InlineKeyboardButton("🔄 Refresh Export", callback_data="admin_export_stats"),
+            InlineKeyboardButton("📊 New Campaign", callback_data="admin_broadcasts")
+        ],
+        [InlineKeyboardButton("🔙 Back to Stats", callback_data="admin_broadcast_stats")]
+    ]
+    
+    await query.edit_message_text(export_text, reply_markup=InlineKeyboardMarkup(keyboard))
+
+async def admin_payments_callback(query, data, context):
+    """Show payment monitoring menu"""
+    pending_payments = load_json_file('data/pending_star_payments.json', {})
+    redeem_codes = load_redeem_codes()
+    pricing_config = load_pricing_config()
+    
+    used_codes = len([c for c in redeem_codes.values() if isinstance(c, dict) and c.get('status') == 'used'])
+    pending_stars = len([p for p in pending_payments.values() if isinstance(p, dict) and p.get('screenshot_sent')])
+    revenue = used_codes * pricing_config.get('usd_amount', 35.0)
+    
+    payments_text = f"""💰 Payment Monitoring
 
 📊 Overview
 ┌─ Total Revenue: ${revenue:,.0f}
@@ -1427,71 +2056,75 @@ Use this data for marketing strategy and campaign optimization."""
 └─ Current Price: ${pricing_config.get('usd_amount', 35)} / {pricing_config.get('stars_amount', 2500)} ⭐
 
 🛠️ Tools"""
-            
-            keyboard = [
-                [
-                    InlineKeyboardButton("⭐ Stars Payments", callback_data="admin_stars_payments"),
-                    InlineKeyboardButton("💳 Crypto Payments", callback_data="admin_crypto_payments")
-                ],
-                [
-                    InlineKeyboardButton("📊 Revenue Report", callback_data="admin_revenue_report"),
-                    InlineKeyboardButton("🔧 Payment Settings", callback_data="admin_payment_settings")
-                ],
-                [InlineKeyboardButton("🏠 Main Menu", callback_data="admin_panel")]
-            ]
-            
-            await query.edit_message_text(payments_text, reply_markup=InlineKeyboardMarkup(keyboard))
-            
-        elif data == "admin_pricing_config":
-            pricing_config = load_json_file('data/pricing_config.json', {'usd_amount': 35.0, 'stars_amount': 2500})
-            
-            pricing_text = f"""💵 Pricing Configuration
+    
+    keyboard = [
+        [
+            InlineKeyboardButton("⭐ Stars Payments", callback_data="admin_stars_payments"),
+            InlineKeyboardButton("💳 Crypto Payments", callback_data="admin_crypto_payments")
+        ],
+        [
+            InlineKeyboardButton("📊 Revenue Report", callback_data="admin_revenue_report"),
+            InlineKeyboardButton("🔧 Payment Settings", callback_data="admin_payment_settings")
+        ],
+        [InlineKeyboardButton("🏠 Main Menu", callback_data="admin_panel")]
+    ]
+    
+    await query.edit_message_text(payments_text, reply_markup=InlineKeyboardMarkup(keyboard))
+
+async def admin_pricing_config_callback(query, data, context):
+    """Show pricing configuration"""
+    pricing_config = load_pricing_config()
+    
+    pricing_text = f"""💵 Pricing Configuration
 
 📊 Current Pricing
 ┌─ USD Amount: ${pricing_config.get('usd_amount', 35):.2f}
 └─ Telegram Stars: {pricing_config.get('stars_amount', 2500)} ⭐
 
 🛠️ Tools"""
-            
-            keyboard = [
-                [
-                    InlineKeyboardButton("💵 Change USD", callback_data="admin_change_usd"),
-                    InlineKeyboardButton("⭐ Change Stars", callback_data="admin_change_stars")
-                ],
-                [InlineKeyboardButton("🏠 Main Menu", callback_data="admin_panel")]
-            ]
-            
-            await query.edit_message_text(pricing_text, reply_markup=InlineKeyboardMarkup(keyboard))
-            
-        elif data == "admin_change_usd":
-            pricing_config = load_json_file('data/pricing_config.json', {'usd_amount': 35.0})
-            await query.edit_message_text(
-                f"💵 Change USD Price\n\nCurrent: ${pricing_config.get('usd_amount', 35):.2f}\n\nSend new USD amount:\nExample: 40.00",
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_pricing_config")]])
-            )
-            context.user_data['admin_action'] = 'change_usd'
-            
-        elif data == "admin_change_stars":
-            pricing_config = load_json_file('data/pricing_config.json', {'stars_amount': 2500})
-            await query.edit_message_text(
-                f"⭐ Change Stars Price\n\nCurrent: {pricing_config.get('stars_amount', 2500)} Stars\n\nSend new Stars amount:\nExample: 3000",
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_pricing_config")]])
-            )
-            context.user_data['admin_action'] = 'change_stars'
-            
-        elif data == "admin_system_status":
-            # System status with real-time metrics
-            import platform
-            import datetime
-            
-            cpu_percent = psutil.cpu_percent(interval=1)
-            memory = psutil.virtual_memory()
-            disk = psutil.disk_usage('/')
-            
-            from datetime import datetime as dt
-            uptime = dt.now() - dt.fromtimestamp(psutil.boot_time())
-            
-            system_text = f"""📊 System Status
+    
+    keyboard = [
+        [
+            InlineKeyboardButton("💵 Change USD", callback_data="admin_change_usd"),
+            InlineKeyboardButton("⭐ Change Stars", callback_data="admin_change_stars")
+        ],
+        [InlineKeyboardButton("🏠 Main Menu", callback_data="admin_panel")]
+    ]
+    
+    await query.edit_message_text(pricing_text, reply_markup=InlineKeyboardMarkup(keyboard))
+
+async def admin_change_usd_callback(query, data, context):
+    """Prompt admin for a new USD price"""
+    pricing_config = load_pricing_config()
+    await query.edit_message_text(
+        f"💵 Change USD Price\n\nCurrent: ${pricing_config.get('usd_amount', 35):.2f}\n\nSend new USD amount:\nExample: 40.00",
+        reply_markup=ADMIN_PRICING_BACK_MARKUP
+    )
+    context.user_data['admin_action'] = 'change_usd'
+
+async def admin_change_stars_callback(query, data, context):
+    """Prompt admin for a new Stars price"""
+    pricing_config = load_pricing_config()
+    await query.edit_message_text(
+        f"⭐ Change Stars Price\n\nCurrent: {pricing_config.get('stars_amount', 2500)} Stars\n\nSend new Stars amount:\nExample: 3000",
+        reply_markup=ADMIN_PRICING_BACK_MARKUP
+    )
+    context.user_data['admin_action'] = 'change_stars'
+
+async def admin_system_status_callback(query, data, context):
+    """Show system status"""
+    # System status with real-time metrics; the one-second CPU sample runs in a
+    # worker thread so it doesn't stall every other update
+    
+    cpu_percent = await asyncio.to_thread(psutil.cpu_percent, 1)
+    memory = psutil.virtual_memory()
+    disk = psutil.disk_usage('/')
+    
+    uptime = datetime.now() - datetime.fromtimestamp(psutil.boot_time())
+    reply_cache_lookups = reply_cache_hits + reply_cache_misses
+    reply_cache_hit_rate = reply_cache_hits / reply_cache_lookups * 100 if reply_cache_lookups else 0.0
+    
+    system_text = f"""📊 System Status
 
 🖥️ System Info
 ┌─ Platform: {platform.system()} {platform.release()}
@@ -1508,135 +2141,134 @@ Use this data for marketing strategy and campaign optimization."""
 🔗 Bot Status
 ┌─ Status: Running
 ├─ Handlers: Active
-└─ Last Update: {dt.now().strftime('%H:%M:%S')}"""
-            
-            keyboard = [
-                [
-                    InlineKeyboardButton("🔄 Refresh", callback_data="admin_system_status"),
-                    InlineKeyboardButton("📈 Detailed Stats", callback_data="admin_detailed_stats")
-                ],
-                [InlineKeyboardButton("🏠 Main Menu", callback_data="admin_panel")]
-            ]
-            
-            await query.edit_message_text(system_text, reply_markup=InlineKeyboardMarkup(keyboard))
-            
-        # Add missing sub-menu handlers
-        elif data == "admin_view_users":
-            try:
-                import datetime
-                conversation_histories = load_json_file('data/conversation_histories.json', {})
-                banned_users = load_json_file('data/banned_users.json', {})
-                
-                # Add timestamp to make each refresh unique
-                from datetime import datetime as dt
-                refresh_time = dt.now().strftime('%H:%M:%S')
-                users_list = f"📋 Recent Users (Updated: {refresh_time})\n\n"
-                
-                if not conversation_histories or not isinstance(conversation_histories, dict):
-                    users_list += "No users found."
-                else:
-                    count = 0
-                    for user_id, history in conversation_histories.items():
-                        if count >= 10:
-                            users_list += f"\n... and {len(conversation_histories) - 10} more"
-                            break
-                        
-                        try:
-                            # Safe data handling with validation
-                            status = "⛔" if str(user_id) in banned_users else "✅"
-                            
-                            # Format timestamp safely - handle both numeric and ISO formats
-                            timestamp = 'Never'
-                            if isinstance(history, list) and history:
-                                last_msg = history[-1]
-                                if isinstance(last_msg, dict) and 'timestamp' in last_msg:
-                                    ts = last_msg['timestamp']
-                                    try:
-                                        if isinstance(ts, (int, float)):
-                                            # Numeric timestamp
-                                            dt = datetime.datetime.fromtimestamp(ts)
-                                            timestamp = dt.strftime('%m/%d %H:%M')
-                                        elif isinstance(ts, str):
-                                            if ts.replace('.', '').replace('-', '').replace('T', '').replace(':', '').isdigit():
-                                                # ISO format string
-                                                dt = datetime.datetime.fromisoformat(ts.replace('Z', '+00:00'))
-                                                timestamp = dt.strftime('%m/%d %H:%M')
-                                            elif ts.replace('.', '').isdigit():
-                                                # String numeric timestamp
-                                                dt = datetime.datetime.fromtimestamp(float(ts))
-                                                timestamp = dt.strftime('%m/%d %H:%M')
-                                    except (ValueError, OSError, TypeError):
-                                        timestamp = 'Invalid'
-                            
-                            users_list += f"{status} User {user_id}\n📅 Last: {timestamp}\n\n"
-                            count += 1
-                            
-                        except Exception as item_error:
-                            # Skip problematic entries but continue processing
-                            logger.warning(f"Skipping user {user_id} due to data error: {item_error}")
-                            continue
-                
-                keyboard = [
-                    [InlineKeyboardButton("🔄 Refresh", callback_data="admin_view_users")],
-                    [InlineKeyboardButton("🔙 Back", callback_data="admin_users")]
-                ]
-                await query.edit_message_text(users_list, reply_markup=InlineKeyboardMarkup(keyboard))
+├─ Reply Cache: {len(_reply_cache)} replies, {reply_cache_hits} hits / {reply_cache_misses} misses ({reply_cache_hit_rate:.0f}%)
+└─ Last Update: {datetime.now().strftime('%H:%M:%S')}"""
+    
+    keyboard = [
+        [
+            InlineKeyboardButton("🔄 Refresh", callback_data="admin_system_status"),
+            InlineKeyboardButton("📈 Detailed Stats", callback_data="admin_detailed_stats")
+        ],
+        [InlineKeyboardButton("🏠 Main Menu", callback_data="admin_panel")]
+    ]
+    
+    await query.edit_message_text(system_text, reply_markup=InlineKeyboardMarkup(keyboard))
+
+async def admin_view_users_callback(query, data, context):
+    """List recent users"""
+    try:
+        conversation_histories = load_conversation_histories()
+        banned_users = load_banned_users()
+        
+        # Add timestamp to make each refresh unique
+        refresh_time = datetime.now().strftime('%H:%M:%S')
+        users_list = f"📋 Recent Users (Updated: {refresh_time})\n\n"
+        
+        if not conversation_histories or not isinstance(conversation_histories, dict):
+            users_list += "No users found."
+        else:
+            count = 0
+            for user_id, history in conversation_histories.items():
+                if count >= 10:
+                    users_list += f"\n... and {len(conversation_histories) - 10} more"
+                    break
                 
-            except Exception as e:
-                logger.error(f"Error in admin_view_users: {e}")
-                await query.edit_message_text(
-                    "📋 Recent Users\n\nError loading user data. Please try again.",
-                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_users")]])
-                )
-            
-        elif data == "admin_stars_payments":
-            import datetime
-            pending_payments = load_json_file('data/pending_star_payments.json', {})
-            
-            from datetime import datetime as dt; refresh_time = dt.now().strftime('%H:%M:%S')
-            stars_text = f"⭐ Stars Payments (Updated: {refresh_time})\n\n"
-            if not pending_payments:
-                stars_text += "No pending Stars payments."
-            else:
-                for payment_id, info in list(pending_payments.items())[:5]:
-                    status = "📸" if info.get('screenshot_sent') else "⏳"
-                    stars_text += f"{status} Payment {payment_id[:8]}...\n"
-            
-            keyboard = [
-                [InlineKeyboardButton("🔄 Refresh", callback_data="admin_stars_payments")],
-                [InlineKeyboardButton("🔙 Back", callback_data="admin_payments")]
-            ]
-            await query.edit_message_text(stars_text, reply_markup=InlineKeyboardMarkup(keyboard))
-            
-        elif data == "admin_crypto_payments":
-            import datetime
-            payment_tracking = load_json_file('data/payment_tracking.json', {})
-            
-            from datetime import datetime as dt; refresh_time = dt.now().strftime('%H:%M:%S')
-            crypto_text = f"💳 Crypto Payments (Updated: {refresh_time})\n\n"
-            if not payment_tracking:
-                crypto_text += "No crypto payments tracked."
-            else:
-                for order_id, info in list(payment_tracking.items())[:5]:
-                    status = "✅" if info.get('status') == 'completed' else "⏳"
-                    crypto_text += f"{status} Order {order_id[:8]}...\n"
-            
-            keyboard = [
-                [InlineKeyboardButton("🔄 Refresh", callback_data="admin_crypto_payments")],
-                [InlineKeyboardButton("🔙 Back", callback_data="admin_payments")]
-            ]
-            await query.edit_message_text(crypto_text, reply_markup=InlineKeyboardMarkup(keyboard))
-            
-        elif data == "admin_revenue_report":
-            import datetime
-            redeem_codes = load_json_file('data/redeem_codes.json', {})
-            pricing_config = load_json_file('data/pricing_config.json', {'usd_amount': 35.0})
-            
-            used_codes = len([c for c in redeem_codes.values() if isinstance(c, dict) and c.get('status') == 'used'])
-            total_revenue = used_codes * pricing_config.get('usd_amount', 35.0)
-            
-            from datetime import datetime as dt; refresh_time = dt.now().strftime('%H:%M:%S')
-            report_text = f"""📊 Revenue Report (Updated: {refresh_time})
+                try:
+                    # Safe data handling with validation
+                    status = "⛔" if user_id in banned_users else "✅"
+                    
+                    # Format timestamp safely - handle both numeric and ISO formats
+                    timestamp = 'Never'
+                    if history:
+                        last_msg = history[-1]
+                        if isinstance(last_msg, dict) and 'timestamp' in last_msg:
+                            ts = last_msg['timestamp']
+                            try:
+                                if isinstance(ts, (int, float)):
+                                    # Numeric timestamp
+                                    parsed_time = datetime.fromtimestamp(ts)
+                                    timestamp = parsed_time.strftime('%m/%d %H:%M')
+                                elif isinstance(ts, str):
+                                    if ts.replace('.', '').replace('-', '').replace('T', '').replace(':', '').isdigit():
+                                        # ISO format string
+                                        parsed_time = datetime.fromisoformat(ts.replace('Z', '+00:00'))
+                                        timestamp = parsed_time.strftime('%m/%d %H:%M')
+                                    elif ts.replace('.', '').isdigit():
+                                        # String numeric timestamp
+                                        parsed_time = datetime.fromtimestamp(float(ts))
+                                        timestamp = parsed_time.strftime('%m/%d %H:%M')
+                            except (ValueError, OSError, TypeError):
+                                timestamp = 'Invalid'
+                    
+                    users_list += f"{status} User {user_id}\n📅 Last: {timestamp}\n\n"
+                    count += 1
+                    
+                except Exception as item_error:
+                    # Skip problematic entries but continue processing
+                    logger.warning("Skipping user %s due to data error: %s", user_id, item_error)
+                    continue
+        
+        keyboard = [
+            [InlineKeyboardButton("🔄 Refresh", callback_data="admin_view_users")],
+            [InlineKeyboardButton("🔙 Back", callback_data="admin_users")]
+        ]
+        await query.edit_message_text(users_list, reply_markup=InlineKeyboardMarkup(keyboard))
+        
+    except Exception as e:
+        logger.error("Error in admin_view_users: %s", e)
+        await query.edit_message_text(
+            "📋 Recent Users\n\nError loading user data. Please try again.",
+            reply_markup=ADMIN_USERS_BACK_MARKUP
+        )
+
+async def admin_stars_payments_callback(query, data, context):
+    """List pending Stars payments"""
+    pending_payments = load_json_file('data/pending_star_payments.json', {})
+    
+    refresh_time = datetime.now().strftime('%H:%M:%S')
+    stars_text = f"⭐ Stars Payments (Updated: {refresh_time})\n\n"
+    if not pending_payments:
+        stars_text += "No pending Stars payments."
+    else:
+        for payment_id, info in list(pending_payments.items())[:5]:
+            status = "📸" if info.get('screenshot_sent') else "⏳"
+            stars_text += f"{status} Payment {payment_id[:8]}...\n"
+    
+    keyboard = [
+        [InlineKeyboardButton("🔄 Refresh", callback_data="admin_stars_payments")],
+        [InlineKeyboardButton("🔙 Back", callback_data="admin_payments")]
+    ]
+    await query.edit_message_text(stars_text, reply_markup=InlineKeyboardMarkup(keyboard))
+
+async def admin_crypto_payments_callback(query, data, context):
+    """List tracked crypto payments"""
+    payment_tracking = load_json_file('data/payment_tracking.json', {})
+    
+    refresh_time = datetime.now().strftime('%H:%M:%S')
+    crypto_text = f"💳 Crypto Payments (Updated: {refresh_time})\n\n"
+    if not payment_tracking:
+        crypto_text += "No crypto payments tracked."
+    else:
+        for order_id, info in list(payment_tracking.items())[:5]:
+            status = "✅" if info.get('status') == 'completed' else "⏳"
+            crypto_text += f"{status} Order {order_id[:8]}...\n"
+    
+    keyboard = [
+        [InlineKeyboardButton("🔄 Refresh", callback_data="admin_crypto_payments")],
+        [InlineKeyboardButton("🔙 Back", callback_data="admin_payments")]
+    ]
+    await query.edit_message_text(crypto_text, reply_markup=InlineKeyboardMarkup(keyboard))
+
+async def admin_revenue_report_callback(query, data, context):
+    """Show revenue report"""
+    redeem_codes = load_redeem_codes()
+    pricing_config = load_pricing_config()
+    
+    used_codes = len([c for c in redeem_codes.values() if isinstance(c, dict) and c.get('status') == 'used'])
+    total_revenue = used_codes * pricing_config.get('usd_amount', 35.0)
+    
+    refresh_time = datetime.now().strftime('%H:%M:%S')
+    report_text = f"""📊 Revenue Report (Updated: {refresh_time})
             
 💰 Total Revenue: ${total_revenue:,.2f}
 🎫 Codes Sold: {used_codes}
@@ -1645,24 +2277,24 @@ Use this data for marketing strategy and campaign optimization."""
 📈 Performance
 └─ Conversion Rate: Coming soon
 └─ Monthly Growth: Coming soon"""
-            
-            keyboard = [
-                [InlineKeyboardButton("🔄 Refresh", callback_data="admin_revenue_report")],
-                [InlineKeyboardButton("🔙 Back", callback_data="admin_payments")]
-            ]
-            await query.edit_message_text(report_text, reply_markup=InlineKeyboardMarkup(keyboard))
-            
-        elif data == "admin_payment_settings":
-            import os
-            # Check environment variable first, then config file
-            oxapay_key = os.getenv('OXAPAY_API_KEY')
-            if not oxapay_key:
-                oxapay_key = load_json_file('data/oxapay_config.json', {}).get('api_key', 'Not configured')
-            else:
-                oxapay_key = 'Configured'
-            stars_channel = load_json_file('data/stars_config.json', {}).get('channel_id', 'Not configured')
-            
-            settings_text = f"""🔧 Payment Settings
+    
+    keyboard = [
+        [InlineKeyboardButton("🔄 Refresh", callback_data="admin_revenue_report")],
+        [InlineKeyboardButton("🔙 Back", callback_data="admin_payments")]
+    ]
+    await query.edit_message_text(report_text, reply_markup=InlineKeyboardMarkup(keyboard))
+
+async def admin_payment_settings_callback(query, data, context):
+    """Show payment settings"""
+    # Check environment variable first, then config file
+    oxapay_key = os.getenv('OXAPAY_API_KEY')
+    if not oxapay_key:
+        oxapay_key = load_json_file('data/oxapay_config.json', {}).get('api_key', 'Not configured')
+    else:
+        oxapay_key = 'Configured'
+    stars_channel = load_stars_config().get('channel_id', 'Not configured')
+    
+    settings_text = f"""🔧 Payment Settings
             
 💳 OxaPay Integration
 ├─ API Key: {'✅ Configured' if oxapay_key != 'Not configured' else '❌ Not set'}
@@ -1673,38 +2305,37 @@ Use this data for marketing strategy and campaign optimization."""
 └─ Auto-processing: {'Enabled' if stars_channel != 'Not configured' else 'Disabled'}
 
 🛠️ Configuration"""
-            
-            keyboard = [
-                [
-                    InlineKeyboardButton("💳 Test OxaPay", callback_data="admin_test_oxapay"),
-                    InlineKeyboardButton("⭐ Setup Stars", callback_data="admin_setup_stars")
-                ],
-                [
-                    InlineKeyboardButton("🔧 Configure OxaPay", callback_data="admin_configure_oxapay"),
-                    InlineKeyboardButton("🔗 Set Paid Post URL", callback_data="admin_set_paid_post")
-                ],
-                [
-                    InlineKeyboardButton("🔄 Refresh Status", callback_data="admin_refresh_payment_settings"),
-                    InlineKeyboardButton("📊 Payment Analytics", callback_data="admin_payment_analytics")
-                ],
-                [InlineKeyboardButton("🔙 Back", callback_data="admin_payments")]
-            ]
-            
-            await query.edit_message_text(settings_text, reply_markup=InlineKeyboardMarkup(keyboard))
-            
-        elif data == "admin_refresh_payment_settings":
-            import datetime
-            import os
-            # Check environment variable first, then config file
-            oxapay_key = os.getenv('OXAPAY_API_KEY')
-            if not oxapay_key:
-                oxapay_key = load_json_file('data/oxapay_config.json', {}).get('api_key', 'Not configured')
-            else:
-                oxapay_key = 'Configured'
-            stars_channel = load_json_file('data/stars_config.json', {}).get('channel_id', 'Not configured')
-            
-            from datetime import datetime as dt; refresh_time = dt.now().strftime('%H:%M:%S')
-            settings_text = f"""🔧 Payment Settings (Updated: {refresh_time})
+    
+    keyboard = [
+        [
+            InlineKeyboardButton("💳 Test OxaPay", callback_data="admin_test_oxapay"),
+            InlineKeyboardButton("⭐ Setup Stars", callback_data="admin_setup_stars")
+        ],
+        [
+            InlineKeyboardButton("🔧 Configure OxaPay", callback_data="admin_configure_oxapay"),
+            InlineKeyboardButton("🔗 Set Paid Post URL", callback_data="admin_set_paid_post")
+        ],
+        [
+            InlineKeyboardButton("🔄 Refresh Status", callback_data="admin_refresh_payment_settings"),
+            InlineKeyboardButton("📊 Payment Analytics", callback_data="admin_payment_analytics")
+        ],
+        [InlineKeyboardButton("🔙 Back", callback_data="admin_payments")]
+    ]
+    
+    await query.edit_message_text(settings_text, reply_markup=InlineKeyboardMarkup(keyboard))
+
+async def admin_refresh_payment_settings_callback(query, data, context):
+    """Show payment settings with refresh time"""
+    # Check environment variable first, then config file
+    oxapay_key = os.getenv('OXAPAY_API_KEY')
+    if not oxapay_key:
+        oxapay_key = load_json_file('data/oxapay_config.json', {}).get('api_key', 'Not configured')
+    else:
+        oxapay_key = 'Configured'
+    stars_channel = load_stars_config().get('channel_id', 'Not configured')
+    
+    refresh_time = datetime.now().strftime('%H:%M:%S')
+    settings_text = f"""🔧 Payment Settings (Updated: {refresh_time})
             
 💳 OxaPay Integration
 ├─ API Key: {'✅ Configured' if oxapay_key != 'Not configured' else '❌ Not set'}
@@ -1715,165 +2346,117 @@ Use this data for marketing strategy and campaign optimization."""
 └─ Auto-processing: {'Enabled' if stars_channel != 'Not configured' else 'Disabled'}
 
 🛠️ Configuration"""
-            
-            keyboard = [
-                [
-                    InlineKeyboardButton("💳 Test OxaPay", callback_data="admin_test_oxapay"),
-                    InlineKeyboardButton("⭐ Setup Stars", callback_data="admin_setup_stars")
-                ],
-                [
-                    InlineKeyboardButton("🔧 Configure OxaPay", callback_data="admin_configure_oxapay"),
-                    InlineKeyboardButton("🔗 Set Paid Post URL", callback_data="admin_set_paid_post")
-                ],
-                [
-                    InlineKeyboardButton("🔄 Refresh Status", callback_data="admin_refresh_payment_settings"),
-                    InlineKeyboardButton("📊 Payment Analytics", callback_data="admin_payment_analytics")
-                ],
-                [InlineKeyboardButton("🔙 Back", callback_data="admin_payments")]
-            ]
-            
-            await query.edit_message_text(settings_text, reply_markup=InlineKeyboardMarkup(keyboard))
-            
-        elif data == "admin_configure_oxapay":
-            await query.edit_message_text(
-                "💳 Configure OxaPay API\n\nSend your OxaPay API key:\n\nExample: sandbox_12345abcdef67890\n\n⚠️ Keep your API key secure!",
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_payment_settings")]])
-            )
-            context.user_data['admin_action'] = 'configure_oxapay'
-            
-        elif data == "admin_set_paid_post":
-            stars_config = load_json_file('data/stars_config.json', {})
-            current_url = stars_config.get('paid_post_url', 'Not configured')
-            
-            await query.edit_message_text(
-                f"🔗 Set Paid Post URL\n\nCurrent URL: {current_url}\n\nSend the Telegram paid post URL for Stars payments:\n\nExample: https://t.me/yourchannel/123",
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_payment_settings")]])
-            )
-            context.user_data['admin_action'] = 'set_paid_post_url'
-            
-        elif data == "admin_test_oxapay":
-            try:
-                import os
-                # Check environment variable first, then config file
-                api_key = os.getenv('OXAPAY_API_KEY')
-                if not api_key:
-                    oxapay_config = load_json_file('data/oxapay_config.json', {})
-                    api_key = oxapay_config.get('api_key')
-                
-                if not api_key:
-                    await query.edit_message_text(
-                        "❌ OxaPay API Test Failed\n\nAPI key not configured. Please configure OxaPay API key first.",
-                        reply_markup=InlineKeyboardMarkup([
-                            [InlineKeyboardButton("🔧 Configure OxaPay", callback_data="admin_configure_oxapay")],
-                            [InlineKeyboardButton("🔙 Back", callback_data="admin_payment_settings")]
-                        ])
-                    )
-                    return
-                
-                # Test API connection with correct endpoint and headers
-                headers = {
-                    'Content-Type': 'application/json'
-                }
-                
-                payload = {
-                    'merchant': api_key,
-                    'amount': 1.00,
-                    'currency': 'USD',
-                    'lifeTime': 30,
-                    'feePaidByPayer': 1,
-                    'description': 'API Test',
-                    'orderId': f'test_{int(time.time())}'
-                }
-                
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(
-                        'https://api.oxapay.com/merchants/request',
-                        json=payload,
-                        headers=headers,
-                        timeout=aiohttp.ClientTimeout(total=15)
-                    ) as response:
-                        response_text = await response.text()
-                        logger.info(f"OxaPay Test - Status: {response.status}, Response: {response_text}")
-                        
-                        if response.status == 200:
-                            try:
-                                result = await response.json()
-                                if result.get('result') == 100:
-                                    test_text = "✅ OxaPay API Test Successful\n\nConnection established successfully.\nAPI key is valid and active."
-                                else:
-                                    error_msg = result.get('message', 'Invalid API response')
-                                    test_text = f"❌ OxaPay API Test Failed\n\nError: {error_msg}"
-                            except json.JSONDecodeError:
-                                test_text = f"❌ OxaPay API Test Failed\n\nInvalid JSON response: {response_text[:100]}"
-                        else:
-                            test_text = f"❌ OxaPay API Test Failed\n\nHTTP {response.status}: {response_text[:100]}"
-                            
-            except Exception as e:
-                logger.error(f"OxaPay test error: {e}")
-                test_text = f"❌ OxaPay API Test Failed\n\nConnection error: {str(e)}"
-            
+    
+    keyboard = [
+        [
+            InlineKeyboardButton("💳 Test OxaPay", callback_data="admin_test_oxapay"),
+            InlineKeyboardButton("⭐ Setup Stars", callback_data="admin_setup_stars")
+        ],
+        [
+            InlineKeyboardButton("🔧 Configure OxaPay", callback_data="admin_configure_oxapay"),
+            InlineKeyboardButton("🔗 Set Paid Post URL", callback_data="admin_set_paid_post")
+        ],
+        [
+            InlineKeyboardButton("🔄 Refresh Status", callback_data="admin_refresh_payment_settings"),
+            InlineKeyboardButton("📊 Payment Analytics", callback_data="admin_payment_analytics")
+        ],
+        [InlineKeyboardButton("🔙 Back", callback_data="admin_payments")]
+    ]
+    
+    await query.edit_message_text(settings_text, reply_markup=InlineKeyboardMarkup(keyboard))
+
+async def admin_configure_oxapay_callback(query, data, context):
+    """Prompt admin for an OxaPay API key"""
+    await query.edit_message_text(
+        "💳 Configure OxaPay API\n\nSend your OxaPay API key:\n\nExample: sandbox_12345abcdef67890\n\n⚠️ Keep your API key secure!",
+        reply_markup=ADMIN_PAYMENT_SETTINGS_BACK_MARKUP
+    )
+    context.user_data['admin_action'] = 'configure_oxapay'
+
+async def admin_set_paid_post_callback(query, data, context):
+    """Prompt admin for the Stars paid post URL"""
+    stars_config = load_stars_config()
+    current_url = stars_config.get('paid_post_url', 'Not configured')
+    
+    await query.edit_message_text(
+        f"🔗 Set Paid Post URL\n\nCurrent URL: {current_url}\n\nSend the Telegram paid post URL for Stars payments:\n\nExample: https://t.me/yourchannel/123",
+        reply_markup=ADMIN_PAYMENT_SETTINGS_BACK_MARKUP
+    )
+    context.user_data['admin_action'] = 'set_paid_post_url'
+
+async def admin_test_oxapay_callback(query, data, context):
+    """Test the OxaPay API connection"""
+    try:
+        # Check environment variable first, then config file
+        api_key = os.getenv('OXAPAY_API_KEY')
+        if not api_key:
+            oxapay_config = load_json_file('data/oxapay_config.json', {})
+            api_key = oxapay_config.get('api_key')
+        
+        if not api_key:
             await query.edit_message_text(
-                test_text,
+                "❌ OxaPay API Test Failed\n\nAPI key not configured. Please configure OxaPay API key first.",
                 reply_markup=InlineKeyboardMarkup([
-                    [InlineKeyboardButton("🔄 Test Again", callback_data="admin_test_oxapay")],
+                    [InlineKeyboardButton("🔧 Configure OxaPay", callback_data="admin_configure_oxapay")],
                     [InlineKeyboardButton("🔙 Back", callback_data="admin_payment_settings")]
                 ])
             )
-            
-        elif data == "admin_refresh_payment_settings":
-            # Refresh and show payment settings with updated status
-            import os
-            oxapay_config = load_json_file('data/oxapay_config.json', {})
-            stars_config = load_json_file('data/stars_config.json', {})
-            
-            # Check OxaPay status
-            api_key = os.getenv('OXAPAY_API_KEY') or oxapay_config.get('api_key')
-            oxapay_status = "✅ Configured" if api_key else "❌ Not configured"
-            
-            # Check Stars status
-            stars_channel = stars_config.get('channel_id', 'Not configured')
-            stars_url = stars_config.get('paid_post_url', 'Not configured')
-            
-            from datetime import datetime as dt
-            refresh_time = dt.now().strftime('%H:%M:%S')
-            
-            settings_text = f"""⚙️ Payment Settings (Updated: {refresh_time})
-            
-💳 OxaPay Configuration
-├─ Status: {oxapay_status}
-├─ API Key: {'***' + api_key[-4:] if api_key else 'Not set'}
-└─ Connection: Ready for testing
-
-⭐ Telegram Stars Setup
-├─ Channel ID: {stars_channel}
-├─ Paid Post URL: {stars_url}
-└─ Auto-processing: {'Enabled' if stars_channel != 'Not configured' else 'Disabled'}
+            return
+        
+        # Test API connection with correct endpoint and headers
+        headers = {
+            'Content-Type': 'application/json'
+        }
+        
+        payload = {
+            'merchant': api_key,
+            'amount': 1.00,
+            'currency': 'USD',
+            'lifeTime': 30,
+            'feePaidByPayer': 1,
+            'description': 'API Test',
+            'orderId': f'test_{int(time.time())}'
+        }
+        
+        async with get_http_session().post(
+            'https://api.oxapay.com/merchants/request',
+            json=payload,
+            headers=headers
+        ) as response:
+            response_text = await response.text()
+            logger.info("OxaPay Test - Status: %s, Response: %s", response.status, response_text)
+            
+            if response.status == 200:
+                try:
+                    result = await response.json()
+                    if result.get('result') == 100:
+                        test_text = "✅ OxaPay API Test Successful\n\nConnection established successfully.\nAPI key is valid and active."
+                    else:
+                        error_msg = result.get('message', 'Invalid API response')
+                        test_text = f"❌ OxaPay API Test Failed\n\nError: {error_msg}"
+                except json.JSONDecodeError:
+                    test_text = f"❌ OxaPay API Test Failed\n\nInvalid JSON response: {response_text[:100]}"
+            else:
+                test_text = f"❌ OxaPay API Test Failed\n\nHTTP {response.status}: {response_text[:100]}"
+                
+    except Exception as e:
+        logger.error("OxaPay test error: %s", e)
+        test_text = f"❌ OxaPay API Test Failed\n\nConnection error: {str(e)}"
+    
+    await query.edit_message_text(
+        test_text,
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("🔄 Test Again", callback_data="admin_test_oxapay")],
+            [InlineKeyboardButton("🔙 Back", callback_data="admin_payment_settings")]
+        ])
+    )
 
-🛠️ Configuration"""
-            
-            keyboard = [
-                [
-                    InlineKeyboardButton("💳 Test OxaPay", callback_data="admin_test_oxapay"),
-                    InlineKeyboardButton("⭐ Setup Stars", callback_data="admin_setup_stars")
-                ],
-                [
-                    InlineKeyboardButton("🔧 Configure OxaPay", callback_data="admin_configure_oxapay"),
-                    InlineKeyboardButton("🔗 Set Paid Post URL", callback_data="admin_set_paid_post")
-                ],
-                [
-                    InlineKeyboardButton("🔄 Refresh Status", callback_data="admin_refresh_payment_settings"),
-                    InlineKeyboardButton("📊 Payment Analytics", callback_data="admin_payment_analytics")
-                ],
-                [InlineKeyboardButton("🔙 Back", callback_data="admin_payments")]
-            ]
-            
-            await query.edit_message_text(settings_text, reply_markup=InlineKeyboardMarkup(keyboard))
-            
-        elif data == "admin_setup_stars":
-            stars_config = load_json_file('data/stars_config.json', {})
-            channel_id = stars_config.get('channel_id', 'Not configured')
-            
-            setup_text = f"""⭐ Telegram Stars Setup
+async def admin_setup_stars_callback(query, data, context):
+    """Show Telegram Stars setup"""
+    stars_config = load_stars_config()
+    channel_id = stars_config.get('channel_id', 'Not configured')
+    
+    setup_text = f"""⭐ Telegram Stars Setup
             
 Current Configuration:
 ├─ Channel ID: {channel_id}
@@ -1884,35 +2467,35 @@ Setup Instructions:
 1. Create a payment channel
 2. Add bot as admin with full permissions
 3. Configure channel ID below"""
-            
-            keyboard = [
-                [InlineKeyboardButton("🔧 Configure Channel", callback_data="admin_configure_stars_channel")],
-                [InlineKeyboardButton("📋 View Setup Guide", callback_data="admin_stars_guide")],
-                [InlineKeyboardButton("🔙 Back", callback_data="admin_payment_settings")]
-            ]
-            
-            await query.edit_message_text(setup_text, reply_markup=InlineKeyboardMarkup(keyboard))
-            
-        elif data == "admin_payment_analytics":
-            from datetime import datetime as dt
-            payment_tracking = load_json_file('data/payment_tracking.json', {})
-            stars_payments = load_json_file('data/stars_payments.json', {})
-            
-            crypto_count = len(payment_tracking)
-            stars_count = len(stars_payments)
-            total_payments = crypto_count + stars_count
-            
-            # Calculate totals
-            crypto_total = sum(float(info.get('amount', 0)) for info in payment_tracking.values())
-            stars_total = sum(int(info.get('amount', 0)) for info in stars_payments.values())
-            
-            refresh_time = dt.now().strftime('%H:%M:%S')
-            
-            # Calculate averages
-            crypto_avg = f"${crypto_total/crypto_count:.2f} per transaction" if crypto_count > 0 else "No crypto transactions"
-            stars_avg = f"{stars_total/stars_count:.0f} ⭐ per transaction" if stars_count > 0 else "No Stars transactions"
-            
-            analytics_text = f"""📊 Payment Analytics (Updated: {refresh_time})
+    
+    keyboard = [
+        [InlineKeyboardButton("🔧 Configure Channel", callback_data="admin_configure_stars_channel")],
+        [InlineKeyboardButton("📋 View Setup Guide", callback_data="admin_stars_guide")],
+        [InlineKeyboardButton("🔙 Back", callback_data="admin_payment_settings")]
+    ]
+    
+    await query.edit_message_text(setup_text, reply_markup=InlineKeyboardMarkup(keyboard))
+
+async def admin_payment_analytics_callback(query, data, context):
+    """Show payment analytics"""
+    payment_tracking = load_json_file('data/payment_tracking.json', {})
+    stars_payments = load_json_file('data/stars_payments.json', {})
+    
+    crypto_count = len(payment_tracking)
+    stars_count = len(stars_payments)
+    total_payments = crypto_count + stars_count
+    
+    # Calculate totals
+    crypto_total = sum(float(info.get('amount', 0)) for info in payment_tracking.values())
+    stars_total = sum(int(info.get('amount', 0)) for info in stars_payments.values())
+    
+    refresh_time = datetime.now().strftime('%H:%M:%S')
+    
+    # Calculate averages
+    crypto_avg = f"${crypto_total/crypto_count:.2f} per transaction" if crypto_count > 0 else "No crypto transactions"
+    stars_avg = f"{stars_total/stars_count:.0f} ⭐ per transaction" if stars_count > 0 else "No Stars transactions"
+    
+    analytics_text = f"""📊 Payment Analytics (Updated: {refresh_time})
             
 💳 Payment Methods
 ├─ Cryptocurrency: {crypto_count} transactions (${crypto_total:.2f})
@@ -1923,27 +2506,29 @@ Setup Instructions:
 ├─ Crypto Average: {crypto_avg}
 ├─ Stars Average: {stars_avg}
 └─ Last Updated: {refresh_time}"""
-            
-            keyboard = [
-                [
-                    InlineKeyboardButton("💳 Crypto Details", callback_data="admin_crypto_analytics"),
-                    InlineKeyboardButton("⭐ Stars Details", callback_data="admin_stars_analytics")
-                ],
-                [InlineKeyboardButton("🔄 Refresh", callback_data="admin_payment_analytics")],
-                [InlineKeyboardButton("🔙 Back", callback_data="admin_payment_settings")]
-            ]
-            
-            await query.edit_message_text(analytics_text, reply_markup=InlineKeyboardMarkup(keyboard))
-            
-        elif data == "admin_configure_stars_channel":
-            await query.edit_message_text(
-                "⭐ Configure Stars Channel\n\nSend the Channel ID (with -100 prefix):\n\nExample: -1001234567890",
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_setup_stars")]])
-            )
-            context.user_data['admin_action'] = 'configure_stars_channel'
-            
-        elif data == "admin_stars_guide":
-            guide_text = """📋 Telegram Stars Setup Guide
+    
+    keyboard = [
+        [
+            InlineKeyboardButton("💳 Crypto Details", callback_data="admin_crypto_analytics"),
+            InlineKeyboardButton("⭐ Stars Details", callback_data="admin_stars_analytics")
+        ],
+        [InlineKeyboardButton("🔄 Refresh", callback_data="admin_payment_analytics")],
+        [InlineKeyboardButton("🔙 Back", callback_data="admin_payment_settings")]
+    ]
+    
+    await query.edit_message_text(analytics_text, reply_markup=InlineKeyboardMarkup(keyboard))
+
+async def admin_configure_stars_channel_callback(query, data, context):
+    """Prompt admin for the Stars channel ID"""
+    await query.edit_message_text(
+        "⭐ Configure Stars Channel\n\nSend the Channel ID (with -100 prefix):\n\nExample: -1001234567890",
+        reply_markup=ADMIN_STARS_SETUP_BACK_MARKUP
+    )
+    context.user_data['admin_action'] = 'configure_stars_channel'
+
+async def admin_stars_guide_callback(query, data, context):
+    """Show Telegram Stars setup guide"""
+    guide_text = """📋 Telegram Stars Setup Guide
 
 Step-by-step instructions:
 
@@ -1966,24 +2551,24 @@ Step-by-step instructions:
    • Send test Stars payment
    • Check auto-processing works
    • Verify code delivery"""
-            
-            await query.edit_message_text(
-                guide_text,
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_setup_stars")]])
-            )
-            
-        elif data == "admin_crypto_analytics":
-            from datetime import datetime as dt
-            payment_tracking = load_json_file('data/payment_tracking.json', {})
-            refresh_time = dt.now().strftime('%H:%M:%S')
-            
-            if not payment_tracking:
-                analytics_text = f"💳 Crypto Payment Analytics (Updated: {refresh_time})\n\nNo cryptocurrency payments recorded yet."
-            else:
-                total_amount = sum(float(info.get('amount', 0)) for info in payment_tracking.values())
-                avg_amount = total_amount / len(payment_tracking) if payment_tracking else 0
-                
-                analytics_text = f"""💳 Crypto Payment Analytics (Updated: {refresh_time})
+    
+    await query.edit_message_text(
+        guide_text,
+        reply_markup=ADMIN_STARS_SETUP_BACK_MARKUP
+    )
+
+async def admin_crypto_analytics_callback(query, data, context):
+    """Show crypto payment analytics"""
+    payment_tracking = load_json_file('data/payment_tracking.json', {})
+    refresh_time = datetime.now().strftime('%H:%M:%S')
+    
+    if not payment_tracking:
+        analytics_text = f"💳 Crypto Payment Analytics (Updated: {refresh_time})\n\nNo cryptocurrency payments recorded yet."
+    else:
+        total_amount = sum(float(info.get('amount', 0)) for info in payment_tracking.values())
+        avg_amount = total_amount / len(payment_tracking) if payment_tracking else 0
+        
+        analytics_text = f"""💳 Crypto Payment Analytics (Updated: {refresh_time})
 
 📊 Statistics
 ├─ Total Transactions: {len(payment_tracking)}
@@ -1992,32 +2577,32 @@ Step-by-step instructions:
 └─ Last Refresh: {refresh_time}
 
 🔗 Recent Transactions"""
-                
-                for order_id, info in list(payment_tracking.items())[:3]:
-                    status = info.get('status', 'Unknown')
-                    amount = info.get('amount', '0')
-                    analytics_text += f"\n├─ {order_id[:8]}... | ${amount} | {status}"
-            
-            await query.edit_message_text(
-                analytics_text,
-                reply_markup=InlineKeyboardMarkup([
-                    [InlineKeyboardButton("🔄 Refresh", callback_data="admin_crypto_analytics")],
-                    [InlineKeyboardButton("🔙 Back", callback_data="admin_payment_analytics")]
-                ])
-            )
-            
-        elif data == "admin_stars_analytics":
-            from datetime import datetime as dt
-            stars_payments = load_json_file('data/stars_payments.json', {})
-            refresh_time = dt.now().strftime('%H:%M:%S')
-            
-            if not stars_payments:
-                analytics_text = f"⭐ Stars Payment Analytics (Updated: {refresh_time})\n\nNo Telegram Stars payments recorded yet."
-            else:
-                total_stars = sum(int(info.get('amount', 0)) for info in stars_payments.values())
-                avg_stars = total_stars / len(stars_payments) if stars_payments else 0
-                
-                analytics_text = f"""⭐ Stars Payment Analytics (Updated: {refresh_time})
+        
+        for order_id, info in list(payment_tracking.items())[:3]:
+            status = info.get('status', 'Unknown')
+            amount = info.get('amount', '0')
+            analytics_text += f"\n├─ {order_id[:8]}... | ${amount} | {status}"
+    
+    await query.edit_message_text(
+        analytics_text,
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("🔄 Refresh", callback_data="admin_crypto_analytics")],
+            [InlineKeyboardButton("🔙 Back", callback_data="admin_payment_analytics")]
+        ])
+    )
+
+async def admin_stars_analytics_callback(query, data, context):
+    """Show Stars payment analytics"""
+    stars_payments = load_json_file('data/stars_payments.json', {})
+    refresh_time = datetime.now().strftime('%H:%M:%S')
+    
+    if not stars_payments:
+        analytics_text = f"⭐ Stars Payment Analytics (Updated: {refresh_time})\n\nNo Telegram Stars payments recorded yet."
+    else:
+        total_stars = sum(int(info.get('amount', 0)) for info in stars_payments.values())
+        avg_stars = total_stars / len(stars_payments) if stars_payments else 0
+        
+        analytics_text = f"""⭐ Stars Payment Analytics (Updated: {refresh_time})
 
 📊 Statistics
 ├─ Total Transactions: {len(stars_payments)}
@@ -2026,143 +2611,142 @@ Step-by-step instructions:
 └─ Last Refresh: {refresh_time}
 
 🌟 Recent Transactions"""
-                
-                for payment_id, info in list(stars_payments.items())[:3]:
-                    status = info.get('status', 'Unknown')
-                    amount = info.get('amount', '0')
-                    analytics_text += f"\n├─ {payment_id[:8]}... | {amount} stars | {status}"
-            
-            await query.edit_message_text(
-                analytics_text,
-                reply_markup=InlineKeyboardMarkup([
-                    [InlineKeyboardButton("🔄 Refresh", callback_data="admin_stars_analytics")],
-                    [InlineKeyboardButton("🔙 Back", callback_data="admin_payment_analytics")]
-                ])
-            )
-            
-        elif data == "admin_search_user":
-            await query.edit_message_text(
-                "🔍 Search User\n\nSend the User ID to search for:\n\nExample: 123456789",
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_users")]])
-            )
-            context.user_data['admin_action'] = 'search_user'
-            
-        elif data == "admin_ban_user_input":
-            await query.edit_message_text(
-                "⛔ Ban User\n\nSend the User ID to ban:\n\nExample: 123456789",
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_users")]])
-            )
-            context.user_data['admin_action'] = 'ban_user'
-            
-        elif data == "admin_unban_user_input":
-            await query.edit_message_text(
-                "✅ Unban User\n\nSend the User ID to unban:\n\nExample: 123456789",
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_users")]])
-            )
-            context.user_data['admin_action'] = 'unban_user'
-            
-        elif data.startswith("admin_approve_ban_"):
-            user_id_to_ban = data.split("_")[-1]
-            
-            # Apply permanent ban
-            banned_users = load_json_file('data/banned_users.json', {})
-            ban_history = load_json_file('data/user_ban_history.json', {})
-            
-            current_time = time.time()
-            banned_users[user_id_to_ban] = {
-                'banned_at': current_time,
-                'ban_type': 'permanent',
-                'duration': 0,
-                'reason': 'Permanent ban approved by admin',
-                'username': banned_users.get(user_id_to_ban, {}).get('username', f'User{user_id_to_ban}'),
-                'admin_approved': True
-            }
-            
-            save_json_file('data/banned_users.json', banned_users)
-            
-            # Notify user of permanent ban
-            try:
-                await context.bot.send_message(
-                    chat_id=int(user_id_to_ban),
-                    text="🚫 You have been permanently banned from this service.\n\nThis decision has been reviewed and approved by our administration team."
-                )
-            except:
-                pass  # User might have blocked bot
-            
-            await query.edit_message_text(
-                f"✅ Permanent ban approved for User ID: {user_id_to_ban}\n\nThe user has been permanently banned and notified.",
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back to Users", callback_data="admin_users")]])
-            )
-            
-        elif data.startswith("admin_deny_ban_"):
-            user_id_to_unban = data.split("_")[-1]
-            
-            # Remove from banned users
-            banned_users = load_json_file('data/banned_users.json', {})
-            if user_id_to_unban in banned_users:
-                del banned_users[user_id_to_unban]
-                save_json_file('data/banned_users.json', banned_users)
-            
-            # Reset ban history
-            ban_history = load_json_file('data/user_ban_history.json', {})
-            if user_id_to_unban in ban_history:
-                ban_history[user_id_to_unban]['permanent_ban_requested'] = False
-                save_json_file('data/user_ban_history.json', ban_history)
-            
-            # Notify user of appeal success with warning
-            try:
-                await context.bot.send_message(
-                    chat_id=int(user_id_to_unban),
-                    text="✅ Good news! Your ban appeal has been approved.\n\nYou can now use our services again.\n\n⚠️ WARNING: This is your final chance. Don't abuse our services again, otherwise you will get banned permanently with no further appeals."
-                )
-            except:
-                pass  # User might have blocked bot
-            
-            await query.edit_message_text(
-                f"✅ Ban denied for User ID: {user_id_to_unban}\n\nThe user has been unbanned and notified.",
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back to Users", callback_data="admin_users")]])
-            )
-            
-        elif data == "admin_detailed_stats":
-            import datetime
-            import os
-            import platform
-            
-            try:
-                # Get detailed system information with error handling
-                cpu_count = psutil.cpu_count() if hasattr(psutil, 'cpu_count') else 'N/A'
-                
-                try:
-                    boot_time = datetime.datetime.fromtimestamp(psutil.boot_time())
-                    boot_time_str = boot_time.strftime('%Y-%m-%d %H:%M')
-                except:
-                    boot_time_str = 'N/A'
-                
-                try:
-                    memory = psutil.virtual_memory()
-                    available_gb = memory.available // 1024**3
-                    cached_gb = getattr(memory, 'cached', 0) // 1024**3
-                except:
-                    available_gb = 'N/A'
-                    cached_gb = 'N/A'
-                
-                try:
-                    swap_percent = psutil.swap_memory().percent
-                except:
-                    swap_percent = 0
-                
-                try:
-                    data_files = len([f for f in os.listdir('data') if f.endswith('.json')]) if os.path.exists('data') else 0
-                    log_files = len([f for f in os.listdir('.') if f.endswith('.log')])
-                    total_files = sum(len(files) for _, _, files in os.walk('.'))
-                except:
-                    data_files = 'N/A'
-                    log_files = 'N/A'
-                    total_files = 'N/A'
-                
-                refresh_time = datetime.datetime.now().strftime('%H:%M:%S')
-                
-                detailed_text = f"""📊 Detailed System Statistics
+        
+        for payment_id, info in list(stars_payments.items())[:3]:
+            status = info.get('status', 'Unknown')
+            amount = info.get('amount', '0')
+            analytics_text += f"\n├─ {payment_id[:8]}... | {amount} stars | {status}"
+    
+    await query.edit_message_text(
+        analytics_text,
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("🔄 Refresh", callback_data="admin_stars_analytics")],
+            [InlineKeyboardButton("🔙 Back", callback_data="admin_payment_analytics")]
+        ])
+    )
+
+async def admin_search_user_callback(query, data, context):
+    """Prompt admin for a user ID to search"""
+    await query.edit_message_text(
+        "🔍 Search User\n\nSend the User ID to search for:\n\nExample: 123456789",
+        reply_markup=ADMIN_USERS_BACK_MARKUP
+    )
+    context.user_data['admin_action'] = 'search_user'
+
+async def admin_ban_user_input_callback(query, data, context):
+    """Prompt admin for a user ID to ban"""
+    await query.edit_message_text(
+        "⛔ Ban User\n\nSend the User ID to ban:\n\nExample: 123456789",
+        reply_markup=ADMIN_USERS_BACK_MARKUP
+    )
+    context.user_data['admin_action'] = 'ban_user'
+
+async def admin_unban_user_input_callback(query, data, context):
+    """Prompt admin for a user ID to unban"""
+    await query.edit_message_text(
+        "✅ Unban User\n\nSend the User ID to unban:\n\nExample: 123456789",
+        reply_markup=ADMIN_USERS_BACK_MARKUP
+    )
+    context.user_data['admin_action'] = 'unban_user'
+
+async def admin_approve_ban_callback(query, data, context):
+    """Approve a pending permanent ban"""
+    user_id_to_ban = int(data.rpartition("_")[2])
+    
+    # Apply permanent ban
+    banned_users = load_banned_users()
+    ban_history = load_json_file('data/user_ban_history.json', {})
+    
+    current_time = time.time()
+    banned_users[user_id_to_ban] = {
+        'banned_at': current_time,
+        'ban_type': 'permanent',
+        'duration': 0,
+        'reason': 'Permanent ban approved by admin',
+        'username': banned_users.get(user_id_to_ban, {}).get('username', f'User{user_id_to_ban}'),
+        'admin_approved': True
+    }
+    
+    save_banned_users(banned_users)
+    
+    # Notify the user (who may have blocked the bot) and update the admin view in parallel
+    await asyncio.gather(
+        send_notice(
+            context, user_id_to_ban,
+            "🚫 You have been permanently banned from this service.\n\nThis decision has been reviewed and approved by our administration team."
+        ),
+        query.edit_message_text(
+            f"✅ Permanent ban approved for User ID: {user_id_to_ban}\n\nThe user has been permanently banned and notified.",
+            reply_markup=BACK_TO_USERS_MARKUP
+        )
+    )
+
+async def admin_deny_ban_callback(query, data, context):
+    """Deny a pending permanent ban and unban the user"""
+    user_id_to_unban = int(data.rpartition("_")[2])
+    
+    # Remove from banned users
+    banned_users = load_banned_users()
+    if user_id_to_unban in banned_users:
+        del banned_users[user_id_to_unban]
+        save_banned_users(banned_users)
+    
+    # Reset ban history
+    ban_history = load_json_file('data/user_ban_history.json', {})
+    if str(user_id_to_unban) in ban_history:
+        ban_history[str(user_id_to_unban)]['permanent_ban_requested'] = False
+        save_json_file('data/user_ban_history.json', ban_history)
+    
+    # Notify the user of the appeal result and update the admin view in parallel
+    await asyncio.gather(
+        send_notice(
+            context, user_id_to_unban,
+            "✅ Good news! Your ban appeal has been approved.\n\nYou can now use our services again.\n\n⚠️ WARNING: This is your final chance. Don't abuse our services again, otherwise you will get banned permanently with no further appeals."
+        ),
+        query.edit_message_text(
+            f"✅ Ban denied for User ID: {user_id_to_unban}\n\nThe user has been unbanned and notified.",
+            reply_markup=BACK_TO_USERS_MARKUP
+        )
+    )
+
+async def admin_detailed_stats_callback(query, data, context):
+    """Show detailed system statistics"""
+    
+    try:
+        # Get detailed system information with error handling
+        cpu_count = psutil.cpu_count() if hasattr(psutil, 'cpu_count') else 'N/A'
+        
+        try:
+            boot_time = datetime.fromtimestamp(psutil.boot_time())
+            boot_time_str = boot_time.strftime('%Y-%m-%d %H:%M')
+        except:
+            boot_time_str = 'N/A'
+        
+        try:
+            memory = psutil.virtual_memory()
+            available_gb = memory.available // 1024**3
+            cached_gb = getattr(memory, 'cached', 0) // 1024**3
+        except:
+            available_gb = 'N/A'
+            cached_gb = 'N/A'
+        
+        try:
+            swap_percent = psutil.swap_memory().percent
+        except:
+            swap_percent = 0
+        
+        try:
+            data_files = len([f for f in os.listdir('data') if f.endswith('.json')]) if os.path.exists('data') else 0
+            log_files = len([f for f in os.listdir('.') if f.endswith('.log')])
+            total_files = sum(len(files) for _, _, files in os.walk('.'))
+        except:
+            data_files = 'N/A'
+            log_files = 'N/A'
+            total_files = 'N/A'
+        
+        refresh_time = datetime.now().strftime('%H:%M:%S')
+        
+        detailed_text = f"""📊 Detailed System Statistics
 
 🖥️ Hardware
 ├─ CPU Cores: {cpu_count}
@@ -2180,47 +2764,48 @@ Step-by-step instructions:
 └─ Total Files: {total_files}
 
 🕐 Last Updated: {refresh_time}"""
-                
-            except Exception as e:
-                detailed_text = f"""📊 Detailed System Statistics
+        
+    except Exception as e:
+        detailed_text = f"""📊 Detailed System Statistics
 
 ⚠️ Error loading detailed stats
 Please try again or contact support.
 
-🕐 Last Attempt: {datetime.datetime.now().strftime('%H:%M:%S')}"""
-            
-            keyboard = [
-                [InlineKeyboardButton("🔄 Refresh", callback_data="admin_detailed_stats")],
-                [InlineKeyboardButton("🔙 Back", callback_data="admin_system_status")]
-            ]
-            await query.edit_message_text(detailed_text, reply_markup=InlineKeyboardMarkup(keyboard))
-            
-        elif data == "admin_panel":
-            # Return to main admin panel
-            conversation_histories = load_json_file('data/conversation_histories.json', {})
-            banned_users = load_json_file('data/banned_users.json', {})
-            redeem_codes = load_json_file('data/redeem_codes.json', {})
-            pricing_config = load_json_file('data/pricing_config.json', {'usd_amount': 35.0, 'stars_amount': 2500})
-            
-            total_users = len(conversation_histories) if isinstance(conversation_histories, dict) else 0
-            banned_count = len(banned_users) if isinstance(banned_users, dict) else 0
-            active_users = total_users - banned_count
-            
-            active_codes = 0
-            used_codes = 0
-            if isinstance(redeem_codes, dict):
-                for code_info in redeem_codes.values():
-                    if isinstance(code_info, dict):
-                        if code_info.get('status') == 'active':
-                            active_codes += 1
-                        elif code_info.get('status') == 'used':
-                            used_codes += 1
-            
-            revenue = used_codes * pricing_config.get('usd_amount', 35.0)
-            cpu_percent = psutil.cpu_percent()
-            memory = psutil.virtual_memory()
-            
-            admin_text = f"""🛠️ Admin Control Panel
+🕐 Last Attempt: {datetime.now().strftime('%H:%M:%S')}"""
+    
+    keyboard = [
+        [InlineKeyboardButton("🔄 Refresh", callback_data="admin_detailed_stats")],
+        [InlineKeyboardButton("🔙 Back", callback_data="admin_system_status")]
+    ]
+    await query.edit_message_text(detailed_text, reply_markup=InlineKeyboardMarkup(keyboard))
+
+async def admin_panel_callback(query, data, context):
+    """Return to the admin main menu"""
+    # Return to main admin panel
+    conversation_histories = load_conversation_histories()
+    banned_users = load_banned_users()
+    redeem_codes = load_redeem_codes()
+    pricing_config = load_pricing_config()
+    
+    total_users = len(conversation_histories) if isinstance(conversation_histories, dict) else 0
+    banned_count = len(banned_users) if isinstance(banned_users, dict) else 0
+    active_users = total_users - banned_count
+    
+    active_codes = 0
+    used_codes = 0
+    if isinstance(redeem_codes, dict):
+        for code_info in redeem_codes.values():
+            if isinstance(code_info, dict):
+                if code_info.get('status') == 'active':
+                    active_codes += 1
+                elif code_info.get('status') == 'used':
+                    used_codes += 1
+    
+    revenue = used_codes * pricing_config.get('usd_amount', 35.0)
+    cpu_percent = psutil.cpu_percent()
+    memory = psutil.virtual_memory()
+    
+    admin_text = f"""🛠️ Admin Control Panel
 
 📊 Real-Time Dashboard
 ┌─ Total Users: {total_users:,}
@@ -2233,406 +2818,419 @@ Please try again or contact support.
 └─ Memory: {memory.percent:.1f}%
 
 🎛️ Management Tools"""
-            
-            keyboard = [
-                [
-                    InlineKeyboardButton("🎫 Redeem Codes", callback_data="admin_redeem_codes"),
-                    InlineKeyboardButton("👥 User Management", callback_data="admin_users")
-                ],
-                [
-                    InlineKeyboardButton("📢 Broadcasts", callback_data="admin_broadcasts"),
-                    InlineKeyboardButton("💰 Payment Monitor", callback_data="admin_payments")
-                ],
-                [
-                    InlineKeyboardButton("💵 Pricing Config", callback_data="admin_pricing_config"),
-                    InlineKeyboardButton("📊 System Status", callback_data="admin_system_status")
-                ]
-            ]
-            
-            await query.edit_message_text(admin_text, reply_markup=InlineKeyboardMarkup(keyboard))
+    
+    keyboard = [
+        [
+            InlineKeyboardButton("🎫 Redeem Codes", callback_data="admin_redeem_codes"),
+            InlineKeyboardButton("👥 User Management", callback_data="admin_users")
+        ],
+        [
+            InlineKeyboardButton("📢 Broadcasts", callback_data="admin_broadcasts"),
+            InlineKeyboardButton("💰 Payment Monitor", callback_data="admin_payments")
+        ],
+        [
+            InlineKeyboardButton("💵 Pricing Config", callback_data="admin_pricing_config"),
+            InlineKeyboardButton("📊 System Status", callback_data="admin_system_status")
+        ]
+    ]
+    
+    await query.edit_message_text(admin_text, reply_markup=InlineKeyboardMarkup(keyboard))
+
+# Admin callback_data -> handler; exact matches first, then the few prefixed callbacks
+ADMIN_CALLBACK_ROUTES = {
+    "admin_redeem_codes": admin_redeem_codes_callback,
+    "admin_add_code": admin_add_code_callback,
+    "admin_view_codes": admin_view_codes_callback,
+    "admin_send_code_smart": admin_send_code_smart_callback,
+    "admin_delete_code": admin_delete_code_callback,
+    "admin_delete_all_codes": admin_delete_all_codes_callback,
+    "admin_confirm_delete_all": admin_confirm_delete_all_callback,
+    "admin_users": admin_users_callback,
+    "admin_broadcasts": admin_broadcasts_callback,
+    "admin_broadcast_all": admin_broadcast_all_callback,
+    "admin_broadcast_premium": admin_broadcast_premium_callback,
+    "admin_broadcast_templates": admin_broadcast_templates_callback,
+    "admin_broadcast_stats": admin_broadcast_stats_callback,
+    "admin_broadcast_promo": admin_broadcast_promo_callback,
+    "admin_broadcast_vip": admin_broadcast_vip_callback,
+    "admin_broadcast_engage": admin_broadcast_engage_callback,
+    "admin_export_stats": admin_export_stats_callback,
+    "admin_payments": admin_payments_callback,
+    "admin_pricing_config": admin_pricing_config_callback,
+    "admin_change_usd": admin_change_usd_callback,
+    "admin_change_stars": admin_change_stars_callback,
+    "admin_system_status": admin_system_status_callback,
+    "admin_view_users": admin_view_users_callback,
+    "admin_stars_payments": admin_stars_payments_callback,
+    "admin_crypto_payments": admin_crypto_payments_callback,
+    "admin_revenue_report": admin_revenue_report_callback,
+    "admin_payment_settings": admin_payment_settings_callback,
+    "admin_refresh_payment_settings": admin_refresh_payment_settings_callback,
+    "admin_configure_oxapay": admin_configure_oxapay_callback,
+    "admin_set_paid_post": admin_set_paid_post_callback,
+    "admin_test_oxapay": admin_test_oxapay_callback,
+    "admin_setup_stars": admin_setup_stars_callback,
+    "admin_payment_analytics": admin_payment_analytics_callback,
+    "admin_configure_stars_channel": admin_configure_stars_channel_callback,
+    "admin_stars_guide": admin_stars_guide_callback,
+    "admin_crypto_analytics": admin_crypto_analytics_callback,
+    "admin_stars_analytics": admin_stars_analytics_callback,
+    "admin_search_user": admin_search_user_callback,
+    "admin_ban_user_input": admin_ban_user_input_callback,
+    "admin_unban_user_input": admin_unban_user_input_callback,
+    "admin_detailed_stats": admin_detailed_stats_callback,
+    "admin_panel": admin_panel_callback
+}
+ADMIN_CALLBACK_PREFIX_ROUTES = (
+    ("admin_approve_ban_", admin_approve_ban_callback),
+    ("admin_deny_ban_", admin_deny_ban_callback),
+)
+
+async def handle_admin_callbacks(query, data, context):
+    """Handle admin menu callbacks"""
+    try:
+        handler = ADMIN_CALLBACK_ROUTES.get(data)
+        if handler is None:
+            for prefix, prefix_handler in ADMIN_CALLBACK_PREFIX_ROUTES:
+                if data.startswith(prefix):
+                    handler = prefix_handler
+                    break
+        if handler is not None:
+            await handler(query, data, context)
             
     except Exception as e:
-        logger.error(f"Admin callback error: {e}")
+        logger.error("Admin callback error: %s", e)
         await query.edit_message_text(
             "⚠️ Error\n\nSomething went wrong. Please try again.",
             reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🏠 Main Menu", callback_data="admin_panel")]])
         )
 
-async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle regular messages with smart admin-AI handoff and media support"""
-    if not update.message or not update.effective_user:
-        return
+async def broadcast_message(context, user_ids, text: str) -> tuple:
+    """Send a message to many users concurrently and return (sent count, {user_id: error})"""
+    async def send_one(target_user_id) -> Optional[str]:
+        error = None
+        for _ in range(BROADCAST_SEND_ATTEMPTS):
+            try:
+                await context.bot.send_message(chat_id=int(target_user_id), text=text)
+                return None
+            except (BadRequest, Forbidden) as e:
+                # Blocked bot, deleted account or bad chat: retrying won't help
+                return str(e)
+            except RetryAfter as e:
+                error = str(e)
+                await asyncio.sleep(e.retry_after)
+            except NetworkError as e:
+                error = str(e)
+                await asyncio.sleep(1)
+            except Exception as e:
+                return str(e)
+        return error
+    
+    user_ids = list(user_ids)
+    pending = iter(user_ids)
+    failures = {}
+    
+    # A fixed pool of senders shares one iterator, so memory stays flat however many users there are
+    async def sender():
+        for target_user_id in pending:
+            error = await send_one(target_user_id)
+            if error is not None:
+                failures[str(target_user_id)] = error
+    
+    await asyncio.gather(*(sender() for _ in range(min(BROADCAST_CONCURRENCY, len(user_ids)))))
+    return len(user_ids) - len(failures), failures
+
+def record_broadcast_failures(failures: Dict[str, str]) -> bool:
+    """Keep the users a broadcast could not reach in data/broadcast_failures.json"""
+    broadcast_failures = load_json_file(BROADCAST_FAILURES_FILE, {})
+    failed_at = datetime.now().isoformat()
+    for target_user_id, error in failures.items():
+        broadcast_failures.pop(target_user_id, None)
+        broadcast_failures[target_user_id] = {'error': error, 'failed_at': failed_at}
+    
+    # Keep only the most recent failures; insertion order is oldest first
+    for target_user_id in list(broadcast_failures)[:-BROADCAST_FAILURES_LIMIT]:
+        del broadcast_failures[target_user_id]
+    return save_json_file(BROADCAST_FAILURES_FILE, broadcast_failures)
+
+async def run_broadcast(context, admin_chat_id: int, action: str, target_users, message_text: str):
+    """Deliver a broadcast and report the result back to the admin"""
+    sent_count, failures = await broadcast_message(
+        context, target_users, f"📢 Panda AppStore Announcement\n\n{message_text}"
+    )
+    failed_count = len(failures)
+    if failures:
+        logger.warning("Broadcast failed for %s users, see %s", failed_count, BROADCAST_FAILURES_FILE)
+        record_broadcast_failures(failures)
+    
+    broadcast_type = "premium users" if action == 'broadcast_premium' else "all users"
+    await context.bot.send_message(
+        chat_id=admin_chat_id,
+        text=f"✅ Broadcast completed!\n\nSent to: {sent_count} {broadcast_type}\nFailed: {failed_count}",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("📢 Send Another", callback_data=f"admin_{action}")],
+            [InlineKeyboardButton("🔙 Back to Broadcasts", callback_data="admin_broadcasts")]
+        ])
+    )
+
+async def adding_code_action(update: Update, context: ContextTypes.DEFAULT_TYPE, message_text: str):
+    """Add the redeem codes an admin sent, one per line"""
+    admin_id = update.effective_user.id
     
-    user_id = update.effective_user.id
-    username = update.effective_user.first_name or update.effective_user.username or f"User{user_id}"
-    message_text = update.message.text or ""
+    codes = {line.strip() for line in message_text.splitlines() if line.strip()}
+    await reply_added_codes(update, codes, add_redeem_codes(codes, admin_id))
+
+async def delete_code_action(update: Update, context: ContextTypes.DEFAULT_TYPE, message_text: str):
+    """Delete the redeem code an admin sent"""
+    code_to_delete = message_text.strip()
+    redeem_codes_data = load_redeem_codes()
     
-    # Check if user is banned (skip admins)
-    if not is_admin(user_id):
-        banned_users = load_json_file('data/banned_users.json', {})
-        logger.info(f"Checking ban status for user {user_id}, banned_users: {banned_users}")
-        
-        if str(user_id) in banned_users:
-            ban_info = banned_users[str(user_id)]
-            logger.info(f"User {user_id} is banned: {ban_info}")
-            
-            # Always block banned users regardless of ban type
-            await update.message.reply_text("🚫 You are banned from using this bot. Contact support if you believe this is an error.")
-            return
+    # Check both formats - codes array and direct entries
+    code_found = False
     
-    # Handle admin actions
-    if is_admin(user_id) and 'admin_action' in context.user_data:
-        action = context.user_data['admin_action']
-        
-        if action == 'adding_code' and message_text:
-            code = message_text.strip()
-            redeem_codes = load_json_file('data/redeem_codes.json', {})
-            
-            if code in redeem_codes:
-                await update.message.reply_text(
-                    f"❌ Code already exists: {code}",
-                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_redeem_codes")]])
-                )
-            else:
-                redeem_codes[code] = {
-                    'status': 'active',
-                    'created_at': time.time(),
-                    'created_by': user_id
-                }
-                save_json_file('data/redeem_codes.json', redeem_codes)
-                
-                await update.message.reply_text(
-                    f"✅ Code added successfully: {code}",
-                    reply_markup=InlineKeyboardMarkup([
-                        [InlineKeyboardButton("➕ Add Another", callback_data="admin_add_code")],
-                        [InlineKeyboardButton("🔙 Back to Codes", callback_data="admin_redeem_codes")]
-                    ])
-                )
-            
-            context.user_data.pop('admin_action', None)
-            return
-            
-        elif action == 'delete_code' and message_text:
-            code_to_delete = message_text.strip()
-            redeem_codes_data = load_json_file('data/redeem_codes.json', {})
-            
-            # Check both formats - codes array and direct entries
-            code_found = False
-            
-            # Check direct entries format
-            if code_to_delete in redeem_codes_data and isinstance(redeem_codes_data[code_to_delete], dict):
-                del redeem_codes_data[code_to_delete]
+    # Check direct entries format
+    if code_to_delete in redeem_codes_data and isinstance(redeem_codes_data[code_to_delete], dict):
+        del redeem_codes_data[code_to_delete]
+        code_found = True
+    
+    # Check array format
+    if 'codes' in redeem_codes_data and isinstance(redeem_codes_data['codes'], list):
+        for i, code_obj in enumerate(redeem_codes_data['codes']):
+            if isinstance(code_obj, dict) and code_obj.get('code') == code_to_delete:
+                redeem_codes_data['codes'].pop(i)
                 code_found = True
+                break
+    
+    if code_found:
+        save_redeem_codes(redeem_codes_data)
+        await update.message.reply_text(
+            f"✅ Code deleted successfully: {code_to_delete}",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("🗑️ Delete Another", callback_data="admin_delete_code")],
+                [InlineKeyboardButton("📋 View All Codes", callback_data="admin_view_codes")],
+                [InlineKeyboardButton("🔙 Back to Codes", callback_data="admin_redeem_codes")]
+            ])
+        )
+    else:
+        await update.message.reply_text(
+            f"❌ Code not found: {code_to_delete}",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("🗑️ Try Again", callback_data="admin_delete_code")],
+                [InlineKeyboardButton("📋 View All Codes", callback_data="admin_view_codes")]
+            ])
+        )
+
+async def ban_user_action(update: Update, context: ContextTypes.DEFAULT_TYPE, message_text: str):
+    """Permanently ban the user ID an admin sent"""
+    admin_id = update.effective_user.id
+    
+    target_user_id = parse_user_id(message_text)
+    if target_user_id is not None:
+        banned_users = load_banned_users()
+        
+        banned_users[target_user_id] = {
+            'banned_at': time.time(),
+            'banned_by': admin_id,
+            'reason': 'Admin ban',
+            'type': 'permanent'
+        }
+        save_banned_users(banned_users)
+        
+        await update.message.reply_text(
+            f"✅ User {target_user_id} has been banned permanently.",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("⛔ Ban Another", callback_data="admin_ban_user_input")],
+                [InlineKeyboardButton("🔙 Back to Users", callback_data="admin_users")]
+            ])
+        )
+    else:
+        await update.message.reply_text(
+            INVALID_USER_ID_TEXT,
+            reply_markup=ADMIN_USERS_BACK_MARKUP
+        )
+
+async def unban_user_action(update: Update, context: ContextTypes.DEFAULT_TYPE, message_text: str):
+    """Lift the ban on the user ID an admin sent and warn the user"""
+    target_user_id = parse_user_id(message_text)
+    if target_user_id is not None:
+        banned_users = load_banned_users()
+        
+        if target_user_id in banned_users:
+            del banned_users[target_user_id]
+            save_banned_users(banned_users)
             
-            # Check array format
-            if 'codes' in redeem_codes_data and isinstance(redeem_codes_data['codes'], list):
-                for i, code_obj in enumerate(redeem_codes_data['codes']):
-                    if isinstance(code_obj, dict) and code_obj.get('code') == code_to_delete:
-                        redeem_codes_data['codes'].pop(i)
-                        code_found = True
-                        break
-            
-            if code_found:
-                save_json_file('data/redeem_codes.json', redeem_codes_data)
-                await update.message.reply_text(
-                    f"✅ Code deleted successfully: {code_to_delete}",
-                    reply_markup=InlineKeyboardMarkup([
-                        [InlineKeyboardButton("🗑️ Delete Another", callback_data="admin_delete_code")],
-                        [InlineKeyboardButton("📋 View All Codes", callback_data="admin_view_codes")],
-                        [InlineKeyboardButton("🔙 Back to Codes", callback_data="admin_redeem_codes")]
-                    ])
-                )
-            else:
-                await update.message.reply_text(
-                    f"❌ Code not found: {code_to_delete}",
-                    reply_markup=InlineKeyboardMarkup([
-                        [InlineKeyboardButton("🗑️ Try Again", callback_data="admin_delete_code")],
-                        [InlineKeyboardButton("📋 View All Codes", callback_data="admin_view_codes")]
-                    ])
-                )
-            
-            context.user_data.pop('admin_action', None)
-            return
-            
-        elif action == 'ban_user' and message_text:
-            try:
-                target_user_id = int(message_text.strip())
-                banned_users = load_json_file('data/banned_users.json', {})
-                
-                banned_users[str(target_user_id)] = {
-                    'banned_at': time.time(),
-                    'banned_by': user_id,
-                    'reason': 'Admin ban',
-                    'type': 'permanent'
-                }
-                save_json_file('data/banned_users.json', banned_users)
-                
-                await update.message.reply_text(
-                    f"✅ User {target_user_id} has been banned permanently.",
-                    reply_markup=InlineKeyboardMarkup([
-                        [InlineKeyboardButton("⛔ Ban Another", callback_data="admin_ban_user_input")],
-                        [InlineKeyboardButton("🔙 Back to Users", callback_data="admin_users")]
-                    ])
-                )
-            except ValueError:
-                await update.message.reply_text(
-                    "❌ Invalid User ID. Please send a valid number.",
-                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_users")]])
-                )
-            
-            context.user_data.pop('admin_action', None)
-            return
-            
-        elif action == 'unban_user' and message_text:
+            # Send warning notification to unbanned user
             try:
-                target_user_id = int(message_text.strip())
-                banned_users = load_json_file('data/banned_users.json', {})
-                
-                if str(target_user_id) in banned_users:
-                    del banned_users[str(target_user_id)]
-                    save_json_file('data/banned_users.json', banned_users)
-                    
-                    # Send warning notification to unbanned user
-                    try:
-                        await context.bot.send_message(
-                            chat_id=target_user_id,
-                            text="✅ Good news! You have been unbanned and can now use our services again.\n\n⚠️ WARNING: Don't abuse our services again, otherwise you will get banned permanently with no further appeals."
-                        )
-                    except:
-                        pass  # User might have blocked bot
-                    
-                    await update.message.reply_text(
-                        f"✅ User {target_user_id} has been unbanned successfully and notified with warning.",
-                        reply_markup=InlineKeyboardMarkup([
-                            [InlineKeyboardButton("✅ Unban Another", callback_data="admin_unban_user_input")],
-                            [InlineKeyboardButton("🔙 Back to Users", callback_data="admin_users")]
-                        ])
-                    )
-                else:
-                    await update.message.reply_text(
-                        f"❌ User {target_user_id} is not banned.",
-                        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_users")]])
-                    )
-            except ValueError:
-                await update.message.reply_text(
-                    "❌ Invalid User ID. Please send a valid number.",
-                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_users")]])
+                await context.bot.send_message(
+                    chat_id=target_user_id,
+                    text="✅ Good news! You have been unbanned and can now use our services again.\n\n⚠️ WARNING: Don't abuse our services again, otherwise you will get banned permanently with no further appeals."
                 )
+            except:
+                pass  # User might have blocked bot
             
-            context.user_data.pop('admin_action', None)
-            return
-            
-        elif action == 'configure_oxapay' and message_text:
-            api_key = message_text.strip()
-            oxapay_config = load_json_file('data/oxapay_config.json', {})
-            oxapay_config['api_key'] = api_key
-            save_json_file('data/oxapay_config.json', oxapay_config)
+            await update.message.reply_text(
+                f"✅ User {target_user_id} has been unbanned successfully and notified with warning.",
+                reply_markup=InlineKeyboardMarkup([
+                    [InlineKeyboardButton("✅ Unban Another", callback_data="admin_unban_user_input")],
+                    [InlineKeyboardButton("🔙 Back to Users", callback_data="admin_users")]
+                ])
+            )
+        else:
+            await update.message.reply_text(
+                f"❌ User {target_user_id} is not banned.",
+                reply_markup=ADMIN_USERS_BACK_MARKUP
+            )
+    else:
+        await update.message.reply_text(
+            INVALID_USER_ID_TEXT,
+            reply_markup=ADMIN_USERS_BACK_MARKUP
+        )
+
+async def configure_oxapay_action(update: Update, context: ContextTypes.DEFAULT_TYPE, message_text: str):
+    """Save the OxaPay API key an admin sent"""
+    api_key = message_text.strip()
+    oxapay_config = load_json_file('data/oxapay_config.json', {})
+    oxapay_config['api_key'] = api_key
+    save_json_file('data/oxapay_config.json', oxapay_config)
+    
+    await update.message.reply_text(
+        f"✅ OxaPay API key configured successfully!\n\nKey: ***{api_key[-4:]}",
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("💳 Test Connection", callback_data="admin_test_oxapay")],
+            [InlineKeyboardButton("🔙 Back to Settings", callback_data="admin_payment_settings")]
+        ])
+    )
+
+async def set_paid_post_url_action(update: Update, context: ContextTypes.DEFAULT_TYPE, message_text: str):
+    """Save the paid post URL an admin sent"""
+    url = message_text.strip()
+    if not url.startswith('https://t.me/'):
+        await update.message.reply_text(
+            "❌ Invalid URL format. Must be a Telegram link starting with https://t.me/",
+            reply_markup=ADMIN_PAYMENT_SETTINGS_BACK_MARKUP
+        )
+    else:
+        stars_config = load_stars_config()
+        stars_config['paid_post_url'] = url
+        save_stars_config(stars_config)
+        
+        await update.message.reply_text(
+            f"✅ Paid post URL configured successfully!\n\nURL: {url}",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("⭐ Setup Channel", callback_data="admin_setup_stars")],
+                [InlineKeyboardButton("🔙 Back to Settings", callback_data="admin_payment_settings")]
+            ])
+        )
+
+async def configure_stars_channel_action(update: Update, context: ContextTypes.DEFAULT_TYPE, message_text: str):
+    """Save the Stars channel ID an admin sent"""
+    try:
+        channel_id = message_text.strip()
+        if not channel_id.startswith('-100'):
+            await update.message.reply_text(
+                "❌ Invalid Channel ID format. Must start with -100",
+                reply_markup=ADMIN_STARS_SETUP_BACK_MARKUP
+            )
+        else:
+            stars_config = load_stars_config()
+            stars_config['channel_id'] = channel_id
+            save_stars_config(stars_config)
             
             await update.message.reply_text(
-                f"✅ OxaPay API key configured successfully!\n\nKey: ***{api_key[-4:]}",
+                f"✅ Stars channel configured successfully!\n\nChannel ID: {channel_id}",
                 reply_markup=InlineKeyboardMarkup([
-                    [InlineKeyboardButton("💳 Test Connection", callback_data="admin_test_oxapay")],
+                    [InlineKeyboardButton("⭐ Test Setup", callback_data="admin_test_stars")],
                     [InlineKeyboardButton("🔙 Back to Settings", callback_data="admin_payment_settings")]
                 ])
             )
-            context.user_data.pop('admin_action', None)
-            return
-            
-        elif action == 'set_paid_post_url' and message_text:
-            url = message_text.strip()
-            if not url.startswith('https://t.me/'):
-                await update.message.reply_text(
-                    "❌ Invalid URL format. Must be a Telegram link starting with https://t.me/",
-                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_payment_settings")]])
-                )
-            else:
-                stars_config = load_json_file('data/stars_config.json', {})
-                stars_config['paid_post_url'] = url
-                save_json_file('data/stars_config.json', stars_config)
-                
-                await update.message.reply_text(
-                    f"✅ Paid post URL configured successfully!\n\nURL: {url}",
-                    reply_markup=InlineKeyboardMarkup([
-                        [InlineKeyboardButton("⭐ Setup Channel", callback_data="admin_setup_stars")],
-                        [InlineKeyboardButton("🔙 Back to Settings", callback_data="admin_payment_settings")]
-                    ])
-                )
-            context.user_data.pop('admin_action', None)
-            return
-            
-        elif action == 'configure_stars_channel' and message_text:
-            try:
-                channel_id = message_text.strip()
-                if not channel_id.startswith('-100'):
-                    await update.message.reply_text(
-                        "❌ Invalid Channel ID format. Must start with -100",
-                        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_setup_stars")]])
-                    )
-                else:
-                    stars_config = load_json_file('data/stars_config.json', {})
-                    stars_config['channel_id'] = channel_id
-                    save_json_file('data/stars_config.json', stars_config)
-                    
-                    await update.message.reply_text(
-                        f"✅ Stars channel configured successfully!\n\nChannel ID: {channel_id}",
-                        reply_markup=InlineKeyboardMarkup([
-                            [InlineKeyboardButton("⭐ Test Setup", callback_data="admin_test_stars")],
-                            [InlineKeyboardButton("🔙 Back to Settings", callback_data="admin_payment_settings")]
-                        ])
-                    )
-            except Exception as e:
-                await update.message.reply_text(
-                    f"❌ Error configuring channel: {str(e)}",
-                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_setup_stars")]])
-                )
-                
-            context.user_data.pop('admin_action', None)
-            return
-            
-        elif action == 'change_usd' and message_text:
-            try:
-                new_amount = float(message_text.strip())
-                if new_amount <= 0:
-                    await update.message.reply_text(
-                        "❌ Amount must be greater than 0",
-                        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_pricing_config")]])
-                    )
-                else:
-                    pricing_config = load_json_file('data/pricing_config.json', {})
-                    pricing_config['usd_amount'] = new_amount
-                    save_json_file('data/pricing_config.json', pricing_config)
-                    
-                    await update.message.reply_text(
-                        f"✅ USD price updated to ${new_amount:.2f}",
-                        reply_markup=InlineKeyboardMarkup([
-                            [InlineKeyboardButton("⭐ Change Stars", callback_data="admin_change_stars")],
-                            [InlineKeyboardButton("🔙 Back to Pricing", callback_data="admin_pricing_config")]
-                        ])
-                    )
-            except ValueError:
-                await update.message.reply_text(
-                    "❌ Invalid amount. Please enter a valid number.",
-                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_pricing_config")]])
-                )
-                
-            context.user_data.pop('admin_action', None)
-            return
+    except Exception as e:
+        await update.message.reply_text(
+            f"❌ Error configuring channel: {str(e)}",
+            reply_markup=ADMIN_STARS_SETUP_BACK_MARKUP
+        )
+
+async def change_usd_action(update: Update, context: ContextTypes.DEFAULT_TYPE, message_text: str):
+    """Update the USD price to the amount an admin sent"""
+    try:
+        new_amount = float(message_text.strip())
+        if new_amount <= 0:
+            await update.message.reply_text(
+                "❌ Amount must be greater than 0",
+                reply_markup=ADMIN_PRICING_BACK_MARKUP
+            )
+        else:
+            pricing_config = load_pricing_config()
+            pricing_config['usd_amount'] = new_amount
+            save_pricing_config(pricing_config)
             
-        elif action == 'change_stars' and message_text:
-            try:
-                new_stars = int(message_text.strip())
-                if new_stars <= 0:
-                    await update.message.reply_text(
-                        "❌ Stars amount must be greater than 0",
-                        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_pricing_config")]])
-                    )
-                else:
-                    pricing_config = load_json_file('data/pricing_config.json', {})
-                    pricing_config['stars_amount'] = new_stars
-                    save_json_file('data/pricing_config.json', pricing_config)
-                    
-                    await update.message.reply_text(
-                        f"✅ Stars price updated to {new_stars:,} ⭐",
-                        reply_markup=InlineKeyboardMarkup([
-                            [InlineKeyboardButton("💵 Change USD", callback_data="admin_change_usd")],
-                            [InlineKeyboardButton("🔙 Back to Pricing", callback_data="admin_pricing_config")]
-                        ])
-                    )
-            except ValueError:
-                await update.message.reply_text(
-                    "❌ Invalid amount. Please enter a valid number.",
-                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_pricing_config")]])
-                )
-                
-            context.user_data.pop('admin_action', None)
-            return
+            await update.message.reply_text(
+                f"✅ USD price updated to ${new_amount:.2f}",
+                reply_markup=InlineKeyboardMarkup([
+                    [InlineKeyboardButton("⭐ Change Stars", callback_data="admin_change_stars")],
+                    [InlineKeyboardButton("🔙 Back to Pricing", callback_data="admin_pricing_config")]
+                ])
+            )
+    except ValueError:
+        await update.message.reply_text(
+            INVALID_AMOUNT_TEXT,
+            reply_markup=ADMIN_PRICING_BACK_MARKUP
+        )
+
+async def change_stars_action(update: Update, context: ContextTypes.DEFAULT_TYPE, message_text: str):
+    """Update the Stars price to the amount an admin sent"""
+    try:
+        new_stars = int(message_text.strip())
+        if new_stars <= 0:
+            await update.message.reply_text(
+                "❌ Stars amount must be greater than 0",
+                reply_markup=ADMIN_PRICING_BACK_MARKUP
+            )
+        else:
+            pricing_config = load_pricing_config()
+            pricing_config['stars_amount'] = new_stars
+            save_pricing_config(pricing_config)
             
-        elif action == 'configure_oxapay' and message_text:
-            try:
-                api_key = message_text.strip()
-                if len(api_key) < 10:
-                    await update.message.reply_text(
-                        "❌ API key seems too short. Please enter a valid OxaPay API key.",
-                        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_payment_settings")]])
-                    )
-                else:
-                    oxapay_config = load_json_file('data/oxapay_config.json', {})
-                    oxapay_config['api_key'] = api_key
-                    save_json_file('data/oxapay_config.json', oxapay_config)
-                    
-                    await update.message.reply_text(
-                        "✅ OxaPay API key configured successfully!",
-                        reply_markup=InlineKeyboardMarkup([
-                            [InlineKeyboardButton("💳 Test Connection", callback_data="admin_test_oxapay")],
-                            [InlineKeyboardButton("🔙 Back to Settings", callback_data="admin_payment_settings")]
-                        ])
-                    )
-            except Exception as e:
-                await update.message.reply_text(
-                    f"❌ Error saving API key: {str(e)}",
-                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_payment_settings")]])
-                )
-                
-            context.user_data.pop('admin_action', None)
-            return
+            await update.message.reply_text(
+                f"✅ Stars price updated to {new_stars:,} ⭐",
+                reply_markup=InlineKeyboardMarkup([
+                    [InlineKeyboardButton("💵 Change USD", callback_data="admin_change_usd")],
+                    [InlineKeyboardButton("🔙 Back to Pricing", callback_data="admin_pricing_config")]
+                ])
+            )
+    except ValueError:
+        await update.message.reply_text(
+            INVALID_AMOUNT_TEXT,
+            reply_markup=ADMIN_PRICING_BACK_MARKUP
+        )
+
+async def search_user_action(update: Update, context: ContextTypes.DEFAULT_TYPE, message_text: str):
+    """Show the profile of the user ID an admin sent"""
+    target_user_id = parse_user_id(message_text)
+    if target_user_id is not None:
+        conversation_histories = load_conversation_histories()
+        banned_users = load_banned_users()
+        
+        if target_user_id in conversation_histories:
+            history = conversation_histories[target_user_id]
+            is_banned = target_user_id in banned_users
+            ban_status = "⛔ Banned" if is_banned else "✅ Active"
+            
+            # Get last activity
+            last_activity = "Never"
+            if history:
+                last_msg = history[-1]
+                if isinstance(last_msg, dict) and 'timestamp' in last_msg:
+                    ts = last_msg['timestamp']
+                    if ts and str(ts).replace('.', '').isdigit():
+                        try:
+                            parsed_time = datetime.fromtimestamp(float(ts))
+                            last_activity = parsed_time.strftime('%Y-%m-%d %H:%M')
+                        except (ValueError, OSError):
+                            last_activity = 'Invalid'
             
-        elif action == 'set_paid_post_url' and message_text:
-            try:
-                url = message_text.strip()
-                if not url.startswith('https://t.me/'):
-                    await update.message.reply_text(
-                        "❌ Invalid URL format. Must start with https://t.me/",
-                        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_payment_settings")]])
-                    )
-                else:
-                    stars_config = load_json_file('data/stars_config.json', {})
-                    stars_config['paid_post_url'] = url
-                    save_json_file('data/stars_config.json', stars_config)
-                    
-                    await update.message.reply_text(
-                        f"✅ Paid post URL configured successfully!\n\nURL: {url}",
-                        reply_markup=InlineKeyboardMarkup([
-                            [InlineKeyboardButton("⭐ Test Stars Setup", callback_data="admin_setup_stars")],
-                            [InlineKeyboardButton("🔙 Back to Settings", callback_data="admin_payment_settings")]
-                        ])
-                    )
-            except Exception as e:
-                await update.message.reply_text(
-                    f"❌ Error saving URL: {str(e)}",
-                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_payment_settings")]])
-                )
-                
-            context.user_data.pop('admin_action', None)
-            return
+            message_count = len(history)
             
-        elif action == 'search_user' and message_text:
-            try:
-                target_user_id = int(message_text.strip())
-                conversation_histories = load_json_file('data/conversation_histories.json', {})
-                banned_users = load_json_file('data/banned_users.json', {})
-                
-                if str(target_user_id) in conversation_histories:
-                    history = conversation_histories[str(target_user_id)]
-                    is_banned = str(target_user_id) in banned_users
-                    ban_status = "⛔ Banned" if is_banned else "✅ Active"
-                    
-                    # Get last activity
-                    last_activity = "Never"
-                    if isinstance(history, list) and history:
-                        last_msg = history[-1]
-                        if isinstance(last_msg, dict) and 'timestamp' in last_msg:
-                            ts = last_msg['timestamp']
-                            if ts and str(ts).replace('.', '').isdigit():
-                                import datetime
-                                try:
-                                    dt = datetime.datetime.fromtimestamp(float(ts))
-                                    last_activity = dt.strftime('%Y-%m-%d %H:%M')
-                                except (ValueError, OSError):
-                                    last_activity = 'Invalid'
-                    
-                    message_count = len(history) if isinstance(history, list) else 0
-                    
-                    user_info = f"""🔍 User Search Results
+            user_info = f"""🔍 User Search Results
 
 👤 User ID: {target_user_id}
 📊 Status: {ban_status}
@@ -2640,189 +3238,160 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 📅 Last Activity: {last_activity}
 
 🛠️ Actions"""
-                    
-                    keyboard = [
-                        [
-                            InlineKeyboardButton("⛔ Ban User", callback_data="admin_ban_user_input"),
-                            InlineKeyboardButton("✅ Unban User", callback_data="admin_unban_user_input")
-                        ],
-                        [
-                            InlineKeyboardButton("📤 Send Code", callback_data="admin_send_code_smart"),
-                            InlineKeyboardButton("🔍 Search Another", callback_data="admin_search_user")
-                        ],
-                        [InlineKeyboardButton("🔙 Back to Users", callback_data="admin_users")]
-                    ]
-                    
-                    await update.message.reply_text(
-                        user_info,
-                        reply_markup=InlineKeyboardMarkup(keyboard)
-                    )
-                else:
-                    await update.message.reply_text(
-                        f"❌ User {target_user_id} not found in database.",
-                        reply_markup=InlineKeyboardMarkup([
-                            [InlineKeyboardButton("🔍 Search Another", callback_data="admin_search_user")],
-                            [InlineKeyboardButton("🔙 Back to Users", callback_data="admin_users")]
-                        ])
-                    )
-            except ValueError:
-                await update.message.reply_text(
-                    "❌ Invalid User ID. Please send a valid number.",
-                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_users")]])
-                )
-            
-            context.user_data.pop('admin_action', None)
-            return
-            
-        elif action == 'send_code' and message_text:
-            try:
-                target_user_id = int(message_text.strip())
-                redeem_codes = load_json_file('data/redeem_codes.json', {})
-                
-                # Find first available code
-                available_code = None
-                for code, info in redeem_codes.items():
-                    if isinstance(info, dict) and info.get('status') == 'active':
-                        available_code = code
-                        break
-                
-                if available_code:
-                    # Mark code as used
-                    redeem_codes[available_code]['status'] = 'used'
-                    redeem_codes[available_code]['used_by'] = target_user_id
-                    redeem_codes[available_code]['used_at'] = time.time()
-                    save_json_file('data/redeem_codes.json', redeem_codes)
-                    
-                    # Send code to user
-                    try:
-                        await context.bot.send_message(
-                            chat_id=target_user_id,
-                            text=f"🎉 You've received a premium access code!\n\nCode: `{available_code}`\n\nRedeem at: https://cpanda.app"
-                        )
-                        
-                        await update.message.reply_text(
-                            f"✅ Code sent to User {target_user_id}\nCode: {available_code}",
-                            reply_markup=InlineKeyboardMarkup([
-                                [InlineKeyboardButton("📤 Send Another", callback_data="admin_send_code_smart")],
-                                [InlineKeyboardButton("🔙 Back to Codes", callback_data="admin_redeem_codes")]
-                            ])
-                        )
-                    except Exception as e:
-                        await update.message.reply_text(
-                            f"❌ Failed to send code to user. User may have blocked the bot.\nCode: {available_code}",
-                            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_redeem_codes")]])
-                        )
-                else:
-                    await update.message.reply_text(
-                        "❌ No available codes. Please add codes first.",
-                        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_redeem_codes")]])
-                    )
-            except ValueError:
-                await update.message.reply_text(
-                    "❌ Invalid User ID. Please send a valid number.",
-                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_redeem_codes")]])
-                )
-            
-            context.user_data.pop('admin_action', None)
-            return
-            
-        elif action in ['broadcast_all', 'broadcast_premium'] and message_text:
-            conversation_histories = load_json_file('data/conversation_histories.json', {})
-            redeem_codes = load_json_file('data/redeem_codes.json', {})
-            
-            if action == 'broadcast_premium':
-                # Get premium users (those who used codes)
-                premium_users = set()
-                for info in redeem_codes.values():
-                    if isinstance(info, dict) and info.get('used_by'):
-                        premium_users.add(str(info['used_by']))
-                target_users = premium_users
-            else:
-                target_users = set(conversation_histories.keys())
             
-            sent_count = 0
-            failed_count = 0
-            
-            for target_user_id in target_users:
-                try:
-                    await context.bot.send_message(
-                        chat_id=int(target_user_id),
-                        text=f"📢 Panda AppStore Announcement\n\n{message_text}"
-                    )
-                    sent_count += 1
-                    await asyncio.sleep(0.1)  # Rate limiting
-                except Exception:
-                    failed_count += 1
+            keyboard = [
+                [
+                    InlineKeyboardButton("⛔ Ban User", callback_data="admin_ban_user_input"),
+                    InlineKeyboardButton("✅ Unban User", callback_data="admin_unban_user_input")
+                ],
+                [
+                    InlineKeyboardButton("📤 Send Code", callback_data="admin_send_code_smart"),
+                    InlineKeyboardButton("🔍 Search Another", callback_data="admin_search_user")
+                ],
+                [InlineKeyboardButton("🔙 Back to Users", callback_data="admin_users")]
+            ]
             
-            broadcast_type = "premium users" if action == 'broadcast_premium' else "all users"
             await update.message.reply_text(
-                f"✅ Broadcast completed!\n\nSent to: {sent_count} {broadcast_type}\nFailed: {failed_count}",
+                user_info,
+                reply_markup=InlineKeyboardMarkup(keyboard)
+            )
+        else:
+            await update.message.reply_text(
+                f"❌ User {target_user_id} not found in database.",
                 reply_markup=InlineKeyboardMarkup([
-                    [InlineKeyboardButton("📢 Send Another", callback_data=f"admin_{action}")],
-                    [InlineKeyboardButton("🔙 Back to Broadcasts", callback_data="admin_broadcasts")]
+                    [InlineKeyboardButton("🔍 Search Another", callback_data="admin_search_user")],
+                    [InlineKeyboardButton("🔙 Back to Users", callback_data="admin_users")]
                 ])
             )
-            
-            context.user_data.pop('admin_action', None)
-            return
-            
-        elif action == 'change_usd' and message_text:
+    else:
+        await update.message.reply_text(
+            INVALID_USER_ID_TEXT,
+            reply_markup=ADMIN_USERS_BACK_MARKUP
+        )
+
+async def send_code_action(update: Update, context: ContextTypes.DEFAULT_TYPE, message_text: str):
+    """Send the oldest available redeem code to the user ID an admin sent"""
+    target_user_id = parse_user_id(message_text)
+    if target_user_id is not None:
+        redeem_codes = load_redeem_codes()
+        
+        # Take the oldest available code
+        available_code = take_active_code()
+        
+        if available_code:
+            # Mark code as used
+            redeem_codes[available_code]['status'] = 'used'
+            redeem_codes[available_code]['used_by'] = target_user_id
+            redeem_codes[available_code]['used_at'] = time.time()
+            save_redeem_codes(redeem_codes)
+            
+            # Send code to user
             try:
-                new_amount = float(message_text.strip())
-                if new_amount <= 0:
-                    raise ValueError("Amount must be positive")
-                
-                pricing_config = load_json_file('data/pricing_config.json', {})
-                pricing_config['usd_amount'] = new_amount
-                save_json_file('data/pricing_config.json', pricing_config)
-                
-                await update.message.reply_text(
-                    f"✅ USD price updated to ${new_amount:.2f}",
-                    reply_markup=InlineKeyboardMarkup([
-                        [InlineKeyboardButton("⭐ Change Stars", callback_data="admin_change_stars")],
-                        [InlineKeyboardButton("🔙 Back to Pricing", callback_data="admin_pricing_config")]
-                    ])
-                )
-            except ValueError:
-                await update.message.reply_text(
-                    "❌ Invalid amount. Please send a valid number (e.g., 40.00)",
-                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_pricing_config")]])
+                await context.bot.send_message(
+                    chat_id=target_user_id,
+                    text=f"🎉 You've received a premium access code!\n\nCode: `{available_code}`\n\nRedeem at: https://cpanda.app"
                 )
-            
-            context.user_data.pop('admin_action', None)
-            return
-            
-        elif action == 'change_stars' and message_text:
-            try:
-                new_amount = int(message_text.strip())
-                if new_amount <= 0:
-                    raise ValueError("Amount must be positive")
-                
-                pricing_config = load_json_file('data/pricing_config.json', {})
-                pricing_config['stars_amount'] = new_amount
-                save_json_file('data/pricing_config.json', pricing_config)
                 
                 await update.message.reply_text(
-                    f"✅ Stars price updated to {new_amount} ⭐",
+                    f"✅ Code sent to User {target_user_id}\nCode: {available_code}",
                     reply_markup=InlineKeyboardMarkup([
-                        [InlineKeyboardButton("💵 Change USD", callback_data="admin_change_usd")],
-                        [InlineKeyboardButton("🔙 Back to Pricing", callback_data="admin_pricing_config")]
+                        [InlineKeyboardButton("📤 Send Another", callback_data="admin_send_code_smart")],
+                        [InlineKeyboardButton("🔙 Back to Codes", callback_data="admin_redeem_codes")]
                     ])
                 )
-            except ValueError:
+            except Exception as e:
                 await update.message.reply_text(
-                    "❌ Invalid amount. Please send a valid number (e.g., 3000)",
-                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_pricing_config")]])
+                    f"❌ Failed to send code to user. User may have blocked the bot.\nCode: {available_code}",
+                    reply_markup=ADMIN_REDEEM_CODES_BACK_MARKUP
                 )
+        else:
+            await update.message.reply_text(
+                "❌ No available codes. Please add codes first.",
+                reply_markup=ADMIN_REDEEM_CODES_BACK_MARKUP
+            )
+    else:
+        await update.message.reply_text(
+            INVALID_USER_ID_TEXT,
+            reply_markup=ADMIN_REDEEM_CODES_BACK_MARKUP
+        )
+
+async def broadcast_action(update: Update, context: ContextTypes.DEFAULT_TYPE, message_text: str):
+    """Queue a broadcast of the admin message to all or premium users"""
+    action = context.user_data['admin_action']
+    
+    conversation_histories = load_conversation_histories()
+    redeem_codes = load_redeem_codes()
+    
+    if action == 'broadcast_premium':
+        # Get premium users (those who used codes)
+        premium_users = set()
+        for info in redeem_codes.values():
+            if isinstance(info, dict) and info.get('used_by'):
+                premium_users.add(int(info['used_by']))
+        target_users = premium_users
+    else:
+        target_users = set(conversation_histories.keys())
+    
+    broadcast_type = "premium users" if action == 'broadcast_premium' else "all users"
+    await update.message.reply_text(f"📢 Broadcast queued for {len(target_users)} {broadcast_type}...")
+    
+    # Send in the background so this handler does not hold the update for the whole run
+    context.application.create_task(
+        run_broadcast(context, update.effective_chat.id, action, target_users, message_text),
+        update=update
+    )
+
+# Admin text input is routed by the pending admin_action set from the admin panel
+ADMIN_ACTION_ROUTES = {
+    'adding_code': adding_code_action,
+    'delete_code': delete_code_action,
+    'ban_user': ban_user_action,
+    'unban_user': unban_user_action,
+    'configure_oxapay': configure_oxapay_action,
+    'set_paid_post_url': set_paid_post_url_action,
+    'configure_stars_channel': configure_stars_channel_action,
+    'change_usd': change_usd_action,
+    'change_stars': change_stars_action,
+    'search_user': search_user_action,
+    'send_code': send_code_action,
+    'broadcast_all': broadcast_action,
+    'broadcast_premium': broadcast_action
+}
+
+async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle regular messages with smart admin-AI handoff and media support"""
+    if not update.message or not update.effective_user:
+        return
+    
+    user_id = update.effective_user.id
+    username = update.effective_user.first_name or update.effective_user.username or f"User{user_id}"
+    message_text = update.message.text or ""
+    
+    user_is_admin = is_admin(user_id)
+    
+    # Check if user is banned (skip admins)
+    if not user_is_admin:
+        banned_users = load_banned_users()
+        
+        if user_id in banned_users:
+            ban_info = banned_users[user_id]
+            logger.info("User %s is banned: %s", user_id, ban_info)
             
-            context.user_data.pop('admin_action', None)
+            # Always block banned users regardless of ban type
+            await update.message.reply_text(BANNED_USER_TEXT)
             return
     
-    # Check if this is an admin reply in a forum thread
-    await check_admin_reply(update, context)
+    # Handle admin actions
+    if user_is_admin and message_text:
+        handler = ADMIN_ACTION_ROUTES.get(context.user_data.get('admin_action'))
+        if handler is not None:
+            await handler(update, context, message_text)
+            context.user_data.pop('admin_action', None)
+            return
     
-    # Skip AI for admins unless they're asking questions
-    if is_admin(user_id):
+    # Admin messages are replies to customers, never AI questions
+    if user_is_admin:
+        await check_admin_reply(update, context)
         return
     
     # Check for word repetition first
@@ -2848,17 +3417,16 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if needs_ban:
         ban_result = ban_user_progressive(user_id, username, ban_reason)
         
+        # The user's notice and the admin group's notice are independent, so send both at once
         if ban_result['ban_type'] == 'permanent_pending':
             # Permanent ban pending admin approval
-            await update.message.reply_text(
-                f"⚠️ You have been flagged for permanent ban (offense #{ban_result['ban_count']}).\n\nAn admin will review your case. Please contact our support team."
-            )
-            
-            # Notify admin for permanent ban approval
-            try:
-                await context.bot.send_message(
-                    chat_id=GROUP_ID,
-                    text=f"🚨 PERMANENT BAN REQUEST\n\nUser: {username} (ID: {user_id})\nOffense #{ban_result['ban_count']}\nReason: {ban_reason}\n\nPlease review and approve/deny permanent ban.",
+            await asyncio.gather(
+                update.message.reply_text(
+                    f"⚠️ You have been flagged for permanent ban (offense #{ban_result['ban_count']}).\n\nAn admin will review your case. Please contact our support team."
+                ),
+                send_notice(
+                    context, GROUP_ID,
+                    f"🚨 PERMANENT BAN REQUEST\n\nUser: {username} (ID: {user_id})\nOffense #{ban_result['ban_count']}\nReason: {ban_reason}\n\nPlease review and approve/deny permanent ban.",
                     reply_markup=InlineKeyboardMarkup([
                         [
                             InlineKeyboardButton("✅ Approve Ban", callback_data=f"admin_approve_ban_{user_id}"),
@@ -2866,171 +3434,183 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                         ]
                     ])
                 )
-            except Exception as e:
-                logger.error(f"Failed to notify admin group: {e}")
+            )
         else:
             # Temporary ban
-            await update.message.reply_text(
-                f"⚠️ You have been temporarily banned for {ban_result['duration_text']} (offense #{ban_result['ban_count']}).\n\nReason: {ban_reason}\n\nIf you believe this is an error, please contact our support team."
-            )
-            
-            # Notify admin group
-            try:
-                await context.bot.send_message(
-                    chat_id=GROUP_ID,
-                    text=f"🚫 Auto-ban: User {username} (ID: {user_id}) banned for {ban_result['duration_text']} (offense #{ban_result['ban_count']})\nReason: {ban_reason}"
+            await asyncio.gather(
+                update.message.reply_text(
+                    f"⚠️ You have been temporarily banned for {ban_result['duration_text']} (offense #{ban_result['ban_count']}).\n\nReason: {ban_reason}\n\nIf you believe this is an error, please contact our support team."
+                ),
+                send_notice(
+                    context, GROUP_ID,
+                    f"🚫 Auto-ban: User {username} (ID: {user_id}) banned for {ban_result['duration_text']} (offense #{ban_result['ban_count']})\nReason: {ban_reason}"
                 )
-            except Exception as e:
-                logger.error(f"Failed to notify admin group: {e}")
+            )
         
         return
     
-    # Update user's last message timestamp
-    update_user_last_message(user_id)
-    
-    # Check if admin is actively responding or if AI should take over after 20 seconds
-    if is_admin_actively_responding(user_id) and not should_ai_respond_after_timeout(user_id):
-        # Forward user message to admin thread and return
-        await forward_user_message_to_admin_thread(context, user_id, username, message_text)
+    # Leave the conversation to an admin who replied within the handoff window
+    if is_admin_handling_user(user_id):
+        # Forward user message to admin thread in the background and free the update slot
+        context.application.create_task(
+            forward_user_message_to_admin_thread(context, user_id, username, message_text),
+            update=update
+        )
         return  # Let admin handle the conversation
     
-    # AI Response with realistic typing
+    # AI Response with realistic typing; the indicator runs alongside the pause and the
+    # model call instead of before them, and stays visible until the reply is complete
+    typing_task = context.application.create_task(keep_typing(context, update.effective_chat.id))
     try:
-        await send_realistic_typing(context, update.effective_chat.id, "Thinking...")
+        await asyncio.sleep(await calculate_typing_delay(len("Thinking...")))
         
         # Get AI response with conversation context
-        conversation_histories = load_json_file('data/conversation_histories.json', {})
-        user_history = conversation_histories.get(str(user_id), [])
-        
-        # Add current message to history
-        user_history.append({
+        user_history = load_conversation_histories().get(user_id, ())
+        user_entry = {
             'role': 'user',
             'content': message_text,
-            'timestamp': time.time()
-        })
-        
-        # Keep only last 10 messages for context
-        if len(user_history) > 10:
-            user_history = user_history[-10:]
+            'timestamp': int(time.time())
+        }
         
-        # Prepare messages for OpenAI
-        messages = [
-            {
-                "role": "system",
-                "content": f"""You are a professional customer service agent for Panda AppStore, a premium iOS app service that provides modded/premium apps for iPhones without jailbreak.
-
-IMPORTANT: Only respond to questions about Panda AppStore services, pricing, apps, technical support, or related topics. For ANY other topics (general questions, homework, coding help, news, weather, personal advice, etc.), politely decline and redirect to our services.
-
-Service Details:
-- Premium Plan: ONE YEAR access for $35 USD or 2500 Telegram Stars
-- Key apps: CarX Street (unlimited money), Car Parking Multiplayer (all cars), Spotify++, YouTube++, Instagram++
-- 200+ premium apps included
-- Device-specific optimization for iPhones
-- No jailbreak required
-- 3-month revoke guarantee
-- Complete catalog: https://cpanda.app/page/ios-subscriptions
-
-For specific app inquiries, direct users to the complete app collection at: https://cpanda.app/page/ios-subscriptions
-
-When users ask about free content, promote the earning bot: https://t.me/PandaStoreFreebot
-
-For CarX Street specifically, explain it's included in the $35 yearly plan and mention the earning bot as an alternative.
-
-Respond naturally and conversationally, like a helpful human agent. Keep responses focused, helpful, and professional."""
-            }
-        ]
+        # Prepare messages for OpenAI; the fixed system message comes first so the
+        # API can reuse its cached prefix across requests
+        messages = [AI_SYSTEM_MESSAGE]
         
-        # Add conversation history
-        for msg in user_history[-5:]:  # Last 5 messages for context
+        # Add the most recent stored turns, then the new message, without copying the history
+        for msg in islice(user_history, max(0, len(user_history) - (AI_CONTEXT_MESSAGES - 1)), None):
             messages.append({
                 "role": msg.get('role', 'user'),
                 "content": msg.get('content', '')
             })
+        messages.append({"role": "user", "content": message_text})
         
-        # Check if OpenAI client is available
-        if not client:
-            raise Exception("OpenAI client not initialized")
-            
-        # Get AI response
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=messages,
-            max_tokens=300,
-            temperature=0.7
-        )
+        # Check for earning bot promotion
+        reply_markup = EARNING_BOT_MARKUP if detect_free_content_request(message_text) else None
         
-        ai_response = response.choices[0].message.content
+        # Identical questions after identical recent turns get the same reply, so they
+        # share one; the context turns sit between the system message and the question
+        reply_key = reply_cache_key(message_text, messages[1:-1])
+        ai_response = get_cached_reply(reply_key)
+        
+        if ai_response is not None:
+            await update.message.reply_text(ai_response, reply_markup=reply_markup)
+        else:
+            # Check if OpenAI client is available
+            if not client:
+                raise Exception("OpenAI client not initialized")
+            
+            # Stream the reply so the customer sees text from the first token on;
+            # technical problems go to the larger model
+            model = AI_TROUBLESHOOTING_MODEL if detect_troubleshooting_request(message_text) else AI_MODEL
+            try:
+                ai_response = await generate_ai_reply(update.message, messages, model, reply_markup, reply_key)
+            except PartialReplyError as e:
+                # The customer already sees the partial reply and a notice; keep it in the history
+                ai_response = e.partial
         
-        # Add AI response to history
-        user_history.append({
+        # Append both turns to the history log
+        append_conversation_history(user_id, user_entry, {
             'role': 'assistant',
             'content': ai_response,
-            'timestamp': time.time()
+            'timestamp': int(time.time())
         })
         
-        # Save updated history
-        conversation_histories[str(user_id)] = user_history
-        save_json_file('data/conversation_histories.json', conversation_histories)
-        
-        # Check for earning bot promotion
-        needs_earning_bot_keyboard = detect_free_content_request(message_text)
-        
-        if needs_earning_bot_keyboard:
-            keyboard = [[InlineKeyboardButton("🎁 Try Earning Bot", url="https://t.me/PandaStoreFreebot")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-        else:
-            reply_markup = None
-        
-        await update.message.reply_text(ai_response, reply_markup=reply_markup)
-        
-        # Forward conversation to admin thread
-        await forward_conversation_to_admin_thread(context, user_id, username, message_text, ai_response)
+        # Forward conversation to admin thread in the background; the customer already has
+        # the reply, and the application awaits pending tasks on shutdown
+        context.application.create_task(
+            forward_conversation_to_admin_thread(context, user_id, username, message_text, ai_response),
+            update=update
+        )
         
     except Exception as e:
-        logger.error(f"AI response error: {e}")
+        logger.error("AI response error: %s", e)
         await update.message.reply_text(
             "I'm having trouble processing your message right now. Please try again in a moment or contact our support team."
         )
+    finally:
+        typing_task.cancel()
+
+async def reply_added_codes(update: Update, codes: Set[str], added_codes: list):
+    """Report the outcome of adding redeem codes to the admin"""
+    if not added_codes:
+        # An uploaded file can hold any number of codes, so only a single one is echoed back
+        if not codes:
+            existing_text = "❌ No codes found"
+        elif len(codes) == 1:
+            existing_text = f"❌ Code already exists: {next(iter(codes))}"
+        else:
+            existing_text = f"❌ All {len(codes)} codes already exist"
+        await update.message.reply_text(existing_text, reply_markup=ADMIN_REDEEM_CODES_BACK_MARKUP)
+        return
+    
+    if len(added_codes) == 1:
+        added_text = f"✅ Code added successfully: {added_codes[0]}"
+    else:
+        added_text = f"✅ {len(added_codes)} codes added successfully"
+    skipped = len(codes) - len(added_codes)
+    if skipped:
+        added_text += f"\n\nSkipped {skipped} existing code(s)"
+    
+    await update.message.reply_text(
+        added_text,
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton("➕ Add Another", callback_data="admin_add_code")],
+            [InlineKeyboardButton("🔙 Back to Codes", callback_data="admin_redeem_codes")]
+        ])
+    )
+
+@admin_only
+async def handle_codes_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Bulk-add redeem codes from an uploaded .txt file (one code per line)"""
+    user_id = update.effective_user.id
+    if context.user_data.get('admin_action') != 'adding_code':
+        await check_admin_reply(update, context)
+        return
+    
+    # Stream the file from disk line by line instead of holding bytes + str + list copies
+    with tempfile.NamedTemporaryFile(suffix='.txt', delete=False) as tmp:
+        tmp_path = tmp.name
+    try:
+        document_file = await update.message.document.get_file()
+        await document_file.download_to_drive(tmp_path)
+        with open(tmp_path, 'r', encoding='utf-8') as f:
+            codes = {line.strip() for line in f if line.strip()}
+    except (UnicodeDecodeError, OSError) as e:
+        logger.error("Error reading uploaded codes file: %s", e)
+        await update.message.reply_text(
+            "❌ Could not read the file. Please upload a UTF-8 .txt file with one code per line.",
+            reply_markup=ADMIN_REDEEM_CODES_BACK_MARKUP
+        )
+        return
+    finally:
+        os.remove(tmp_path)
+    
+    await reply_added_codes(update, codes, add_redeem_codes(codes, user_id))
+    context.user_data.pop('admin_action', None)
 
 async def forward_conversation_to_admin_thread(context, user_id: int, username: str, user_message: str, ai_response: str):
     """Forward complete conversation (user + AI) to individual customer thread"""
     try:
-        # Get proper user profile name
-        try:
-            user_info = await context.bot.get_chat(user_id)
-            if user_info.first_name:
-                if user_info.last_name:
-                    profile_name = f"{user_info.first_name} {user_info.last_name}"
-                else:
-                    profile_name = user_info.first_name
-            elif user_info.username:
-                profile_name = f"@{user_info.username}"
-            else:
-                profile_name = f"Customer{user_id}"
-        except Exception:
-            profile_name = username if username and username != "None" else f"Customer{user_id}"
+        # The thread already carries the full profile name, so skip a get_chat round trip here
+        profile_name = username if username and username != "None" else f"Customer{user_id}"
         
-        thread_id = await get_or_create_thread_id(context, user_id, profile_name)
+        thread_id = await send_to_customer_thread(
+            context, user_id, profile_name,
+            f"👤 {profile_name}: {user_message}\n\n🤖 AI: {ai_response}"
+        )
         
         if thread_id:
-            conversation_text = f"👤 {profile_name}: {user_message}\n\n🤖 AI: {ai_response}"
-            
-            await context.bot.send_message(
-                chat_id=GROUP_ID,
-                message_thread_id=thread_id,
-                text=conversation_text
-            )
-            logger.info(f"Forwarded conversation to thread {thread_id} for user {user_id}")
+            logger.info("Forwarded conversation to thread %s for user %s", thread_id, user_id)
         else:
             # Fallback: send to general chat with clear identification
             await context.bot.send_message(
                 chat_id=GROUP_ID,
                 text=f"💬 {profile_name} (ID: {user_id})\n\n👤 Customer: {user_message}\n\n🤖 AI: {ai_response}"
             )
-            logger.warning(f"Used fallback general chat for user {user_id} - forum topics may not be supported")
+            logger.warning("Used fallback general chat for user %s - forum topics may not be supported", user_id)
             
     except Exception as e:
-        logger.error(f"Error forwarding conversation to admin thread: {e}")
+        logger.error("Error forwarding conversation to admin thread: %s", e)
 
 async def get_or_create_thread_id(context, user_id: int, username: str) -> int:
     """Create individual forum thread for each customer with proper profile name"""
@@ -3038,7 +3618,7 @@ async def get_or_create_thread_id(context, user_id: int, username: str) -> int:
         active_threads = load_json_file('data/active_threads.json', {})
         user_key = str(user_id)
         
-        # Check if thread already exists and is valid
+        # Reuse the known thread; send_to_customer_thread recreates it if it was deleted
         if user_key in active_threads:
             # Handle both old format (dict) and new format (int)
             if isinstance(active_threads[user_key], dict):
@@ -3047,22 +3627,7 @@ async def get_or_create_thread_id(context, user_id: int, username: str) -> int:
                 thread_id = active_threads[user_key]
                 
             if thread_id:
-                try:
-                    # Test if thread still exists by sending a test message
-                    test_msg = await context.bot.send_message(
-                        chat_id=GROUP_ID,
-                        message_thread_id=thread_id,
-                        text="🔄"
-                    )
-                    # Delete the test message immediately
-                    await context.bot.delete_message(chat_id=GROUP_ID, message_id=test_msg.message_id)
-                    logger.info(f"Using existing thread {thread_id} for user {user_id}")
-                    return thread_id
-                except Exception as e:
-                    logger.warning(f"Thread {thread_id} for user {user_id} no longer exists: {e}")
-                    # Thread doesn't exist anymore, remove from tracking
-                    del active_threads[user_key]
-                    save_json_file('data/active_threads.json', active_threads)
+                return thread_id
         
         # Get proper user profile name from Telegram
         try:
@@ -3077,7 +3642,7 @@ async def get_or_create_thread_id(context, user_id: int, username: str) -> int:
             else:
                 profile_name = f"Customer{user_id}"
         except Exception as e:
-            logger.warning(f"Could not get user info for {user_id}: {e}")
+            logger.warning("Could not get user info for %s: %s", user_id, e)
             # Fallback to provided username or generic name
             if username and username != "None" and username.strip():
                 profile_name = username.strip()
@@ -3086,7 +3651,7 @@ async def get_or_create_thread_id(context, user_id: int, username: str) -> int:
         
         # Create new individual forum thread with customer's profile name
         try:
-            logger.info(f"Creating NEW forum topic '{profile_name}' for user {user_id}")
+            logger.info("Creating NEW forum topic '%s' for user %s", profile_name, user_id)
             
             forum_topic = await context.bot.create_forum_topic(
                 chat_id=GROUP_ID,
@@ -3098,37 +3663,52 @@ async def get_or_create_thread_id(context, user_id: int, username: str) -> int:
             active_threads[user_key] = thread_id
             save_json_file('data/active_threads.json', active_threads)
             
-            logger.info(f"✅ Successfully created forum topic {thread_id} for user {user_id} with name '{profile_name}'")
+            logger.info("✅ Successfully created forum topic %s for user %s with name '%s'", thread_id, user_id, profile_name)
             
             # Send welcome message to new individual thread
-            from datetime import datetime as dt
             await context.bot.send_message(
                 chat_id=GROUP_ID,
                 message_thread_id=thread_id,
-                text=f"👤 Customer: {profile_name}\n🆔 User ID: {user_id}\n📅 Created: {dt.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n💬 All AI conversations with this customer will appear in this dedicated thread."
+                text=f"👤 Customer: {profile_name}\n🆔 User ID: {user_id}\n📅 Created: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n💬 All AI conversations with this customer will appear in this dedicated thread."
             )
             
             return thread_id
             
         except Exception as e:
-            logger.error(f"❌ Failed to create forum topic for user {user_id}: {e}")
+            logger.error("❌ Failed to create forum topic for user %s: %s", user_id, e)
             return None
         
     except Exception as e:
-        logger.error(f"Error in get_or_create_thread_id for user {user_id}: {e}")
+        logger.error("Error in get_or_create_thread_id for user %s: %s", user_id, e)
         return None
 
+async def send_to_customer_thread(context, user_id: int, username: str, text: str) -> Optional[int]:
+    """Send text to the customer's forum thread, recreating the thread if it was deleted"""
+    thread_id = await get_or_create_thread_id(context, user_id, username)
+    if not thread_id:
+        return None
+    try:
+        await context.bot.send_message(chat_id=GROUP_ID, message_thread_id=thread_id, text=text)
+        return thread_id
+    except BadRequest as e:
+        if 'thread not found' not in str(e).lower():
+            raise
+        logger.warning("Thread %s for user %s no longer exists: %s", thread_id, user_id, e)
+    
+    active_threads = load_json_file('data/active_threads.json', {})
+    active_threads.pop(str(user_id), None)
+    save_json_file('data/active_threads.json', active_threads)
+    
+    thread_id = await get_or_create_thread_id(context, user_id, username)
+    if thread_id:
+        await context.bot.send_message(chat_id=GROUP_ID, message_thread_id=thread_id, text=text)
+    return thread_id
+
+@admin_only
 async def check_admin_reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Check if message is admin reply in forum thread or to customer message"""
-    if not update.message or not update.effective_user:
-        return
-    
     user_id = update.effective_user.id
     
-    # Only process admin messages
-    if not is_admin(user_id):
-        return
-    
     # Check if this is a forum thread message
     if (update.message.chat.id == GROUP_ID and 
         hasattr(update.message, 'message_thread_id') and 
@@ -3152,7 +3732,7 @@ async def check_admin_reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 break
         
         if target_user_id:
-            logger.info(f"Admin {user_id} replying to user {target_user_id} in thread {thread_id}")
+            logger.info("Admin %s replying to user %s in thread %s", user_id, target_user_id, thread_id)
             
             # Mark admin as actively responding to this user
             mark_admin_active(target_user_id, user_id)
@@ -3166,7 +3746,7 @@ async def check_admin_reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     text=message_text
                 )
                 
-                logger.info(f"Successfully forwarded admin message to user {target_user_id}")
+                logger.info("Successfully forwarded admin message to user %s", target_user_id)
                 
                 # Send confirmation to admin in thread
                 try:
@@ -3176,24 +3756,18 @@ async def check_admin_reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
                         text=f"✅ Message delivered to user"
                     )
                 except Exception as conf_e:
-                    logger.error(f"Error sending confirmation to admin: {conf_e}")
+                    logger.error("Error sending confirmation to admin: %s", conf_e)
                 
                 # Add to conversation history
-                conversation_histories = load_json_file('data/conversation_histories.json', {})
-                user_history = conversation_histories.get(str(target_user_id), [])
-                
-                user_history.append({
+                append_conversation_history(target_user_id, {
                     'role': 'assistant',
                     'content': f"[Admin] {message_text}",
-                    'timestamp': time.time(),
+                    'timestamp': int(time.time()),
                     'admin_id': user_id
                 })
                 
-                conversation_histories[str(target_user_id)] = user_history
-                save_json_file('data/conversation_histories.json', conversation_histories)
-                
             except Exception as e:
-                logger.error(f"Error forwarding admin message to user {target_user_id}: {e}")
+                logger.error("Error forwarding admin message to user %s: %s", target_user_id, e)
                 # Send error notification to admin
                 try:
                     await context.bot.send_message(
@@ -3204,11 +3778,38 @@ async def check_admin_reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 except:
                     pass
         else:
-            logger.warning(f"Could not find user for thread {thread_id}")
+            logger.warning("Could not find user for thread %s", thread_id)
 
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE):
     """Handle errors"""
-    logger.error(f"Exception while handling an update: {context.error}")
+    logger.error("Exception while handling an update: %s", context.error)
+
+async def post_init(application: Application):
+    """Prepare data storage once at startup, before any update is handled"""
+    initialize_data()
+    await compact_conversation_histories()
+    
+    # Warm the in-memory stores so the first updates don't pay for the disk reads
+    load_redeem_codes()
+    load_pricing_config()
+    load_banned_users()
+    load_reply_cache()
+    logger.info("Data storage initialized")
+
+async def post_shutdown(application: Application):
+    """Save the reply cache and close the shared clients when the bot stops"""
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    if client:
+        await client.close()
+    save_reply_cache()
+    _state_db.close()
+    if _history_compaction is not None:
+        await _history_compaction
+    if _history_flush is not None:
+        _history_flush.cancel()
+    if _history_log is not None:
+        _history_log.close()
 
 def main():
     """Main function"""
@@ -3216,24 +3817,55 @@ def main():
         logger.error("TELEGRAM_BOT_TOKEN not found in environment variables")
         return
     
-    # Initialize data storage
-    initialize_data()
-    
     # Create application
-    application = Application.builder().token(BOT_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .connection_pool_size(CONNECTION_POOL_SIZE)
+        .pool_timeout(POOL_TIMEOUT)
+        .get_updates_connection_pool_size(GET_UPDATES_POOL_SIZE)
+        .get_updates_pool_timeout(POOL_TIMEOUT)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .concurrent_updates(CONCURRENT_UPDATES)
+        .rate_limiter(AIORateLimiter(
+            overall_max_rate=RATE_LIMIT_MAX_RATE,
+            overall_time_period=1,
+            group_max_rate=RATE_LIMIT_GROUP_MAX_RATE,
+            group_time_period=RATE_LIMIT_GROUP_PERIOD,
+            max_retries=RATE_LIMIT_MAX_RETRIES
+        ))
+        .build()
+    )
     
     # Add handlers
-    application.add_handler(CommandHandler("start", start_command))
-    application.add_handler(CallbackQueryHandler(callback_query_handler))
+    # Menus are static replies; don't let them queue behind slower handlers
+    application.add_handler(CommandHandler("start", start_command, block=False))
+    application.add_handler(CallbackQueryHandler(admin_callback_query_handler, pattern=r"^admin_", block=False))
+    application.add_handler(CallbackQueryHandler(callback_query_handler, block=False))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
-    application.add_handler(MessageHandler(filters.ALL, check_admin_reply))
+    # Admin-only handlers filter by sender in the dispatcher, so customer updates are never scheduled
+    admin_filter = filters.User(user_id=ADMIN_IDS)
+    application.add_handler(MessageHandler(filters.Document.TXT & admin_filter, handle_codes_document))
+    application.add_handler(MessageHandler(admin_filter, check_admin_reply))
     
     # Add error handler
     application.add_error_handler(error_handler)
     
     # Start the bot
     logger.info("Starting Panda AppStore Bot...")
-    application.run_polling(drop_pending_updates=True)
+    if WEBHOOK_URL:
+        # Telegram pushes updates as they arrive instead of waiting on getUpdates round trips
+        application.run_webhook(
+            listen="0.0.0.0",
+            port=PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            drop_pending_updates=True
+        )
+    else:
+        application.run_polling(drop_pending_updates=True)
 
 if __name__ == "__main__":
     try:
@@ -3241,4 +3873,4 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
     except Exception as e:
-        logger.error(f"Bot crashed: {e}")
+        logger.error("Bot crashed: %s", e)
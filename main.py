@@ -8,16 +8,8 @@ import sys
 import logging
 from bot import main
 
-# Configure logging for Railway
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('bot.log')
-    ]
-)
-
+# Logging is configured by bot on import: records are queued and written to
+# stdout and bot.log from a background thread
 logger = logging.getLogger(__name__)
 
 if __name__ == "__main__":
@@ -25,5 +17,5 @@ if __name__ == "__main__":
     try:
         main()
     except Exception as e:
-        logger.error(f"Fatal error: {e}")
+        logger.error("Fatal error: %s", e)
         sys.exit(1)